@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark de login: logins/segundo según el cost de bcrypt
+
+Simula una tormenta de logins (verify de bcrypt) con el pool de procesos de
+src.password_hashing y, como referencia, verificando en línea en un solo hilo.
+
+Uso (desde backend/):
+    python bench_password_hashing.py
+    python bench_password_hashing.py --rounds 10 11 12 13 --logins 64 --workers 4
+"""
+import argparse
+import asyncio
+import time
+
+from src.password_hashing import PasswordHasher, hash_password, verify_password
+
+
+async def _pool_logins_per_second(rounds: int, logins: int, workers: int) -> float:
+    hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=logins)
+    try:
+        hashed = hash_password("correct horse battery staple", rounds)
+        # Calentar el pool (arranque de procesos) fuera de la medición
+        await asyncio.gather(*[hasher.verify("x", hashed) for _ in range(workers)])
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            hasher.verify("correct horse battery staple", hashed) for _ in range(logins)
+        ])
+        elapsed = time.perf_counter() - start
+        assert all(results)
+        return logins / elapsed
+    finally:
+        hasher.shutdown()
+
+
+def _inline_logins_per_second(rounds: int, logins: int) -> float:
+    hashed = hash_password("correct horse battery staple", rounds)
+    start = time.perf_counter()
+    for _ in range(logins):
+        verify_password("correct horse battery staple", hashed)
+    return logins / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=PasswordHasher().workers)
+    args = parser.parse_args()
+
+    print(f"🔐 {args.logins} logins por cost, pool de {args.workers} procesos\n")
+    print(f"{'cost':>4} | {'pool logins/s':>13} | {'inline logins/s':>15}")
+    print("-" * 40)
+    for rounds in args.rounds:
+        pool = asyncio.run(_pool_logins_per_second(rounds, args.logins, args.workers))
+        inline = _inline_logins_per_second(rounds, max(1, args.logins // 4))
+        print(f"{rounds:>4} | {pool:>13.1f} | {inline:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional, Callable, Tuple, Hashable
 from datetime import datetime, timedelta
 import jwt
 from jwt import PyJWTError
+from pydantic import TypeAdapter
 import os
+import asyncio
 
 from src import models
 from src import schemas
 from src import crud
-from src.database import engine, get_db, create_tables
+from src import async_crud
+from src.database import engine, get_db, get_async_db, create_tables
+from src.content_cache import content_cache, etag_matches
+from src.auth_cache import TokenUser, user_cache, token_revocations
+from src.password_hashing import password_hasher, PasswordHashingBusyError
+from src.speaking_jobs import speaking_turn_queue, SpeakingQueueFullError
+from src.opening_pool import opening_pool
+from src.message_corrections import message_correction_queue, message_events
+from src.speaking_stream import sse_event
+from src.audio_upload import AudioUploadLimitMiddleware
+from fastapi.responses import StreamingResponse
+from src.database import SessionLocal, AsyncSessionLocal
+from src.tts_cache import speech_cache, SpeechCacheFiles, TTS_CACHE_URL
+from src.openai_service import regenerate_speech_async
+from starlette.concurrency import run_in_threadpool
 
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
@@ -26,6 +43,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 horas
 
 app = FastAPI(title="Tbodemy API", version="1.0.0")
 
+# Límite de tamaño de los audios mientras se reciben (antes del parseo del multipart).
+# Se añade antes que CORS para que el 413 lleve las cabeceras CORS
+app.add_middleware(AudioUploadLimitMiddleware)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -41,13 +62,123 @@ STATIC_DIR.mkdir(exist_ok=True)
 (STATIC_DIR / "audio").mkdir(exist_ok=True)
 (STATIC_DIR / "speaking").mkdir(exist_ok=True)
 
+async def regenerate_speech_clip(key: str) -> bool:
+    """Clip TTS expulsado de la caché pero aún usado por un mensaje guardado: se vuelve a generar"""
+    async with AsyncSessionLocal() as db:
+        text = await async_crud.get_speaking_text_for_audio(db, speech_cache.url(key))
+    if text is None:
+        return False
+    try:
+        await regenerate_speech_async(key, text)
+    except Exception as e:
+        print(f"[tts-cache] Could not regenerate {key}: {e}")
+        return False
+    return True
+
+
 # Montar directorio de archivos estáticos
+# (la caché TTS va antes que /static/speaking para poder regenerar clips expulsados)
+if TTS_CACHE_URL.startswith("/"):
+    app.mount(TTS_CACHE_URL, SpeechCacheFiles(speech_cache, regenerate_speech_clip), name="speech_cache")
 app.mount("/static/audio", StaticFiles(directory="static/audio"), name="audio")
 app.mount("/static/speaking", StaticFiles(directory="static/speaking"), name="speaking_files")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+# Las desactivaciones hechas fuera del proceso (SQL, scripts de admin) se ven al recargar
+TOKEN_REVOCATIONS_RELOAD_SECONDS = float(os.getenv("TOKEN_REVOCATIONS_RELOAD_SECONDS", "30"))
+_token_revocations_task: Optional[asyncio.Task] = None
+
+
+def _reload_token_revocations():
+    """Cargar los tokens invalidados (usuarios desactivados) persistidos en la BD"""
+    db = SessionLocal()
+    try:
+        for user_id in token_revocations.load(crud.get_token_revocations(db)):
+            user_cache.invalidate(user_id)
+    finally:
+        db.close()
+
+
+async def _reload_token_revocations_periodically():
+    while True:
+        await asyncio.sleep(TOKEN_REVOCATIONS_RELOAD_SECONDS)
+        try:
+            await run_in_threadpool(_reload_token_revocations)
+        except Exception as e:
+            print(f"[auth] Token revocations reload failed: {e}")
+
+
+@app.on_event("startup")
+async def load_token_revocations():
+    """Revocaciones al arrancar y luego cada TOKEN_REVOCATIONS_RELOAD_SECONDS"""
+    global _token_revocations_task
+    await run_in_threadpool(_reload_token_revocations)
+    _token_revocations_task = asyncio.create_task(_reload_token_revocations_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_token_revocations_reload():
+    if _token_revocations_task is not None:
+        _token_revocations_task.cancel()
+
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+
+@app.on_event("startup")
+async def start_speaking_turn_queue():
+    """Workers de la cola de turnos de speaking (modo job)"""
+    await speaking_turn_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_speaking_turn_queue():
+    await speaking_turn_queue.stop()
+
+
+@app.on_event("startup")
+async def start_opening_pool():
+    """Precalentar y reponer los saludos iniciales de speaking"""
+    opening_pool.start()
+
+
+@app.on_event("shutdown")
+async def stop_opening_pool():
+    await opening_pool.stop()
+
+
+@app.on_event("startup")
+async def start_message_corrections():
+    """Workers de la corrección gramatical diferida del chat (y pendientes de antes del reinicio)"""
+    await message_correction_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_message_corrections():
+    await message_correction_queue.stop()
+
+
+@app.on_event("startup")
+async def purge_grammar_cache():
+    """Borrar las correcciones gramaticales caducadas de la caché persistente"""
+    from src.grammar_cache import grammar_cache
+    try:
+        await grammar_cache.purge_expired()
+    except Exception as e:
+        print(f"[grammar-cache] Purge failed: {e}")
+
+
+@app.on_event("shutdown")
+async def drain_grammar_cache():
+    """No perder las escrituras de la caché gramatical que siguen en segundo plano"""
+    from src.grammar_cache import grammar_cache
+    await grammar_cache.drain()
+
+
 # ==================== AUTH FUNCTIONS ====================
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -60,27 +191,77 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def load_user(db: Session, user_id: int) -> Optional[models.User]:
+    """Fila del usuario desde el caché con TTL, o desde la base de datos"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = crud.get_user_by_id(db, user_id=user_id)
+        if user is not None:
+            db.expunge(user)
+            user_cache.put(user)
+    return user
+
+
+def _load_token_user(user_id: int) -> Optional[TokenUser]:
+    """Tokens emitidos antes de incluir rol/versión en los claims: se resuelven con la BD"""
+    db = SessionLocal()
+    try:
+        user = load_user(db, user_id)
+    finally:
+        db.close()
+    if user is None or not user.is_active:
+        return None
+    return TokenUser(id=user.id, role=user.role, version=user.token_version or 0)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenUser:
+    """
+    Autenticar solo con los claims del JWT (sin consultar la base de datos).
+    Los tokens de usuarios desactivados se rechazan vía token_revocations.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        user_id = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except PyJWTError:
+        user_id = int(user_id)
+    except (PyJWTError, ValueError):
         raise credentials_exception
     
-    user = crud.get_user_by_id(db, user_id=int(user_id))
-    if user is None:
+    if "role" in payload and "ver" in payload:
+        try:
+            current_user = TokenUser(id=user_id, role=models.UserRole(payload["role"]), version=int(payload["ver"]))
+        except ValueError:
+            raise credentials_exception
+    else:
+        current_user = await run_in_threadpool(_load_token_user, user_id)
+        if current_user is None:
+            raise credentials_exception
+    
+    if token_revocations.is_revoked(current_user.id, current_user.version):
+        raise credentials_exception
+    return current_user
+
+
+def get_current_user_row(
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> models.User:
+    """Para endpoints que necesitan el objeto ORM completo del usuario"""
+    user = load_user(db, current_user.id)
+    if user is None or not user.is_active:
         raise credentials_exception
     return user
 
 
-def get_current_teacher(current_user: models.User = Depends(get_current_user)):
+async def get_current_teacher(current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != models.UserRole.teacher:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -89,7 +270,7 @@ def get_current_teacher(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 
-def get_current_student(current_user: models.User = Depends(get_current_user)):
+async def get_current_student(current_user: TokenUser = Depends(get_current_user)):
     if current_user.role != models.UserRole.student:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -98,33 +279,77 @@ def get_current_student(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 
+# ==================== CONTENT CACHE ====================
+units_adapter = TypeAdapter(List[schemas.UnitWithDetails])
+quizzes_adapter = TypeAdapter(List[schemas.Quiz])
+audio_sentences_adapter = TypeAdapter(List[schemas.AudioSentence])
+
+
+def cached_content_response(
+    key: Hashable,
+    if_none_match: Optional[str],
+    build: Callable[[], Tuple[int, bytes]]
+) -> Response:
+    """
+    Servir contenido de curso desde el caché de respuestas serializadas.
+    build() solo se llama si no hay entrada válida y devuelve (course_id, body JSON).
+    Responde 304 si el cliente ya tiene la versión actual (If-None-Match).
+    """
+    entry = content_cache.get(key)
+    if entry is None:
+        snapshot = content_cache.snapshot()
+        course_id, body = build()
+        entry = content_cache.put(key, course_id, body, snapshot)
+    
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 # ==================== AUTH ENDPOINTS ====================
+password_busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many login attempts in progress, please retry",
+    headers={"Retry-After": "1"},
+)
+
+
 @app.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Registrar un nuevo usuario"""
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await async_crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    return crud.create_user(db=db, user=user)
+    try:
+        return await async_crud.create_user(db=db, user=user)
+    except PasswordHashingBusyError:
+        raise password_busy_exception
 
 
 @app.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Login y obtener token de acceso"""
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await async_crud.authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHashingBusyError:
+        raise password_busy_exception
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data={"sub": str(user.id), "role": user.role.value, "ver": user.token_version or 0},
+        expires_delta=access_token_expires
     )
     
     return {
@@ -140,7 +365,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 
 @app.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+def read_users_me(current_user: models.User = Depends(get_current_user_row)):
     """Obtener información del usuario actual"""
     return current_user
 
@@ -149,32 +374,57 @@ def read_users_me(current_user: models.User = Depends(get_current_user)):
 @app.post("/courses", response_model=schemas.Course, status_code=status.HTTP_201_CREATED)
 def create_course(
     course: schemas.CourseCreate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Crear un nuevo curso (solo profesores)"""
     return crud.create_course(db=db, course=course, teacher_id=current_teacher.id)
 
 
-@app.get("/courses", response_model=List[schemas.Course])
-def read_courses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Obtener lista de cursos"""
-    courses = crud.get_courses(db, skip=skip, limit=limit)
-    return courses
+@app.get("/courses", response_model=schemas.CoursePage)
+def read_courses(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
+    teacher_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Obtener catálogo de cursos publicados (paginado por cursor, más nuevos primero).
+    Los borradores solo los ve su profesor, vía /my-courses.
+    """
+    try:
+        courses, next_cursor = crud.get_courses(
+            db, limit=limit, cursor=cursor, published_only=True, teacher_id=teacher_id
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return {
+        "items": courses,
+        "next_cursor": next_cursor,
+        "total_estimate": crud.estimate_courses_count(db, published_only=True, teacher_id=teacher_id)
+    }
 
 
 @app.get("/courses/{course_id}", response_model=schemas.CourseWithDetails)
-def read_course(course_id: int, db: Session = Depends(get_db)):
+def read_course(
+    course_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Obtener detalles de un curso específico"""
-    course = crud.get_course(db, course_id=course_id)
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-    return course
+    def build():
+        course = crud.get_course(db, course_id=course_id, with_details=True)
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return course_id, schemas.CourseWithDetails.model_validate(course).model_dump_json().encode()
+    
+    return cached_content_response(("course", course_id), if_none_match, build)
 
 
 @app.get("/my-courses", response_model=List[schemas.Course])
 def read_my_courses(
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Obtener cursos del profesor actual"""
@@ -185,14 +435,14 @@ def read_my_courses(
 def update_course(
     course_id: int,
     course: schemas.CourseUpdate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Actualizar un curso (solo el profesor que lo creó)"""
-    db_course = crud.get_course(db, course_id=course_id)
+    db_course, is_owner = crud.get_owned_entity(db, models.Course, course_id, current_teacher.id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    if db_course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to update this course")
     
     return crud.update_course(db=db, course_id=course_id, course=course)
@@ -201,14 +451,14 @@ def update_course(
 @app.delete("/courses/{course_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_course(
     course_id: int,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Eliminar un curso (solo el profesor que lo creó)"""
-    db_course = crud.get_course(db, course_id=course_id)
+    db_course, is_owner = crud.get_owned_entity(db, models.Course, course_id, current_teacher.id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    if db_course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to delete this course")
     
     crud.delete_course(db=db, course_id=course_id)
@@ -219,54 +469,67 @@ def delete_course(
 @app.post("/units", response_model=schemas.Unit, status_code=status.HTTP_201_CREATED)
 def create_unit(
     unit: schemas.UnitCreate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Crear una nueva unidad (solo profesores)"""
     # Verificar que el curso existe y pertenece al profesor
-    course = crud.get_course(db, course_id=unit.course_id)
+    course, is_owner = crud.get_owned_entity(db, models.Course, unit.course_id, current_teacher.id)
     if course is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to add units to this course")
     
     return crud.create_unit(db=db, unit=unit)
 
 
 @app.get("/courses/{course_id}/units", response_model=List[schemas.UnitWithDetails])
-def read_course_units(course_id: int, db: Session = Depends(get_db)):
+def read_course_units(
+    course_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Obtener todas las unidades de un curso"""
-    course = crud.get_course(db, course_id=course_id)
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
+    def build():
+        course = crud.get_course(db, course_id=course_id)
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        
+        units = crud.get_course_units(db, course_id=course_id, with_details=True)
+        return course_id, units_adapter.dump_json(units_adapter.validate_python(units, from_attributes=True))
     
-    return crud.get_course_units(db, course_id=course_id)
+    return cached_content_response(("course_units", course_id), if_none_match, build)
 
 
 @app.get("/units/{unit_id}", response_model=schemas.UnitWithDetails)
-def read_unit(unit_id: int, db: Session = Depends(get_db)):
+def read_unit(
+    unit_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Obtener detalles de una unidad específica"""
-    unit = crud.get_unit(db, unit_id=unit_id)
-    if unit is None:
-        raise HTTPException(status_code=404, detail="Unit not found")
-    return unit
+    def build():
+        unit = crud.get_unit(db, unit_id=unit_id, with_details=True)
+        if unit is None:
+            raise HTTPException(status_code=404, detail="Unit not found")
+        return unit.course_id, schemas.UnitWithDetails.model_validate(unit).model_dump_json().encode()
+    
+    return cached_content_response(("unit", unit_id), if_none_match, build)
 
 
 @app.put("/units/{unit_id}", response_model=schemas.Unit)
 def update_unit(
     unit_id: int,
     unit: schemas.UnitUpdate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Actualizar una unidad"""
-    db_unit = crud.get_unit(db, unit_id=unit_id)
+    # Verificar que existe y que el profesor es dueño del curso (una sola query)
+    db_unit, is_owner = crud.get_owned_entity(db, models.Unit, unit_id, current_teacher.id)
     if db_unit is None:
         raise HTTPException(status_code=404, detail="Unit not found")
-    
-    # Verificar que el profesor es dueño del curso
-    course = crud.get_course(db, course_id=db_unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to update this unit")
     
     return crud.update_unit(db=db, unit_id=unit_id, unit=unit)
@@ -275,16 +538,14 @@ def update_unit(
 @app.delete("/units/{unit_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_unit(
     unit_id: int,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Eliminar una unidad"""
-    db_unit = crud.get_unit(db, unit_id=unit_id)
+    db_unit, is_owner = crud.get_owned_entity(db, models.Unit, unit_id, current_teacher.id)
     if db_unit is None:
         raise HTTPException(status_code=404, detail="Unit not found")
-    
-    course = crud.get_course(db, course_id=db_unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to delete this unit")
     
     crud.delete_unit(db=db, unit_id=unit_id)
@@ -295,7 +556,7 @@ def delete_unit(
 @app.post("/courses/complete", response_model=schemas.CourseWithDetails, status_code=status.HTTP_201_CREATED)
 def create_complete_course(
     course_data: schemas.CourseComplete,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """
@@ -344,47 +605,50 @@ def create_complete_course(
 @app.post("/quizzes", response_model=schemas.Quiz, status_code=status.HTTP_201_CREATED)
 def create_quiz(
     quiz: schemas.QuizCreate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Crear un nuevo quiz"""
     # Verificar que la unidad existe y pertenece a un curso del profesor
-    unit = crud.get_unit(db, unit_id=quiz.unit_id)
+    unit, is_owner = crud.get_owned_entity(db, models.Unit, quiz.unit_id, current_teacher.id)
     if unit is None:
         raise HTTPException(status_code=404, detail="Unit not found")
-    
-    course = crud.get_course(db, course_id=unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to add quizzes to this unit")
     
     return crud.create_quiz(db=db, quiz=quiz)
 
 
 @app.get("/units/{unit_id}/quizzes", response_model=List[schemas.Quiz])
-def read_unit_quizzes(unit_id: int, db: Session = Depends(get_db)):
+def read_unit_quizzes(
+    unit_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Obtener todos los quizzes de una unidad"""
-    unit = crud.get_unit(db, unit_id=unit_id)
-    if unit is None:
-        raise HTTPException(status_code=404, detail="Unit not found")
+    def build():
+        unit = crud.get_unit(db, unit_id=unit_id)
+        if unit is None:
+            raise HTTPException(status_code=404, detail="Unit not found")
+        
+        quizzes = crud.get_unit_quizzes(db, unit_id=unit_id)
+        return unit.course_id, quizzes_adapter.dump_json(quizzes_adapter.validate_python(quizzes, from_attributes=True))
     
-    return crud.get_unit_quizzes(db, unit_id=unit_id)
+    return cached_content_response(("unit_quizzes", unit_id), if_none_match, build)
 
 
 @app.put("/quizzes/{quiz_id}", response_model=schemas.Quiz)
 def update_quiz(
     quiz_id: int,
     quiz: schemas.QuizUpdate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Actualizar un quiz"""
-    db_quiz = crud.get_quiz(db, quiz_id=quiz_id)
+    db_quiz, is_owner = crud.get_owned_entity(db, models.Quiz, quiz_id, current_teacher.id)
     if db_quiz is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    
-    unit = crud.get_unit(db, unit_id=db_quiz.unit_id)
-    course = crud.get_course(db, course_id=unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to update this quiz")
     
     return crud.update_quiz(db=db, quiz_id=quiz_id, quiz=quiz)
@@ -393,17 +657,14 @@ def update_quiz(
 @app.delete("/quizzes/{quiz_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_quiz(
     quiz_id: int,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Eliminar un quiz"""
-    db_quiz = crud.get_quiz(db, quiz_id=quiz_id)
+    db_quiz, is_owner = crud.get_owned_entity(db, models.Quiz, quiz_id, current_teacher.id)
     if db_quiz is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    
-    unit = crud.get_unit(db, unit_id=db_quiz.unit_id)
-    course = crud.get_course(db, course_id=unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to delete this quiz")
     
     crud.delete_quiz(db=db, quiz_id=quiz_id)
@@ -414,46 +675,51 @@ def delete_quiz(
 @app.post("/audio-sentences", response_model=schemas.AudioSentence, status_code=status.HTTP_201_CREATED)
 def create_audio_sentence(
     audio: schemas.AudioSentenceCreate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Crear una nueva oración con audio"""
-    unit = crud.get_unit(db, unit_id=audio.unit_id)
+    unit, is_owner = crud.get_owned_entity(db, models.Unit, audio.unit_id, current_teacher.id)
     if unit is None:
         raise HTTPException(status_code=404, detail="Unit not found")
-    
-    course = crud.get_course(db, course_id=unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to add audio to this unit")
     
     return crud.create_audio_sentence(db=db, audio=audio)
 
 
 @app.get("/units/{unit_id}/audio-sentences", response_model=List[schemas.AudioSentence])
-def read_unit_audio_sentences(unit_id: int, db: Session = Depends(get_db)):
+def read_unit_audio_sentences(
+    unit_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Obtener todas las oraciones con audio de una unidad"""
-    unit = crud.get_unit(db, unit_id=unit_id)
-    if unit is None:
-        raise HTTPException(status_code=404, detail="Unit not found")
+    def build():
+        unit = crud.get_unit(db, unit_id=unit_id)
+        if unit is None:
+            raise HTTPException(status_code=404, detail="Unit not found")
+        
+        sentences = crud.get_unit_audio_sentences(db, unit_id=unit_id)
+        return unit.course_id, audio_sentences_adapter.dump_json(
+            audio_sentences_adapter.validate_python(sentences, from_attributes=True)
+        )
     
-    return crud.get_unit_audio_sentences(db, unit_id=unit_id)
+    return cached_content_response(("unit_audio_sentences", unit_id), if_none_match, build)
 
 
 @app.put("/audio-sentences/{audio_id}", response_model=schemas.AudioSentence)
 def update_audio_sentence(
     audio_id: int,
     audio: schemas.AudioSentenceUpdate,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Actualizar una oración con audio"""
-    db_audio = crud.get_audio_sentence(db, audio_id=audio_id)
+    db_audio, is_owner = crud.get_owned_entity(db, models.AudioSentence, audio_id, current_teacher.id)
     if db_audio is None:
         raise HTTPException(status_code=404, detail="Audio sentence not found")
-    
-    unit = crud.get_unit(db, unit_id=db_audio.unit_id)
-    course = crud.get_course(db, course_id=unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to update this audio sentence")
     
     return crud.update_audio_sentence(db=db, audio_id=audio_id, audio=audio)
@@ -462,17 +728,14 @@ def update_audio_sentence(
 @app.delete("/audio-sentences/{audio_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_audio_sentence(
     audio_id: int,
-    current_teacher: models.User = Depends(get_current_teacher),
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Eliminar una oración con audio"""
-    db_audio = crud.get_audio_sentence(db, audio_id=audio_id)
+    db_audio, is_owner = crud.get_owned_entity(db, models.AudioSentence, audio_id, current_teacher.id)
     if db_audio is None:
         raise HTTPException(status_code=404, detail="Audio sentence not found")
-    
-    unit = crud.get_unit(db, unit_id=db_audio.unit_id)
-    course = crud.get_course(db, course_id=unit.course_id)
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to delete this audio sentence")
     
     crud.delete_audio_sentence(db=db, audio_id=audio_id)
@@ -483,7 +746,7 @@ def delete_audio_sentence(
 @app.post("/enrollments", response_model=schemas.Enrollment, status_code=status.HTTP_201_CREATED)
 def enroll_in_course(
     enrollment: schemas.EnrollmentCreate,
-    current_student: models.User = Depends(get_current_student),
+    current_student: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Inscribirse en un curso (solo estudiantes)"""
@@ -504,7 +767,7 @@ def enroll_in_course(
 
 @app.get("/my-enrollments", response_model=List[schemas.Enrollment])
 def read_my_enrollments(
-    current_student: models.User = Depends(get_current_student),
+    current_student: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Obtener mis inscripciones (solo estudiantes)"""
@@ -517,7 +780,7 @@ def read_my_enrollments(
 # ==================== FRIENDSHIP ENDPOINTS ====================
 @app.get("/students", response_model=List[schemas.User])
 def get_all_students(
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Obtener lista de todos los estudiantes (para buscar amigos)"""
@@ -527,7 +790,7 @@ def get_all_students(
 @app.post("/friend-requests", response_model=schemas.FriendshipResponse)
 def send_friend_request(
     receiver_id: int,
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Enviar solicitud de amistad"""
@@ -539,7 +802,7 @@ def send_friend_request(
 
 @app.get("/friend-requests", response_model=List[schemas.FriendshipResponse])
 def get_friend_requests(
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Obtener solicitudes de amistad pendientes"""
@@ -549,7 +812,7 @@ def get_friend_requests(
 @app.post("/friend-requests/{friendship_id}/accept")
 def accept_friend_request(
     friendship_id: int,
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Aceptar solicitud de amistad"""
@@ -562,7 +825,7 @@ def accept_friend_request(
 @app.post("/friend-requests/{friendship_id}/reject")
 def reject_friend_request(
     friendship_id: int,
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Rechazar solicitud de amistad"""
@@ -574,7 +837,7 @@ def reject_friend_request(
 
 @app.get("/friends", response_model=List[schemas.User])
 def get_friends(
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Obtener lista de amigos"""
@@ -583,42 +846,83 @@ def get_friends(
 
 # ==================== MESSAGE ENDPOINTS ====================
 @app.post("/messages", response_model=schemas.MessageResponse)
-def send_message(
+async def send_message(
     message: schemas.MessageCreate,
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Enviar mensaje (con corrección gramatical automática)"""
-    return crud.send_message(db, current_user.id, message.receiver_id, message.content)
+    """
+    Enviar mensaje. Se guarda al momento con correction_status='pending'; la corrección
+    gramatical llega después como evento 'message_corrected' (GET /messages/events)
+    """
+    if not await async_crud.are_friends(db, current_user.id, message.receiver_id):
+        raise HTTPException(status_code=403, detail="You can only message friends")
+    return await async_crud.send_message(db, current_user.id, message.receiver_id, message.content)
 
 
-@app.get("/conversations", response_model=List[schemas.ConversationPreview])
-def get_conversations(
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+# Keep-alive para que proxies no corten la conexión SSE sin eventos
+MESSAGE_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("MESSAGE_EVENTS_KEEPALIVE_SECONDS", "20"))
+
+
+@app.get("/messages/events")
+async def message_events_stream(current_user: TokenUser = Depends(get_current_student)):
+    """Eventos del chat del usuario (Server-Sent Events): message_corrected"""
+    queue = message_events.subscribe(current_user.id)
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), MESSAGE_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event, data)
+        finally:
+            message_events.unsubscribe(current_user.id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/conversations", response_model=schemas.ConversationPage)
+async def get_conversations(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Obtener lista de conversaciones"""
-    return crud.get_conversations(db, current_user.id)
+    """Obtener lista de conversaciones (más recientes primero, paginada por cursor)"""
+    try:
+        conversations, next_cursor = await async_crud.get_conversations(
+            db, current_user.id, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": conversations, "next_cursor": next_cursor}
 
 
 @app.get("/conversations/{other_user_id}", response_model=List[schemas.MessageResponse])
-def get_conversation(
+async def get_conversation(
     other_user_id: int,
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener conversación con un usuario específico"""
     # Marcar como leídos
-    crud.mark_messages_as_read(db, current_user.id, other_user_id)
+    await async_crud.mark_messages_as_read(db, current_user.id, other_user_id)
     
-    messages = crud.get_conversation(db, current_user.id, other_user_id)
+    messages = await async_crud.get_conversation(db, current_user.id, other_user_id)
     return list(reversed(messages))  # Ordenar cronológicamente
 
 
 @app.post("/grammar-check")
 def check_grammar_endpoint(
     text: str,
-    current_user: models.User = Depends(get_current_student)
+    current_user: TokenUser = Depends(get_current_student)
 ):
     """Verificar gramática de un texto"""
     from src.grammar_checker import check_grammar, get_corrections_summary
@@ -632,33 +936,35 @@ def check_grammar_endpoint(
     }
 
 
-@app.get("/courses/{course_id}/students", response_model=List[schemas.User])
+@app.get("/courses/{course_id}/students", response_model=schemas.CourseRosterPage)
 def get_course_students(
     course_id: int,
-    current_teacher: models.User = Depends(get_current_teacher),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    search: Optional[str] = None,
+    current_teacher: TokenUser = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """Obtener estudiantes inscritos en un curso (solo profesores del curso)"""
     # Verificar que el curso existe y pertenece al profesor
-    course = crud.get_course(db, course_id=course_id)
+    course, is_owner = crud.get_owned_entity(db, models.Course, course_id, current_teacher.id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
-    if course.teacher_id != current_teacher.id:
+    if not is_owner:
         raise HTTPException(status_code=403, detail="Not authorized to view students of this course")
     
-    # Obtener enrollments del curso
-    enrollments_list = db.query(models.Enrollment).filter(
-        models.Enrollment.course_id == course_id
-    ).all()
-    
-    # Obtener los estudiantes
-    students = []
-    for enrollment in enrollments_list:
-        student = crud.get_user_by_id(db, enrollment.student_id)
-        if student:
-            students.append(student)
+    try:
+        roster, next_cursor = crud.get_course_roster(
+            db, course_id, limit=limit, cursor=cursor, search=search
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    return students
+    return {
+        "items": roster,
+        "next_cursor": next_cursor,
+        "total": crud.count_course_students(db, course_id, search=search)
+    }
 
 
 # ==================== ROOT ====================
@@ -673,23 +979,21 @@ def root():
 
 # ==================== SPEAKING PRACTICE ENDPOINTS ====================
 from fastapi import UploadFile, File
-import shutil
 from pathlib import Path
 
-# Directorio temporal para audios subidos
-TEMP_AUDIO_DIR = Path("temp_audio")
-TEMP_AUDIO_DIR.mkdir(exist_ok=True)
-
 
 @app.post("/speaking/sessions", response_model=schemas.SpeakingSessionResponse)
-def create_speaking_session_endpoint(
+async def create_speaking_session_endpoint(
     session_data: schemas.SpeakingSessionCreate,
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Crear nueva sesión de speaking con IA"""
+    """
+    Crear nueva sesión de speaking con IA.
+    El saludo inicial sale del pool pre-generado o llega poco después (ver src/opening_pool.py)
+    """
     try:
-        session = crud.create_speaking_session(
+        session = await async_crud.create_speaking_session(
             db=db,
             student_id=current_user.id,
             topic=session_data.topic,
@@ -702,22 +1006,22 @@ def create_speaking_session_endpoint(
 
 
 @app.get("/speaking/sessions", response_model=List[schemas.SpeakingSessionResponse])
-def get_my_speaking_sessions(
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+async def get_my_speaking_sessions(
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener sesiones de speaking del estudiante"""
-    return crud.get_student_speaking_sessions(db, current_user.id)
+    return await async_crud.get_student_speaking_sessions(db, current_user.id)
 
 
 @app.get("/speaking/sessions/{session_id}", response_model=schemas.SpeakingSessionWithMessages)
-def get_speaking_session_detail(
+async def get_speaking_session_detail(
     session_id: int,
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener detalles de una sesión con mensajes"""
-    session = crud.get_speaking_session(db, session_id)
+    session = await async_crud.get_speaking_session(db, session_id, with_messages=True)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     if session.student_id != current_user.id:
@@ -727,21 +1031,38 @@ def get_speaking_session_detail(
 
 
 from src.openai_service import STTQuotaExceededError  # importa la excepción
-import shutil
+from src.speaking_stream import stream_speaking_turn
+from fastapi.responses import JSONResponse
+from src.audio_upload import read_audio_upload, audio_filename, AudioTooLargeError, EmptyAudioError
+from src.metrics import TurnTimings, render_metrics
+
+
+async def read_speaking_audio(audio: UploadFile, timings: TurnTimings) -> bytes:
+    """Audio del turno en memoria (sin archivos temporales), con límite de tamaño"""
+    try:
+        with timings.stage("upload"):
+            return await read_audio_upload(audio)
+    except AudioTooLargeError:
+        raise HTTPException(status_code=413, detail="Audio file too large")
+    except EmptyAudioError:
+        raise HTTPException(status_code=400, detail="Empty audio file")
+
 
 @app.post("/speaking/sessions/{session_id}/message")
 async def send_speaking_message(
     session_id: int,
     audio: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    mode: str = Query("sync", pattern="^(sync|job)$"),
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Enviar mensaje de voz y recibir respuesta del asistente.
-    Ahora devuelve AMBOS mensajes (user y assistant) con corrección gramatical
+    Ahora devuelve AMBOS mensajes (user y assistant) con corrección gramatical.
+    Con mode=job responde 202 con el job encolado (ver GET /speaking/jobs/{job_id})
     """
     # 1) Verificar sesión y permisos
-    session = crud.get_speaking_session(db, session_id)
+    session = await async_crud.get_speaking_session(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     if session.student_id != current_user.id:
@@ -749,15 +1070,28 @@ async def send_speaking_message(
     if not session.is_active:
         raise HTTPException(status_code=400, detail="Session is not active")
 
-    # 2) Guardar audio temporalmente
-    temp_file_path = TEMP_AUDIO_DIR / f"temp_{session_id}_{audio.filename}"
+    # 2) Leer el audio en memoria (límite de tamaño aplicado mientras se recibe, ver AudioUploadLimitMiddleware)
+    timings = TurnTimings()
+    audio_bytes = await read_speaking_audio(audio, timings)
 
-    try:
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(audio.file, buffer)
+    if mode == "job":
+        try:
+            job = await speaking_turn_queue.enqueue(db, session, audio_filename(audio), audio_bytes)
+        except SpeakingQueueFullError:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many speaking turns queued, try again shortly",
+                headers={"Retry-After": "5"}
+            )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=await speaking_job_response(db, job),
+            headers={"Location": f"/speaking/jobs/{job.id}"}
+        )
 
-        # 3) Procesar mensaje (transcribe -> corrige -> genera respuesta -> TTS)
-        result = crud.add_speaking_message(db, session_id, str(temp_file_path))
+    try:
+        # 3) Procesar mensaje (transcribe -> corrige + genera respuesta -> TTS), todo async
+        result = await async_crud.add_speaking_message(db, session, audio_filename(audio), audio_bytes, timings=timings)
         
         # 4) Convertir a schemas para respuesta
         user_message = schemas.SpeakingMessageResponse.from_orm(result["user_message"])
@@ -779,19 +1113,105 @@ async def send_speaking_message(
             status_code=500, 
             detail=f"Error processing audio: {str(e)}"
         )
-    finally:
-        # 6) Limpiar archivo temporal
+
+
+async def speaking_job_response(db: AsyncSession, job: models.SpeakingTurnJob) -> dict:
+    result = None
+    if job.status == models.SpeakingJobStatus.done:
+        result = await async_crud.get_speaking_turn_result(db, job)
+    return schemas.SpeakingTurnJobResponse(
+        id=job.id,
+        session_id=job.session_id,
+        status=job.status.value,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        error_status=job.error_status,
+        result=result
+    ).model_dump(mode="json")
+
+
+@app.get("/speaking/jobs/{job_id}", response_model=schemas.SpeakingTurnJobResponse)
+async def get_speaking_job(
+    job_id: int,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Estado de un turno encolado; con wait=N espera hasta N segundos a que termine"""
+    job = await async_crud.get_speaking_turn_job(db, job_id)
+    if not job or job.student_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if wait and job.status in (models.SpeakingJobStatus.queued, models.SpeakingJobStatus.running):
+        await speaking_turn_queue.wait(job_id, wait)
+        await db.refresh(job)
+
+    return await speaking_job_response(db, job)
+
+
+@app.post("/speaking/sessions/{session_id}/message/stream")
+async def stream_speaking_message(
+    session_id: int,
+    audio: UploadFile = File(...),
+    current_user: TokenUser = Depends(get_current_student),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Igual que POST /speaking/sessions/{id}/message pero en streaming (Server-Sent Events):
+    transcript -> token* -> audio*/audio_end -> grammar -> done (ver src/speaking_stream.py)
+    """
+    session = await async_crud.get_speaking_session(db, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.student_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not session.is_active:
+        raise HTTPException(status_code=400, detail="Session is not active")
+
+    timings = TurnTimings()
+    audio_bytes = await read_speaking_audio(audio, timings)
+    filename = audio_filename(audio)
+
+    async def event_stream():
         try:
-            if temp_file_path.exists():
-                temp_file_path.unlink()
-        except Exception:
-            pass
+            async for event, data in stream_speaking_turn(session, filename, audio_bytes, timings=timings):
+                yield sse_event(event, data)
+        except STTQuotaExceededError:
+            yield sse_event("error", {"status": 429, "detail": "STT quota exceeded. Please check your OpenAI billing."})
+        except Exception as e:
+            yield sse_event("error", {"status": 500, "detail": f"Error processing audio: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/speaking/tts-cache/stats")
+def get_tts_cache_stats(current_teacher: TokenUser = Depends(get_current_teacher)):
+    """Aciertos / fallos / tamaño de la caché de audios de TTS (y del pool de saludos)"""
+    return {**speech_cache.stats(), "openings": opening_pool.stats()}
+
+
+# Token para el scraper de Prometheus (sin token configurado, /metrics es público)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@app.get("/metrics")
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """Histogramas de latencia y contadores de errores por etapa (formato de texto de Prometheus)"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/speaking/sessions/{session_id}/end")
 def end_speaking_session_endpoint(
     session_id: int,
-    current_user: models.User = Depends(get_current_student),
+    current_user: TokenUser = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """Finalizar sesión de speaking"""
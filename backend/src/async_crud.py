@@ -0,0 +1,362 @@
+"""
+Versiones async (AsyncSession) de las operaciones más usadas de crud.
+
+Mismas firmas y resultados que las funciones de src/crud.py, para que los
+endpoints puedan migrar a `async def` + get_async_db uno a uno.
+Con AsyncSession no hay lazy loading: todo lo que se serializa se carga aquí.
+"""
+import asyncio
+
+from sqlalchemy import select, update, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from src import models
+from src import schemas
+from src.password_hashing import password_hasher
+from src.conversation_context import load_context, record_turn, schedule_fold
+from src.friend_cache import friend_cache
+from src.metrics import TurnTimings, error_outcome
+from src.crud import (
+    _course_tree_options,
+    _unit_details_options,
+    _conversations_statement,
+    _conversations_page,
+    _friend_id_column,
+    _accepted_friendships,
+    encode_cursor,
+    decode_cursor,
+)
+
+
+# ==================== USERS ====================
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    query = select(models.User).where(models.User.email == email)
+    return (await db.execute(query)).scalars().first()
+
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User:
+    """Crear usuario; el hash de bcrypt se calcula en el pool de procesos"""
+    db_user = models.User(
+        email=user.email,
+        password=await password_hasher.hash(user.password),
+        name=user.name,
+        role=user.role
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[models.User]:
+    """
+    Verificar credenciales en el pool de procesos.
+    Si el hash tiene un cost distinto de BCRYPT_ROUNDS se rehace de forma transparente.
+    """
+    user = await get_user_by_email(db, email)
+    if not user:
+        return None
+    if not await password_hasher.verify(password, user.password):
+        return None
+    if password_hasher.needs_rehash(user.password):
+        user.password = await password_hasher.hash(password)
+        await db.commit()
+    return user
+
+
+# ==================== COURSES ====================
+async def get_course(db: AsyncSession, course_id: int, with_details: bool = False) -> Optional[models.Course]:
+    query = select(models.Course).where(models.Course.id == course_id)
+    if with_details:
+        query = query.options(*_course_tree_options())
+    return (await db.execute(query)).scalars().first()
+
+
+async def get_courses(
+    db: AsyncSession,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    published_only: bool = True,
+    teacher_id: Optional[int] = None
+) -> Tuple[List[models.Course], Optional[str]]:
+    """Catálogo paginado por keyset (ver crud.get_courses)"""
+    query = select(models.Course)
+    if published_only:
+        query = query.where(models.Course.is_published == True)
+    if teacher_id is not None:
+        query = query.where(models.Course.teacher_id == teacher_id)
+    if cursor:
+        created_at, course_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(models.Course.created_at, models.Course.id) < tuple_(created_at, course_id)
+        )
+
+    query = query\
+        .order_by(models.Course.created_at.desc(), models.Course.id.desc())\
+        .limit(limit + 1)
+    courses = list((await db.execute(query)).scalars().all())
+
+    next_cursor = None
+    if len(courses) > limit:
+        next_cursor = encode_cursor(courses[limit - 1].created_at, courses[limit - 1].id)
+    return courses[:limit], next_cursor
+
+
+async def get_teacher_courses(db: AsyncSession, teacher_id: int) -> List[models.Course]:
+    query = select(models.Course).where(models.Course.teacher_id == teacher_id)
+    return list((await db.execute(query)).scalars().all())
+
+
+# ==================== UNITS ====================
+async def get_unit(db: AsyncSession, unit_id: int, with_details: bool = False) -> Optional[models.Unit]:
+    query = select(models.Unit).where(models.Unit.id == unit_id)
+    if with_details:
+        query = query.options(*_unit_details_options())
+    return (await db.execute(query)).scalars().first()
+
+
+async def get_course_units(db: AsyncSession, course_id: int, with_details: bool = False) -> List[models.Unit]:
+    query = select(models.Unit)\
+        .where(models.Unit.course_id == course_id)\
+        .order_by(models.Unit.order)
+    if with_details:
+        query = query.options(*_unit_details_options())
+    return list((await db.execute(query)).scalars().all())
+
+
+# ==================== FRIENDS ====================
+async def get_friend_ids(db: AsyncSession, user_id: int) -> FrozenSet[int]:
+    """Ids de los amigos aceptados, desde la caché del grafo de amistades"""
+    friend_ids = friend_cache.get(user_id)
+    if friend_ids is None:
+        generation = friend_cache.generation()
+        query = select(_friend_id_column(user_id)).where(*_accepted_friendships(user_id))
+        friend_ids = frozenset((await db.execute(query)).scalars().all())
+        friend_cache.put(user_id, friend_ids, generation)
+    return friend_ids
+
+
+async def are_friends(db: AsyncSession, user_id: int, other_user_id: int) -> bool:
+    """Comprobar amistad en O(1) una vez cacheada la lista del usuario"""
+    return other_user_id in await get_friend_ids(db, user_id)
+
+
+# ==================== MESSAGES ====================
+async def send_message(db: AsyncSession, sender_id: int, receiver_id: int, content: str) -> models.Message:
+    """Guardar el mensaje al momento; la corrección gramatical llega después (ver crud.send_message)"""
+    from src.message_corrections import message_correction_queue
+    
+    message = models.Message(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        content=content,
+        corrected_content=None,
+        correction_status="pending",
+        is_read=False
+    )
+    db.add(message)
+    await db.commit()
+    message_correction_queue.schedule(message.id)
+    return message
+
+
+async def get_conversation(db: AsyncSession, user1_id: int, user2_id: int, limit: int = 50) -> List[models.Message]:
+    """Obtener conversación entre dos usuarios (más recientes primero)"""
+    query = select(models.Message).where(
+        ((models.Message.sender_id == user1_id) & (models.Message.receiver_id == user2_id)) |
+        ((models.Message.sender_id == user2_id) & (models.Message.receiver_id == user1_id))
+    ).order_by(models.Message.created_at.desc()).limit(limit)
+    return list((await db.execute(query)).scalars().all())
+
+
+async def get_conversations(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Obtener lista de conversaciones con preview del último mensaje (ver crud.get_conversations)"""
+    rows = (await db.execute(_conversations_statement(user_id, limit, cursor))).all()
+    return _conversations_page(rows, limit)
+
+
+async def mark_messages_as_read(db: AsyncSession, user_id: int, sender_id: int):
+    """Marcar mensajes como leídos"""
+    await db.execute(
+        update(models.Message).where(
+            models.Message.sender_id == sender_id,
+            models.Message.receiver_id == user_id,
+            models.Message.is_read == False
+        ).values(is_read=True)
+    )
+    await db.commit()
+
+
+# ==================== SPEAKING PRACTICE ====================
+async def create_speaking_session(
+    db: AsyncSession,
+    student_id: int,
+    topic: str,
+    conversation_type: str,
+    difficulty_level: str
+) -> models.SpeakingSession:
+    """
+    Crear sesión sin esperar a GPT/TTS: el saludo sale del pool pre-generado
+    o, si la combinación no está en el pool, se genera en segundo plano.
+    """
+    from src.openai_service import generate_system_prompt
+    from src.opening_pool import opening_pool, schedule_opening_message
+    
+    session = models.SpeakingSession(
+        student_id=student_id,
+        topic=topic,
+        conversation_type=conversation_type,
+        difficulty_level=difficulty_level,
+        system_prompt=generate_system_prompt(topic, conversation_type, difficulty_level),
+        is_active=True
+    )
+    db.add(session)
+    
+    opening = opening_pool.take(topic, conversation_type, difficulty_level)
+    if opening:
+        await db.flush()
+        db.add(models.SpeakingMessage(
+            session_id=session.id,
+            role="assistant",
+            content=opening.content,
+            audio_path=opening.audio_path
+        ))
+    await db.commit()
+    
+    if not opening:
+        schedule_opening_message(session.id, topic, conversation_type, difficulty_level)
+    return session
+
+
+async def get_speaking_session(
+    db: AsyncSession,
+    session_id: int,
+    with_messages: bool = False
+) -> Optional[models.SpeakingSession]:
+    """Obtener sesión por ID (con with_messages=True incluye los mensajes)"""
+    query = select(models.SpeakingSession).where(models.SpeakingSession.id == session_id)
+    if with_messages:
+        query = query.options(selectinload(models.SpeakingSession.messages))
+    return (await db.execute(query)).scalars().first()
+
+
+async def get_speaking_text_for_audio(db: AsyncSession, audio_path: str) -> Optional[str]:
+    """Texto de un mensaje de speaking que usa ese audio (para regenerar un clip expulsado de la caché)"""
+    return (await db.execute(
+        select(models.SpeakingMessage.content).where(models.SpeakingMessage.audio_path == audio_path).limit(1)
+    )).scalar()
+
+
+async def get_student_speaking_sessions(db: AsyncSession, student_id: int) -> List[models.SpeakingSession]:
+    """Obtener sesiones de un estudiante"""
+    query = select(models.SpeakingSession).where(
+        models.SpeakingSession.student_id == student_id
+    ).order_by(models.SpeakingSession.created_at.desc())
+    return list((await db.execute(query)).scalars().all())
+
+
+async def get_session_messages(db: AsyncSession, session_id: int) -> List[models.SpeakingMessage]:
+    """Obtener mensajes de una sesión"""
+    query = select(models.SpeakingMessage).where(
+        models.SpeakingMessage.session_id == session_id
+    ).order_by(models.SpeakingMessage.created_at)
+    return list((await db.execute(query)).scalars().all())
+
+
+async def add_speaking_message(
+    db: AsyncSession,
+    session: models.SpeakingSession,
+    audio_filename: str,
+    audio_bytes: bytes,
+    timings: Optional[TurnTimings] = None
+) -> Dict[str, Any]:
+    """
+    Turno de speaking sin bloquear el event loop.
+    La corrección gramatical y la respuesta del asistente no dependen entre sí: van en paralelo.
+    Cada etapa se mide en timings (src/metrics.py) y se guarda en el mensaje del usuario.
+    """
+    from src.openai_service import transcribe_audio_bytes_async, generate_response_async, text_to_speech_async
+    from src.grammar_checker import check_grammar_async
+    from src.providers import CHAT_MODEL, STT_MODEL, TTS_MODEL
+    
+    timings = timings or TurnTimings()
+    try:
+        # 1. Transcribir audio del estudiante (directamente desde memoria)
+        with timings.stage("stt", STT_MODEL):
+            user_text = await transcribe_audio_bytes_async(audio_filename, audio_bytes)
+        
+        # 2. Contexto acotado (resumen + turnos recientes) + mensaje nuevo
+        with timings.stage("context", "db"):
+            context = await load_context(db, session)
+        conversation_history = context.build_messages(user_text)
+        
+        # 3. Gramática y respuesta del asistente en paralelo
+        grammar_result, assistant_text = await asyncio.gather(
+            timings.measure("grammar", CHAT_MODEL, check_grammar_async(user_text)),
+            timings.measure("reply", CHAT_MODEL, generate_response_async(conversation_history))
+        )
+        corrected_text = grammar_result['corrected'] if grammar_result['has_errors'] else None
+        
+        # 4. Audio de la respuesta (caché por contenido: frases repetidas no vuelven a sintetizarse)
+        with timings.stage("tts", TTS_MODEL):
+            assistant_audio_path = await text_to_speech_async(assistant_text)
+        
+        # 5. Guardar ambos mensajes (los tiempos del commit solo van a las métricas)
+        user_message = models.SpeakingMessage(
+            session_id=session.id,
+            role="user",
+            content=user_text,
+            corrected_content=corrected_text,
+            audio_path=None,
+            stage_timings=timings.as_dict()
+        )
+        assistant_message = models.SpeakingMessage(
+            session_id=session.id,
+            role="assistant",
+            content=assistant_text,
+            corrected_content=None,
+            audio_path=assistant_audio_path
+        )
+        with timings.stage("db_commit", "db"):
+            db.add(user_message)
+            await db.flush()
+            db.add(assistant_message)
+            await db.commit()
+    except BaseException as e:
+        timings.finish(error_outcome(e))
+        raise
+    timings.finish()
+    
+    record_turn(session.id, user_message, assistant_message)
+    schedule_fold(session.id)
+    
+    return {
+        "user_message": user_message,
+        "assistant_message": assistant_message
+    }
+
+
+async def get_speaking_turn_job(db: AsyncSession, job_id: int) -> Optional[models.SpeakingTurnJob]:
+    """Obtener un turno encolado por ID"""
+    return await db.get(models.SpeakingTurnJob, job_id)
+
+
+async def get_speaking_turn_result(db: AsyncSession, job: models.SpeakingTurnJob) -> Optional[Dict[str, Any]]:
+    """Mensajes (user y assistant) generados por un job terminado"""
+    if job.user_message_id is None or job.assistant_message_id is None:
+        return None
+    query = select(models.SpeakingMessage).where(
+        models.SpeakingMessage.id.in_([job.user_message_id, job.assistant_message_id])
+    )
+    messages = {msg.id: msg for msg in (await db.execute(query)).scalars().all()}
+    return {
+        "user_message": messages.get(job.user_message_id),
+        "assistant_message": messages.get(job.assistant_message_id)
+    }
@@ -0,0 +1,120 @@
+"""
+Lectura acotada de los audios subidos en los turnos de speaking
+
+El audio se lee en memoria por trozos y se envía tal cual a Whisper: no se
+escribe en disco. Starlette recibe y guarda el multipart completo antes de
+llamar al endpoint, así que el límite se aplica antes, en
+AudioUploadLimitMiddleware: rechaza por Content-Length y, si no viene
+(chunked), cuenta los bytes del cuerpo según llegan y corta con 413 en cuanto
+se pasa. read_audio_upload vuelve a comprobar el tamaño del archivo.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+from fastapi import UploadFile
+
+# ~10 MB: de sobra para 2-3 minutos de webm/opus, muy por debajo del límite de Whisper (25 MB)
+SPEAKING_AUDIO_MAX_BYTES = int(os.getenv("SPEAKING_AUDIO_MAX_BYTES", str(10 * 1024 * 1024)))
+AUDIO_UPLOAD_CHUNK_SIZE = 64 * 1024
+# Margen del cuerpo multipart sobre el audio (cabeceras de las partes, boundary)
+AUDIO_UPLOAD_MULTIPART_OVERHEAD = 64 * 1024
+# Endpoints con audio: POST /speaking/sessions/{id}/message y .../message/stream
+AUDIO_UPLOAD_PATH = re.compile(r"^/speaking/sessions/\d+/message(/stream)?$")
+
+
+class AudioTooLargeError(Exception):
+    pass
+
+
+class EmptyAudioError(Exception):
+    pass
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class AudioUploadLimitMiddleware:
+    """Middleware ASGI: límite de tamaño del cuerpo de las subidas de audio mientras se recibe"""
+
+    def __init__(self, app, max_bytes: int = SPEAKING_AUDIO_MAX_BYTES + AUDIO_UPLOAD_MULTIPART_OVERHEAD):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not AUDIO_UPLOAD_PATH.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_bytes:
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                if exceeded:
+                    # FastAPI convierte el error de parseo en 400: se responde 413 en su lugar
+                    await self._reject(send)
+                    return
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(send)
+
+    @staticmethod
+    async def _reject(send):
+        body = json.dumps({"detail": "Audio file too large"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def read_audio_upload(upload: UploadFile, max_bytes: int = SPEAKING_AUDIO_MAX_BYTES) -> bytes:
+    """Leer el audio subido en memoria, cortando en cuanto supera max_bytes"""
+    if upload.size is not None and upload.size > max_bytes:
+        raise AudioTooLargeError(f"Audio exceeds {max_bytes} bytes")
+
+    buffer = bytearray()
+    while chunk := await upload.read(AUDIO_UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise AudioTooLargeError(f"Audio exceeds {max_bytes} bytes")
+
+    if not buffer:
+        raise EmptyAudioError("Empty audio upload")
+    return bytes(buffer)
+
+
+def audio_filename(upload: UploadFile) -> str:
+    """Nombre (solo para que Whisper detecte el formato); nunca se usa como ruta"""
+    return Path(upload.filename or "audio.webm").name or "audio.webm"
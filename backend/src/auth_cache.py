@@ -0,0 +1,100 @@
+"""
+Estado en memoria para la autenticación sin consultas a la base de datos
+
+- TokenUser: identidad que viaja en los claims del JWT (id, rol, versión)
+- UserCache: caché con TTL de filas de usuario para endpoints que necesitan el objeto ORM
+- TokenRevocations: versión mínima de token aceptada por usuario (desactivaciones)
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src import models
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass(frozen=True)
+class TokenUser:
+    """Usuario autenticado a partir de los claims del token"""
+    id: int
+    role: models.UserRole
+    version: int
+
+
+class UserCache:
+    """Filas de usuario (desacopladas de la sesión) con expiración por TTL"""
+
+    def __init__(self, ttl_seconds: float = USER_CACHE_TTL_SECONDS, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, models.User]] = {}
+
+    def get(self, user_id: int) -> Optional[models.User]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return user
+
+    def put(self, user: models.User):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Descartar primero las expiradas; si no alcanza, la más antigua
+                now = time.monotonic()
+                for user_id in [k for k, (exp, _) in self._entries.items() if exp < now]:
+                    del self._entries[user_id]
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class TokenRevocations:
+    """Tokens con versión menor a la mínima registrada para su usuario se rechazan"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._min_versions: Dict[int, int] = {}
+
+    def revoke(self, user_id: int, min_version: int) -> bool:
+        """Devuelve True si la versión mínima del usuario subió"""
+        with self._lock:
+            current = self._min_versions.get(user_id, 0)
+            self._min_versions[user_id] = max(min_version, current)
+            return min_version > current
+
+    def load(self, min_versions: Dict[int, int]) -> List[int]:
+        """Cargar las revocaciones persistidas; devuelve los usuarios con revocaciones nuevas"""
+        return [
+            user_id for user_id, min_version in min_versions.items()
+            if self.revoke(user_id, min_version)
+        ]
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        with self._lock:
+            return version < self._min_versions.get(user_id, 0)
+
+
+user_cache = UserCache()
+token_revocations = TokenRevocations()
+
+
+def invalidate_user(user_id: int, min_token_version: int):
+    """
+    Hook de invalidación: llamar cuando un usuario se desactiva o cambia su versión.
+    Sus tokens anteriores dejan de ser válidos y se descarta su fila cacheada.
+    """
+    token_revocations.revoke(user_id, min_token_version)
+    user_cache.invalidate(user_id)
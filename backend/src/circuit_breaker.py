@@ -0,0 +1,72 @@
+"""
+Circuit breaker para servicios externos (GPT, LanguageTool)
+
+Tras CIRCUIT_BREAKER_FAILURES fallos seguidos el circuito se abre y las
+llamadas se saltan durante CIRCUIT_BREAKER_RESET_SECONDS (se pasa directamente
+al siguiente nivel). Después se deja pasar una sola llamada de prueba
+(half-open): si va bien se cierra, si falla vuelve a abrirse.
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_BREAKER_FAILURES,
+                 reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self.short_circuits = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """¿Se puede llamar al servicio? (en half-open solo pasa la llamada de prueba)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            # También si la prueba anterior nunca informó del resultado
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+                self._opened_at = time.monotonic()
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"[circuit] {self.name} open after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "short_circuits": self.short_circuits,
+            }
@@ -0,0 +1,104 @@
+"""
+Caché en memoria del contenido publicado de los cursos (curso, unidades, quizzes, audios)
+
+Cada curso tiene una versión de contenido que crud incrementa en cada
+create/update/delete. Las respuestas se guardan ya serializadas (bytes JSON)
+junto con la versión del curso con la que se generaron; si la versión cambió,
+la entrada deja de ser válida.
+"""
+import hashlib
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+
+CONTENT_CACHE_MAX_ENTRIES = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "2000"))
+
+
+@dataclass(frozen=True)
+class CachedContent:
+    """Respuesta serializada lista para enviar"""
+    course_id: int
+    version: int
+    body: bytes
+    etag: str
+
+
+class ContentCache:
+    """LRU de respuestas serializadas, invalidado por versión de curso"""
+
+    def __init__(self, max_entries: int = CONTENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Secuencia global: cada bump asigna al curso el siguiente número
+        self._sequence = itertools.count(1)
+        self._last_sequence = 0
+        self._versions: Dict[int, int] = {}
+        self._entries: "OrderedDict[Hashable, CachedContent]" = OrderedDict()
+
+    def snapshot(self) -> int:
+        """Marca a tomar ANTES de leer de la base de datos (ver put)"""
+        with self._lock:
+            return self._last_sequence
+
+    def version(self, course_id: int) -> int:
+        with self._lock:
+            return self._versions.get(course_id, 0)
+
+    def bump(self, course_id: int) -> int:
+        """Invalidar todo el contenido cacheado de un curso"""
+        with self._lock:
+            self._last_sequence = next(self._sequence)
+            self._versions[course_id] = self._last_sequence
+            return self._last_sequence
+
+    def get(self, key: Hashable) -> Optional[CachedContent]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != self._versions.get(entry.course_id, 0):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, course_id: int, body: bytes, snapshot: int) -> CachedContent:
+        """
+        Guardar una respuesta serializada.
+        Si el curso cambió después de `snapshot` (la lectura pudo ver datos viejos),
+        se devuelve la respuesta pero no se cachea.
+        """
+        with self._lock:
+            version = self._versions.get(course_id, 0)
+            entry = CachedContent(course_id=course_id, version=version, body=body, etag=make_etag(body))
+            if version <= snapshot:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def make_etag(body: bytes) -> str:
+    """ETag fuerte derivado del contenido"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comprobar la cabecera If-None-Match contra un ETag"""
+    if not if_none_match:
+        return False
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+# Instancia compartida por crud (invalidación) y main (lecturas)
+content_cache = ContentCache()
@@ -0,0 +1,207 @@
+"""
+Contexto de conversación acotado por tokens para las sesiones de speaking
+
+En vez de recargar y enviar todo el historial en cada turno, cada sesión mantiene
+en memoria sus turnos recientes (se añaden de forma incremental). Cuando superan
+SPEAKING_CONTEXT_TOKEN_BUDGET, los más antiguos se condensan en un resumen
+acumulado (SpeakingSession.context_summary) fuera del camino crítico del turno.
+Si el proceso no tiene la sesión en caché, se reconstruye con el resumen
+persistido + los mensajes posteriores a context_summary_until.
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src import models
+
+# Tokens máximos de turnos recientes enviados a GPT (sin contar prompt y resumen)
+SPEAKING_CONTEXT_TOKEN_BUDGET = int(os.getenv("SPEAKING_CONTEXT_TOKEN_BUDGET", "1200"))
+# Al condensar se deja el contexto en esta fracción del presupuesto (menos resúmenes)
+SPEAKING_CONTEXT_FOLD_TARGET = float(os.getenv("SPEAKING_CONTEXT_FOLD_TARGET", "0.5"))
+# Mensajes máximos a leer al reconstruir una sesión que no está en caché
+SPEAKING_CONTEXT_MAX_ROWS = int(os.getenv("SPEAKING_CONTEXT_MAX_ROWS", "40"))
+SPEAKING_CONTEXT_MAX_SESSIONS = int(os.getenv("SPEAKING_CONTEXT_MAX_SESSIONS", "5000"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación de tokens de GPT (~4 caracteres por token + overhead por mensaje)"""
+    return len(text) // 4 + 4
+
+
+@dataclass
+class ContextTurn:
+    message_id: int
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass
+class SessionContext:
+    system_prompt: str
+    summary: Optional[str] = None
+    summary_until: Optional[int] = None
+    turns: List[ContextTurn] = field(default_factory=list)
+    folding: bool = False
+
+    @property
+    def tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+    def append(self, message: models.SpeakingMessage):
+        if self.turns and message.id <= self.turns[-1].message_id:
+            return
+        self.turns.append(ContextTurn(message.id, message.role, message.content, estimate_tokens(message.content)))
+
+    def build_messages(self, user_text: Optional[str] = None, budget: int = SPEAKING_CONTEXT_TOKEN_BUDGET) -> List[Dict[str, str]]:
+        """Mensajes para GPT: system (+ resumen) + turnos recientes dentro del presupuesto"""
+        system_content = self.system_prompt or ""
+        if self.summary:
+            system_content += f"\n\nSummary of the conversation so far:\n{self.summary}"
+
+        # Si el resumen va atrasado, se recortan los turnos más antiguos (coste acotado igualmente)
+        recent: List[ContextTurn] = []
+        used = estimate_tokens(user_text) if user_text else 0
+        for turn in reversed(self.turns):
+            if used + turn.tokens > budget and recent:
+                break
+            recent.append(turn)
+            used += turn.tokens
+
+        messages = [{"role": "system", "content": system_content}]
+        messages.extend({"role": turn.role, "content": turn.content} for turn in reversed(recent))
+        if user_text is not None:
+            messages.append({"role": "user", "content": user_text})
+        return messages
+
+
+class ConversationContextCache:
+    """session_id -> SessionContext, con expulsión LRU"""
+
+    def __init__(self, max_sessions: int = SPEAKING_CONTEXT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._contexts: "OrderedDict[int, SessionContext]" = OrderedDict()
+
+    def get(self, session_id: int) -> Optional[SessionContext]:
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is not None:
+                self._contexts.move_to_end(session_id)
+            return context
+
+    def put(self, session_id: int, context: SessionContext):
+        with self._lock:
+            self._contexts[session_id] = context
+            self._contexts.move_to_end(session_id)
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            self._contexts.pop(session_id, None)
+
+
+context_cache = ConversationContextCache()
+# Referencias a los resúmenes en curso (el event loop solo guarda referencias débiles)
+_fold_tasks = set()
+
+
+def _recent_messages_statement(session: models.SpeakingSession):
+    query = select(models.SpeakingMessage).where(models.SpeakingMessage.session_id == session.id)
+    if session.context_summary_until is not None:
+        query = query.where(models.SpeakingMessage.id > session.context_summary_until)
+    return query.order_by(models.SpeakingMessage.id.desc()).limit(SPEAKING_CONTEXT_MAX_ROWS)
+
+
+def _build_context(session: models.SpeakingSession, recent_desc: List[models.SpeakingMessage]) -> SessionContext:
+    context = SessionContext(
+        system_prompt=session.system_prompt,
+        summary=session.context_summary,
+        summary_until=session.context_summary_until
+    )
+    for message in reversed(recent_desc):
+        context.append(message)
+    return context
+
+
+async def load_context(db: AsyncSession, session: models.SpeakingSession) -> SessionContext:
+    """Contexto de la sesión desde la caché, o reconstruido con una sola query acotada"""
+    context = context_cache.get(session.id)
+    if context is None:
+        recent = (await db.execute(_recent_messages_statement(session))).scalars().all()
+        context = _build_context(session, list(recent))
+        context_cache.put(session.id, context)
+    return context
+
+
+def record_turn(session_id: int, *messages: models.SpeakingMessage):
+    """Añadir los mensajes ya guardados de un turno al contexto en caché"""
+    context = context_cache.get(session_id)
+    if context is not None:
+        for message in messages:
+            context.append(message)
+
+
+async def fold_context(session_id: int, budget: int = SPEAKING_CONTEXT_TOKEN_BUDGET):
+    """
+    Condensar los turnos más antiguos en el resumen si el contexto supera el presupuesto.
+    Se lanza en segundo plano después del turno; si falla, build_messages sigue recortando.
+    """
+    from src.database import AsyncSessionLocal
+    from src.openai_service import summarize_conversation_async
+
+    context = context_cache.get(session_id)
+    if context is None or context.folding or context.tokens <= budget:
+        return
+
+    context.folding = True
+    try:
+        target = int(budget * SPEAKING_CONTEXT_FOLD_TARGET)
+        remaining = context.tokens
+        folded: List[ContextTurn] = []
+        for turn in context.turns:
+            if remaining <= target:
+                break
+            folded.append(turn)
+            remaining -= turn.tokens
+        if not folded:
+            return
+
+        summary = await summarize_conversation_async(
+            context.summary,
+            [{"role": turn.role, "content": turn.content} for turn in folded]
+        )
+        summary_until = folded[-1].message_id
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.SpeakingSession)
+                .where(models.SpeakingSession.id == session_id)
+                .values(context_summary=summary, context_summary_until=summary_until)
+            )
+            await db.commit()
+
+        # Los turnos nuevos se añaden al final: quitar los condensados por la izquierda es seguro
+        context.summary = summary
+        context.summary_until = summary_until
+        context.turns = [turn for turn in context.turns if turn.message_id > summary_until]
+    except Exception as e:
+        print(f"[speaking] Context summary failed for session {session_id}: {e}")
+    finally:
+        context.folding = False
+
+
+def schedule_fold(session_id: int):
+    """Programar fold_context sin bloquear la respuesta del turno"""
+    context = context_cache.get(session_id)
+    if context is not None and not context.folding and context.tokens > SPEAKING_CONTEXT_TOKEN_BUDGET:
+        task = asyncio.get_running_loop().create_task(fold_context(session_id))
+        _fold_tasks.add(task)
+        task.add_done_callback(_fold_tasks.discard)
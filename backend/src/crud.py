@@ -1,30 +1,23 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy import text, tuple_, select, case, func, or_
+from sqlalchemy.orm import Session, joinedload, selectinload, contains_eager
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
+import base64
+import json
 from src import models
 from src import schemas
-import bcrypt
+from src.content_cache import content_cache
+from src.auth_cache import invalidate_user
+from src.friend_cache import friend_cache
+from src.conversation_context import context_cache
+from src.password_hashing import hash_password, verify_password, needs_rehash
 from src.text_to_speech import generate_audio_for_sentence  # ✅ CAMBIADO: ahora usa gTTS
 
 
-def hash_password(password: str) -> str:
-    """Hash una contraseña usando bcrypt"""
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verificar una contraseña contra su hash"""
-    password_bytes = plain_password.encode('utf-8')
-    hashed_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
-
-
 # ==================== USERS ====================
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = hash_password(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    if hashed_password is None:
+        hashed_password = hash_password(user.password)
     db_user = models.User(
         email=user.email,
         password=hashed_password,
@@ -51,9 +44,40 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
         return None
     if not verify_password(password, user.password):
         return None
+    if needs_rehash(user.password):
+        # El cost de bcrypt cambió: rehacer el hash con la contraseña en claro
+        user.password = hash_password(password)
+        db.commit()
+    return user
+
+
+def deactivate_user(db: Session, user_id: int) -> Optional[models.User]:
+    """Desactivar un usuario e invalidar todos sus tokens emitidos"""
+    user = get_user_by_id(db, user_id)
+    if not user:
+        return None
+    user.is_active = False
+    user.token_version = (user.token_version or 0) + 1
+    db.commit()
+    db.refresh(user)
+    invalidate_user(user.id, user.token_version)
     return user
 
 
+def get_token_revocations(db: Session) -> Dict[int, int]:
+    """
+    Versión mínima de token válida por usuario, para cargar al arrancar.
+    Solo incluye usuarios desactivados o con tokens invalidados.
+    """
+    rows = db.query(models.User.id, models.User.token_version, models.User.is_active).filter(
+        (models.User.token_version > 0) | (models.User.is_active == False)
+    ).all()
+    return {
+        user_id: (token_version or 0) + (0 if is_active else 1)
+        for user_id, token_version, is_active in rows
+    }
+
+
 # ==================== COURSES ====================
 def create_course(db: Session, course: schemas.CourseCreate, teacher_id: int) -> models.Course:
     db_course = models.Course(
@@ -64,15 +88,113 @@ def create_course(db: Session, course: schemas.CourseCreate, teacher_id: int) ->
     db.add(db_course)
     db.commit()
     db.refresh(db_course)
+    content_cache.bump(db_course.id)
     return db_course
 
 
-def get_course(db: Session, course_id: int) -> Optional[models.Course]:
-    return db.query(models.Course).filter(models.Course.id == course_id).first()
+def _course_tree_options() -> list:
+    """Opciones de carga del árbol completo de un curso (profesor, unidades, quizzes y audios)"""
+    units = selectinload(models.Course.units)
+    return [
+        joinedload(models.Course.teacher),
+        units.selectinload(models.Unit.quizzes),
+        units.selectinload(models.Unit.audio_sentences),
+    ]
+
+
+def _unit_details_options() -> list:
+    """Opciones de carga de quizzes y audios de una unidad (una query por relación)"""
+    return [
+        selectinload(models.Unit.quizzes),
+        selectinload(models.Unit.audio_sentences),
+    ]
+
+
+def get_course(db: Session, course_id: int, with_details: bool = False) -> Optional[models.Course]:
+    """
+    Obtener un curso por ID.
+    Con with_details=True carga todo el árbol (profesor, unidades, quizzes y audios)
+    en un número fijo de queries, sin importar cuántas unidades tenga el curso.
+    """
+    if not with_details:
+        return db.get(models.Course, course_id)
+    return db.query(models.Course)\
+        .options(*_course_tree_options())\
+        .filter(models.Course.id == course_id)\
+        .first()
 
 
-def get_courses(db: Session, skip: int = 0, limit: int = 100) -> List[models.Course]:
-    return db.query(models.Course).offset(skip).limit(limit).all()
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Cursor opaco con la clave (created_at, id) del último elemento de la página"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Lanza ValueError si el cursor no es válido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, course_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(course_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _catalog_query(db: Session, published_only: bool, teacher_id: Optional[int]):
+    query = db.query(models.Course)
+    if published_only:
+        query = query.filter(models.Course.is_published == True)
+    if teacher_id is not None:
+        query = query.filter(models.Course.teacher_id == teacher_id)
+    return query
+
+
+def get_courses(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    published_only: bool = True,
+    teacher_id: Optional[int] = None
+) -> Tuple[List[models.Course], Optional[str]]:
+    """
+    Catálogo de cursos paginado por keyset (created_at, id), del más nuevo al más viejo.
+    Devuelve (cursos, next_cursor); next_cursor es None en la última página.
+    """
+    query = _catalog_query(db, published_only, teacher_id)
+    if cursor:
+        created_at, course_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Course.created_at, models.Course.id) < tuple_(created_at, course_id)
+        )
+    
+    courses = query\
+        .order_by(models.Course.created_at.desc(), models.Course.id.desc())\
+        .limit(limit + 1)\
+        .all()
+    
+    next_cursor = None
+    if len(courses) > limit:
+        next_cursor = encode_cursor(courses[limit - 1].created_at, courses[limit - 1].id)
+    return courses[:limit], next_cursor
+
+
+def estimate_courses_count(db: Session, published_only: bool = True, teacher_id: Optional[int] = None) -> int:
+    """
+    Total aproximado del catálogo.
+    En PostgreSQL usa la estimación del planner (EXPLAIN) en lugar de COUNT(*).
+    """
+    query = _catalog_query(db, published_only, teacher_id)
+    if db.get_bind().dialect.name != "postgresql":
+        return query.count()
+    
+    statement = query.with_entities(models.Course.id).statement.compile(
+        dialect=db.get_bind().dialect,
+        compile_kwargs={"literal_binds": True}
+    )
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
 
 
 def get_teacher_courses(db: Session, teacher_id: int) -> List[models.Course]:
@@ -91,6 +213,7 @@ def update_course(db: Session, course_id: int, course: schemas.CourseUpdate) ->
     db_course.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(db_course)
+    content_cache.bump(course_id)
     return db_course
 
 
@@ -100,9 +223,42 @@ def delete_course(db: Session, course_id: int) -> bool:
         return False
     db.delete(db_course)
     db.commit()
+    content_cache.bump(course_id)
     return True
 
 
+# ==================== OWNERSHIP ====================
+def get_owned_entity(db: Session, model, entity_id: int, teacher_id: int) -> Tuple[Optional[Any], bool]:
+    """
+    Resolver con una sola query (entidad ⋈ unidad ⋈ curso) si un Course, Unit,
+    Quiz o AudioSentence pertenece a un curso del profesor.
+    Devuelve (entidad, es_dueño); (None, False) si no existe.
+    La unidad y el curso quedan cargados, así que el update/delete posterior no repite lookups.
+    """
+    if model is models.Course:
+        entity = db.query(models.Course).filter(models.Course.id == entity_id).first()
+        return entity, entity is not None and entity.teacher_id == teacher_id
+    
+    if model is models.Unit:
+        entity = db.query(models.Unit)\
+            .join(models.Unit.course)\
+            .options(contains_eager(models.Unit.course))\
+            .filter(models.Unit.id == entity_id)\
+            .first()
+        return entity, entity is not None and entity.course.teacher_id == teacher_id
+    
+    if model in (models.Quiz, models.AudioSentence):
+        entity = db.query(model)\
+            .join(model.unit)\
+            .join(models.Unit.course)\
+            .options(contains_eager(model.unit).contains_eager(models.Unit.course))\
+            .filter(model.id == entity_id)\
+            .first()
+        return entity, entity is not None and entity.unit.course.teacher_id == teacher_id
+    
+    raise ValueError(f"Unsupported model for ownership check: {model.__name__}")
+
+
 # ==================== UNITS ====================
 def create_unit(db: Session, unit: schemas.UnitCreate) -> models.Unit:
     db_unit = models.Unit(
@@ -114,15 +270,24 @@ def create_unit(db: Session, unit: schemas.UnitCreate) -> models.Unit:
     db.add(db_unit)
     db.commit()
     db.refresh(db_unit)
+    content_cache.bump(db_unit.course_id)
     return db_unit
 
 
-def get_unit(db: Session, unit_id: int) -> Optional[models.Unit]:
-    return db.query(models.Unit).filter(models.Unit.id == unit_id).first()
+def get_unit(db: Session, unit_id: int, with_details: bool = False) -> Optional[models.Unit]:
+    if not with_details:
+        return db.get(models.Unit, unit_id)
+    return db.query(models.Unit)\
+        .options(*_unit_details_options())\
+        .filter(models.Unit.id == unit_id)\
+        .first()
 
 
-def get_course_units(db: Session, course_id: int) -> List[models.Unit]:
-    return db.query(models.Unit)\
+def get_course_units(db: Session, course_id: int, with_details: bool = False) -> List[models.Unit]:
+    query = db.query(models.Unit)
+    if with_details:
+        query = query.options(*_unit_details_options())
+    return query\
         .filter(models.Unit.course_id == course_id)\
         .order_by(models.Unit.order)\
         .all()
@@ -139,6 +304,7 @@ def update_unit(db: Session, unit_id: int, unit: schemas.UnitUpdate) -> Optional
     
     db.commit()
     db.refresh(db_unit)
+    content_cache.bump(db_unit.course_id)
     return db_unit
 
 
@@ -146,8 +312,10 @@ def delete_unit(db: Session, unit_id: int) -> bool:
     db_unit = get_unit(db, unit_id)
     if not db_unit:
         return False
+    course_id = db_unit.course_id
     db.delete(db_unit)
     db.commit()
+    content_cache.bump(course_id)
     return True
 
 
@@ -162,13 +330,15 @@ def create_quiz(db: Session, quiz: schemas.QuizCreate) -> models.Quiz:
         order=quiz.order
     )
     db.add(db_quiz)
+    course_id = get_unit(db, quiz.unit_id).course_id
     db.commit()
     db.refresh(db_quiz)
+    content_cache.bump(course_id)
     return db_quiz
 
 
 def get_quiz(db: Session, quiz_id: int) -> Optional[models.Quiz]:
-    return db.query(models.Quiz).filter(models.Quiz.id == quiz_id).first()
+    return db.get(models.Quiz, quiz_id)
 
 
 def get_unit_quizzes(db: Session, unit_id: int) -> List[models.Quiz]:
@@ -187,8 +357,10 @@ def update_quiz(db: Session, quiz_id: int, quiz: schemas.QuizUpdate) -> Optional
     for key, value in update_data.items():
         setattr(db_quiz, key, value)
     
+    course_id = db_quiz.unit.course_id
     db.commit()
     db.refresh(db_quiz)
+    content_cache.bump(course_id)
     return db_quiz
 
 
@@ -196,8 +368,10 @@ def delete_quiz(db: Session, quiz_id: int) -> bool:
     db_quiz = get_quiz(db, quiz_id)
     if not db_quiz:
         return False
+    course_id = db_quiz.unit.course_id
     db.delete(db_quiz)
     db.commit()
+    content_cache.bump(course_id)
     return True
 
 
@@ -211,12 +385,13 @@ def create_audio_sentence(db: Session, audio: schemas.AudioSentenceCreate) -> mo
     unit = get_unit(db, unit_id=audio.unit_id)
     if not unit:
         raise Exception("Unit not found")
+    course_id = unit.course_id
     
     # Generar el audio automáticamente
     try:
         audio_path = generate_audio_for_sentence(
             sentence=audio.sentence,
-            course_id=unit.course_id,
+            course_id=course_id,
             unit_order=unit.order,
             lang='en'  # Inglés por defecto
         )
@@ -236,10 +411,11 @@ def create_audio_sentence(db: Session, audio: schemas.AudioSentenceCreate) -> mo
     db.add(db_audio)
     db.commit()
     db.refresh(db_audio)
+    content_cache.bump(course_id)
     return db_audio
 
 def get_audio_sentence(db: Session, audio_id: int) -> Optional[models.AudioSentence]:
-    return db.query(models.AudioSentence).filter(models.AudioSentence.id == audio_id).first()
+    return db.get(models.AudioSentence, audio_id)
 
 
 def get_unit_audio_sentences(db: Session, unit_id: int) -> List[models.AudioSentence]:
@@ -258,8 +434,10 @@ def update_audio_sentence(db: Session, audio_id: int, audio: schemas.AudioSenten
     for key, value in update_data.items():
         setattr(db_audio, key, value)
     
+    course_id = db_audio.unit.course_id
     db.commit()
     db.refresh(db_audio)
+    content_cache.bump(course_id)
     return db_audio
 
 
@@ -267,8 +445,10 @@ def delete_audio_sentence(db: Session, audio_id: int) -> bool:
     db_audio = get_audio_sentence(db, audio_id)
     if not db_audio:
         return False
+    course_id = db_audio.unit.course_id
     db.delete(db_audio)
     db.commit()
+    content_cache.bump(course_id)
     return True
 
 
@@ -298,6 +478,76 @@ def get_enrollment(db: Session, student_id: int, course_id: int) -> Optional[mod
         ).first()
 
 
+def summarize_progress(progress: Optional[Dict[str, Any]], total_units: int) -> Dict[str, int]:
+    """
+    Resumen del progreso guardado en Enrollment.progress ({unit_id: estado}).
+    Una unidad cuenta como completada si su estado es True o {"completed": true}.
+    """
+    completed_units = 0
+    for state in (progress or {}).values():
+        if state is True or (isinstance(state, dict) and state.get("completed")):
+            completed_units += 1
+    completed_units = min(completed_units, total_units)
+    percent = round(100 * completed_units / total_units) if total_units else 0
+    return {"completed_units": completed_units, "total_units": total_units, "percent": percent}
+
+
+def _roster_query(db: Session, course_id: int, search: Optional[str]):
+    query = db.query(models.Enrollment, models.User)\
+        .join(models.User, models.User.id == models.Enrollment.student_id)\
+        .filter(models.Enrollment.course_id == course_id)
+    if search:
+        query = query.filter(or_(
+            models.User.name.icontains(search, autoescape=True),
+            models.User.email.icontains(search, autoescape=True)
+        ))
+    return query
+
+
+def get_course_roster(
+    db: Session,
+    course_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    search: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Estudiantes inscritos en un curso (enrollments ⋈ users), del más reciente al más antiguo,
+    paginados por keyset (enrolled_at, enrollment.id). Incluye fecha de inscripción y resumen de progreso.
+    """
+    query = _roster_query(db, course_id, search)
+    if cursor:
+        enrolled_at, enrollment_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Enrollment.enrolled_at, models.Enrollment.id) < tuple_(enrolled_at, enrollment_id)
+        )
+    
+    rows = query\
+        .order_by(models.Enrollment.enrolled_at.desc(), models.Enrollment.id.desc())\
+        .limit(limit + 1)\
+        .all()
+    
+    total_units = db.query(func.count(models.Unit.id)).filter(models.Unit.course_id == course_id).scalar()
+    roster = [
+        {
+            'student': student,
+            'enrolled_at': enrollment.enrolled_at,
+            'progress': summarize_progress(enrollment.progress, total_units)
+        }
+        for enrollment, student in rows[:limit]
+    ]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last_enrollment = rows[limit - 1][0]
+        next_cursor = encode_cursor(last_enrollment.enrolled_at, last_enrollment.id)
+    return roster, next_cursor
+
+
+def count_course_students(db: Session, course_id: int, search: Optional[str] = None) -> int:
+    return _roster_query(db, course_id, search).with_entities(func.count(models.Enrollment.id)).scalar()
+
+
 # ==================== CREACIÓN COMPLETA DE CURSO ====================
 def create_complete_course(db: Session, course_data: schemas.CourseComplete, teacher_id: int) -> models.Course:
     """
@@ -409,6 +659,7 @@ def create_complete_course(db: Session, course_data: schemas.CourseComplete, tea
         # 4. Commit de todo
         db.commit()
         db.refresh(db_course)
+        content_cache.bump(course_id)
         
         print(f"✅ Curso '{db_course.title}' creado exitosamente con {len(course_data.unidades)} unidades")
         
@@ -454,6 +705,7 @@ def accept_friend_request(db: Session, friendship_id: int, user_id: int) -> mode
     friendship.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(friendship)
+    friend_cache.invalidate(friendship.requester_id, friendship.receiver_id)
     return friendship
 
 
@@ -467,6 +719,7 @@ def reject_friend_request(db: Session, friendship_id: int, user_id: int) -> mode
     friendship.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(friendship)
+    friend_cache.invalidate(friendship.requester_id, friendship.receiver_id)
     return friendship
 
 
@@ -478,22 +731,29 @@ def get_friend_requests(db: Session, user_id: int) -> List[models.Friendship]:
     ).all()
 
 
-def get_friends(db: Session, user_id: int) -> List[models.User]:
-    """Obtener lista de amigos"""
-    friendships = db.query(models.Friendship).filter(
+def _friend_id_column(user_id: int):
+    """Id del otro usuario de una amistad"""
+    return case(
+        (models.Friendship.requester_id == user_id, models.Friendship.receiver_id),
+        else_=models.Friendship.requester_id
+    )
+
+
+def _accepted_friendships(user_id: int):
+    return (
         ((models.Friendship.requester_id == user_id) | (models.Friendship.receiver_id == user_id)),
         models.Friendship.status == models.FriendshipStatus.accepted
-    ).all()
-    
-    friends = []
-    for friendship in friendships:
-        if friendship.requester_id == user_id:
-            friend = get_user_by_id(db, friendship.receiver_id)
-        else:
-            friend = get_user_by_id(db, friendship.requester_id)
-        if friend:
-            friends.append(friend)
-    
+    )
+
+
+def get_friends(db: Session, user_id: int) -> List[models.User]:
+    """Obtener lista de amigos (una sola query friendships ⋈ users)"""
+    generation = friend_cache.generation()
+    friends = db.query(models.User)\
+        .join(models.Friendship, models.User.id == _friend_id_column(user_id))\
+        .filter(*_accepted_friendships(user_id))\
+        .all()
+    friend_cache.put(user_id, frozenset(friend.id for friend in friends), generation)
     return friends
 
 
@@ -507,27 +767,23 @@ def get_all_students(db: Session, exclude_user_id: int = None) -> List[models.Us
 
 # ==================== MESSAGES ====================
 def send_message(db: Session, sender_id: int, receiver_id: int, content: str) -> models.Message:
-    """Enviar mensaje con corrección gramatical mejorada (GPT-4)"""
-    from src.grammar_checker import check_grammar
-    
-    # Verificar gramática usando GPT-4 (detecta errores de tiempo verbal, etc.)
-    grammar_result = check_grammar(content)
-    
-    # Log opcional para debugging
-    if grammar_result.get('has_errors'):
-        print(f"📝 Message grammar correction:")
-        print(f"   Original: {content}")
-        print(f"   Corrected: {grammar_result['corrected']}")
+    """
+    Enviar mensaje. La corrección gramatical (GPT) se hace en segundo plano:
+    el mensaje se guarda con correction_status='pending' (ver src/message_corrections.py)
+    """
+    from src.message_corrections import message_correction_queue
     
     message = models.Message(
         sender_id=sender_id,
         receiver_id=receiver_id,
         content=content,
-        corrected_content=grammar_result['corrected'] if grammar_result['has_errors'] else None
+        corrected_content=None,
+        correction_status="pending"
     )
     db.add(message)
     db.commit()
     db.refresh(message)
+    message_correction_queue.schedule(message.id)
     return message
 
 
@@ -539,65 +795,62 @@ def get_conversation(db: Session, user1_id: int, user2_id: int, limit: int = 50)
     ).order_by(models.Message.created_at.desc()).limit(limit).all()
 
 
-def get_conversations(db: Session, user_id: int) -> List[dict]:
-    """Obtener lista de conversaciones con preview del último mensaje"""
-    from sqlalchemy import or_, and_, func
-    
-    # Obtener IDs de usuarios con los que se ha conversado
-    subquery = db.query(
-        models.Message.sender_id,
-        models.Message.receiver_id
-    ).filter(
-        or_(
-            models.Message.sender_id == user_id,
-            models.Message.receiver_id == user_id
-        )
-    ).distinct().subquery()
-    
-    # Obtener último mensaje de cada conversación
-    conversations = []
-    
-    # Usuarios con los que ha chateado
-    sender_ids = db.query(models.Message.sender_id).filter(
-        models.Message.receiver_id == user_id
-    ).distinct().all()
-    
-    receiver_ids = db.query(models.Message.receiver_id).filter(
-        models.Message.sender_id == user_id
-    ).distinct().all()
-    
-    other_user_ids = set([s[0] for s in sender_ids] + [r[0] for r in receiver_ids])
-    
-    for other_user_id in other_user_ids:
-        # Último mensaje
-        last_message = db.query(models.Message).filter(
-            or_(
-                and_(models.Message.sender_id == user_id, models.Message.receiver_id == other_user_id),
-                and_(models.Message.sender_id == other_user_id, models.Message.receiver_id == user_id)
-            )
-        ).order_by(models.Message.created_at.desc()).first()
-        
-        # Contar no leídos
-        unread_count = db.query(models.Message).filter(
-            models.Message.sender_id == other_user_id,
-            models.Message.receiver_id == user_id,
-            models.Message.is_read == False
-        ).count()
-        
-        # Usuario
-        other_user = get_user_by_id(db, other_user_id)
-        
-        if last_message and other_user:
-            conversations.append({
-                'user': other_user,
-                'last_message': last_message,
-                'unread_count': unread_count
-            })
-    
-    # Ordenar por fecha del último mensaje
-    conversations.sort(key=lambda x: x['last_message'].created_at, reverse=True)
-    
-    return conversations
+def _conversations_statement(user_id: int, limit: int, cursor: Optional[str]):
+    """
+    Inbox en una sola query: por cada interlocutor, el último mensaje (row_number)
+    y los no leídos (sum sobre la misma ventana), más el usuario, ordenado por
+    última actividad y paginado por keyset (created_at, id) del último mensaje.
+    """
+    Message = models.Message
+    partner_id = case((Message.sender_id == user_id, Message.receiver_id), else_=Message.sender_id)
+    ranked = select(
+        Message.id.label("message_id"),
+        partner_id.label("partner_id"),
+        func.row_number().over(
+            partition_by=partner_id,
+            order_by=(Message.created_at.desc(), Message.id.desc())
+        ).label("rn"),
+        func.sum(
+            case(((Message.receiver_id == user_id) & (Message.is_read == False), 1), else_=0)
+        ).over(partition_by=partner_id).label("unread_count"),
+    ).where(
+        or_(Message.sender_id == user_id, Message.receiver_id == user_id)
+    ).subquery()
+    
+    statement = select(Message, models.User, ranked.c.unread_count)\
+        .join(ranked, Message.id == ranked.c.message_id)\
+        .join(models.User, models.User.id == ranked.c.partner_id)\
+        .where(ranked.c.rn == 1)
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(Message.created_at, Message.id) < tuple_(created_at, message_id))
+    
+    return statement\
+        .order_by(Message.created_at.desc(), Message.id.desc())\
+        .limit(limit + 1)
+
+
+def _conversations_page(rows, limit: int) -> Tuple[List[dict], Optional[str]]:
+    conversations = [
+        {'user': user, 'last_message': message, 'unread_count': int(unread_count or 0)}
+        for message, user, unread_count in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last_message = rows[limit - 1][0]
+        next_cursor = encode_cursor(last_message.created_at, last_message.id)
+    return conversations, next_cursor
+
+
+def get_conversations(
+    db: Session,
+    user_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Obtener lista de conversaciones con preview del último mensaje (más recientes primero)"""
+    rows = db.execute(_conversations_statement(user_id, limit, cursor)).all()
+    return _conversations_page(rows, limit)
 
 
 def mark_messages_as_read(db: Session, user_id: int, sender_id: int):
@@ -640,7 +893,7 @@ def create_speaking_session(
         assistant_response = generate_response(initial_messages)
         audio_path = None
         try:
-            audio_path = text_to_speech(assistant_response, session.id, 0)
+            audio_path = text_to_speech(assistant_response)
         except Exception as e:
             print(f"[speaking] TTS failed: {e}")
 
@@ -673,91 +926,6 @@ def get_student_speaking_sessions(db: Session, student_id: int) -> List[models.S
     ).order_by(models.SpeakingSession.created_at.desc()).all()
 
 
-def add_speaking_message(
-    db: Session,
-    session_id: int,
-    audio_file_path: str
-) -> Dict[str, Any]:
-    """
-    Procesar mensaje de voz del estudiante y generar respuesta
-    Ahora devuelve AMBOS mensajes (user y assistant) con corrección gramatical mejorada (GPT-4)
-    """
-    from src.openai_service import transcribe_audio, generate_response, text_to_speech
-    from src.grammar_checker import check_grammar  # Ahora usa GPT-4 por defecto
-    
-    session = get_speaking_session(db, session_id)
-    if not session:
-        raise Exception("Session not found")
-    
-    # 1. Transcribir audio del estudiante
-    user_text = transcribe_audio(audio_file_path)
-    
-    # 2. Verificar gramática del texto del estudiante usando GPT-4
-    # Esto ahora detecta errores de tiempo verbal, artículos, preposiciones, etc.
-    grammar_result = check_grammar(user_text)
-    
-    # Solo guardar corrección si hay errores reales
-    corrected_text = grammar_result['corrected'] if grammar_result['has_errors'] else None
-    
-    # Log para debugging (opcional)
-    if grammar_result.get('has_errors'):
-        print(f"📝 Grammar correction:")
-        print(f"   Original: {user_text}")
-        print(f"   Corrected: {grammar_result['corrected']}")
-        if grammar_result.get('errors'):
-            for error in grammar_result['errors']:
-                print(f"   - {error['original']} → {error['correction']}: {error['explanation']}")
-    
-    # 3. Guardar mensaje del usuario (con corrección si tiene errores)
-    user_message = models.SpeakingMessage(
-        session_id=session_id,
-        role="user",
-        content=user_text,
-        corrected_content=corrected_text,  # ✨ Corrección mejorada con GPT-4
-        audio_path=None  # El audio del usuario no lo guardamos en este caso
-    )
-    db.add(user_message)
-    db.flush()
-    
-    # 4. Obtener historial de conversación
-    all_messages = db.query(models.SpeakingMessage).filter(
-        models.SpeakingMessage.session_id == session_id
-    ).order_by(models.SpeakingMessage.created_at).all()
-    
-    conversation_history = [{"role": "system", "content": session.system_prompt}]
-    conversation_history.extend([
-        {"role": msg.role, "content": msg.content}
-        for msg in all_messages
-    ])
-    
-    # 5. Generar respuesta del asistente
-    assistant_text = generate_response(conversation_history)
-    
-    # 6. Generar audio de la respuesta
-    assistant_audio_path = text_to_speech(assistant_text, session_id, user_message.id + 1)
-    
-    # 7. Guardar mensaje del asistente
-    assistant_message = models.SpeakingMessage(
-        session_id=session_id,
-        role="assistant",
-        content=assistant_text,
-        corrected_content=None,  # Los mensajes del asistente no necesitan corrección
-        audio_path=assistant_audio_path
-    )
-    db.add(assistant_message)
-    db.commit()
-    
-    # Refrescar ambos mensajes
-    db.refresh(user_message)
-    db.refresh(assistant_message)
-    
-    # 8. Devolver AMBOS mensajes
-    return {
-        "user_message": user_message,
-        "assistant_message": assistant_message
-    }
-
-
 def end_speaking_session(db: Session, session_id: int):
     """Finalizar sesión de speaking"""
     session = get_speaking_session(db, session_id)
@@ -765,6 +933,7 @@ def end_speaking_session(db: Session, session_id: int):
         session.is_active = False
         session.ended_at = datetime.utcnow()
         db.commit()
+        context_cache.invalidate(session_id)
 
 
 def get_session_messages(db: Session, session_id: int) -> List[models.SpeakingMessage]:
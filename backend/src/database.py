@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 import os
 from dotenv import load_dotenv
@@ -25,6 +26,34 @@ engine = create_engine(
 # Crear SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# ==================== ASYNC ====================
+# Engine async (asyncpg) para endpoints `async def`: no ocupan un hilo del
+# threadpool mientras esperan a PostgreSQL. Convive con el engine sync.
+def _to_async_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+# aiosqlite (pruebas / benchmarks locales) no admite pool_size ni max_overflow
+_async_pool_options = {} if ASYNC_DATABASE_URL.startswith("sqlite") else {
+    "pool_size": int(os.getenv("ASYNC_DB_POOL_SIZE", "20")),
+    "max_overflow": int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+}
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    pool_pre_ping=True,
+    **_async_pool_options
+)
+
+# expire_on_commit=False: con AsyncSession no se puede hacer lazy load al serializar
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 # Base para los modelos
 Base = declarative_base()
 
@@ -38,6 +67,12 @@ def get_db():
         db.close()
 
 
+# Dependency async (para endpoints `async def`)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 # Función para crear todas las tablas
 def create_tables():
     from models import Base  # Importar Base desde models
@@ -0,0 +1,53 @@
+"""
+Caché en memoria del grafo de amistades aceptadas (lista de adyacencia por usuario)
+
+crud la llena al leer amigos y la invalida en accept/reject de solicitudes.
+Cada invalidación sube una generación: quien leyó de la BD antes de una
+invalidación no puede volver a guardar esa lista ya obsoleta.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, Optional
+
+FRIEND_CACHE_MAX_USERS = int(os.getenv("FRIEND_CACHE_MAX_USERS", "50000"))
+
+
+class FriendGraphCache:
+    """user_id -> frozenset de ids de amigos, con expulsión LRU"""
+
+    def __init__(self, max_users: int = FRIEND_CACHE_MAX_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._friends: "OrderedDict[int, FrozenSet[int]]" = OrderedDict()
+        self._generation = 0
+
+    def get(self, user_id: int) -> Optional[FrozenSet[int]]:
+        with self._lock:
+            friend_ids = self._friends.get(user_id)
+            if friend_ids is not None:
+                self._friends.move_to_end(user_id)
+            return friend_ids
+
+    def generation(self) -> int:
+        """Tomar antes de leer de la BD y pasarla a put()"""
+        with self._lock:
+            return self._generation
+
+    def put(self, user_id: int, friend_ids: FrozenSet[int], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return  # hubo una invalidación durante la lectura
+            self._friends[user_id] = friend_ids
+            self._friends.move_to_end(user_id)
+            while len(self._friends) > self.max_users:
+                self._friends.popitem(last=False)
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._friends.pop(user_id, None)
+
+
+friend_cache = FriendGraphCache()
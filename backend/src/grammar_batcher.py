@@ -0,0 +1,248 @@
+"""
+Micro-batching de correcciones gramaticales con GPT
+
+En ráfagas (chat de una clase, muchos turnos de speaking a la vez) cada
+check_grammar hacía su propia llamada con el prompt completo. El batcher
+junta las peticiones que llegan en GRAMMAR_BATCH_WINDOW_MS (o hasta
+GRAMMAR_BATCH_MAX_SIZE), hace UNA llamada que devuelve un array JSON y
+reparte cada resultado a quien lo pidió. Si el array no se puede leer, o
+falta algún elemento, esos textos se corrigen uno a uno. Si la llamada falla
+(429, 5xx, timeout) el error llega a todos los Future sin reintentos y el
+fallback a LanguageTool lo decide check_grammar, que además deja de esperar al
+agotar su presupuesto. Cada llamada a GPT (no cada texto) cuenta una vez en
+el circuit breaker de GPT.
+Con GRAMMAR_BATCH_ENABLED=false cada petición va sola (ventana 0, lote de 1).
+
+Usa el cliente síncrono en un pool de hilos: sirve igual a callers sync
+(crud.send_message) y async (check_grammar_async espera el Future).
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.metrics import Counter, registry
+from src.providers import get_provider
+
+GRAMMAR_BATCH_ENABLED = os.getenv("GRAMMAR_BATCH_ENABLED", "true").lower() == "true"
+# Espera máxima para juntar peticiones antes de llamar a GPT
+GRAMMAR_BATCH_WINDOW_MS = float(os.getenv("GRAMMAR_BATCH_WINDOW_MS", "15"))
+GRAMMAR_BATCH_MAX_SIZE = int(os.getenv("GRAMMAR_BATCH_MAX_SIZE", "16"))
+# Llamadas a GPT en vuelo a la vez (lotes + reintentos individuales)
+GRAMMAR_BATCH_WORKERS = int(os.getenv("GRAMMAR_BATCH_WORKERS", "8"))
+# Tokens de respuesta por texto del lote (la llamada individual usa 500)
+GRAMMAR_BATCH_TOKENS_PER_ITEM = int(os.getenv("GRAMMAR_BATCH_TOKENS_PER_ITEM", "300"))
+
+GRAMMAR_GPT_CALLS = registry.register(Counter(
+    "grammar_gpt_calls_total",
+    "Llamadas a GPT para corrección gramatical (batch = varios textos en una llamada)",
+    ("kind",)
+))
+GRAMMAR_BATCH_ITEMS = registry.register(Counter(
+    "grammar_batch_items_total",
+    "Textos corregidos por el batcher según cómo se resolvieron (batch, single, fallback)",
+    ("path",)
+))
+
+
+def _batch_grammar_messages(texts: List[str]) -> List[Dict[str, str]]:
+    items = json.dumps([{"id": i, "text": text} for i, text in enumerate(texts)], ensure_ascii=False)
+    prompt = f"""You are an English grammar expert. Analyze EACH of the following texts independently and correct any grammatical errors.
+
+Texts: {items}
+
+Respond with a JSON array (no additional text) with exactly one object per text, in the same order:
+[
+    {{
+        "id": 0,
+        "has_errors": true/false,
+        "corrected": "corrected text here",
+        "errors": [
+            {{
+                "original": "incorrect phrase",
+                "correction": "corrected phrase",
+                "explanation": "brief explanation of the error"
+            }}
+        ]
+    }}
+]
+
+Rules:
+- If a text has NO errors, return "has_errors": false, "corrected" equal to the original text and "errors": []
+- Keep the corrected text natural and preserve the original meaning
+- Focus on grammar, verb tenses, articles, prepositions, and word order
+- Provide clear, brief explanations"""
+    return [
+        {"role": "system", "content": "You are a precise English grammar checker. Always respond with valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_batch_response(texts: List[str], content: str) -> List[Optional[dict]]:
+    """Resultado por texto (None si falta o no es válido); ValueError si la respuesta no es un array"""
+    from src.grammar_checker import _strip_code_fence, _grammar_result
+
+    parsed = json.loads(_strip_code_fence(content))
+    if isinstance(parsed, dict):
+        # {"results": [...]} u otra clave con la lista
+        parsed = next((value for value in parsed.values() if isinstance(value, list)), None)
+    if not isinstance(parsed, list):
+        raise ValueError("Batch grammar response is not a JSON array")
+
+    results: List[Optional[dict]] = [None] * len(texts)
+    for position, item in enumerate(parsed):
+        if not isinstance(item, dict) or not isinstance(item.get("corrected"), str):
+            continue
+        index = item.get("id", position)
+        if isinstance(index, int) and 0 <= index < len(texts) and results[index] is None:
+            results[index] = _grammar_result(texts[index], item)
+    return results
+
+
+@dataclass
+class _Request:
+    text: str
+    language: str
+    future: Future = field(default_factory=Future)
+
+
+class GrammarBatcher:
+    """Hilo despachador que agrupa peticiones + pool de hilos que llama a GPT"""
+
+    def __init__(self, window_ms: float = GRAMMAR_BATCH_WINDOW_MS, max_size: int = GRAMMAR_BATCH_MAX_SIZE,
+                 workers: int = GRAMMAR_BATCH_WORKERS):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.workers = workers
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---------- API ----------
+    def submit(self, text: str, language: str = "en-US") -> Future:
+        self._ensure_started()
+        request = _Request(text, language)
+        self._queue.put(request)
+        return request.future
+
+    def check_sync(self, text: str, language: str = "en-US") -> dict:
+        return self.submit(text, language).result()
+
+    async def check(self, text: str, language: str = "en-US") -> dict:
+        return await asyncio.wrap_future(self.submit(text, language))
+
+    # ---------- despacho ----------
+    def _ensure_started(self):
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if self._dispatcher is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="grammar-batch")
+                self._dispatcher = threading.Thread(target=self._dispatch, name="grammar-batcher", daemon=True)
+                self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            by_language: Dict[str, List[_Request]] = {}
+            for request in batch:
+                by_language.setdefault(request.language, []).append(request)
+            for requests in by_language.values():
+                if len(requests) == 1:
+                    self._executor.submit(self._run_single, requests[0], "single")
+                else:
+                    self._executor.submit(self._run_batch, requests)
+
+    def _run_single(self, request: _Request, path: str):
+        from src.grammar_checker import gpt_grammar_check
+
+        GRAMMAR_GPT_CALLS.inc("single")
+        GRAMMAR_BATCH_ITEMS.inc(path)
+        started = time.monotonic()
+        try:
+            result = gpt_grammar_check(request.text)
+        except Exception as e:
+            _record_gpt_call(started, e)
+            _resolve(request.future, error=e)
+            return
+        _record_gpt_call(started)
+        _resolve(request.future, result=result)
+
+    def _run_batch(self, requests: List[_Request]):
+        texts = [request.text for request in requests]
+        GRAMMAR_GPT_CALLS.inc("batch")
+        started = time.monotonic()
+        try:
+            content = get_provider().chat_sync(
+                _batch_grammar_messages(texts),
+                purpose="grammar_batch",
+                temperature=0.3,
+                max_tokens=min(GRAMMAR_BATCH_TOKENS_PER_ITEM * len(texts) + 100, 4096)
+            )
+        except Exception as e:
+            # Error del proveedor (429, 5xx, timeout): reintentar texto a texto solo
+            # multiplicaría las llamadas; el fallback lo decide quien espera
+            print(f"Error with batched GPT grammar check ({len(texts)} texts): {str(e)}")
+            _record_gpt_call(started, e)
+            for request in requests:
+                _resolve(request.future, error=e)
+            return
+        _record_gpt_call(started)
+
+        try:
+            results = parse_batch_response(texts, content)
+        except Exception as e:
+            print(f"Unreadable batched GPT grammar response ({len(texts)} texts): {str(e)}")
+            results = [None] * len(texts)
+
+        for request, result in zip(requests, results):
+            if result is None:
+                # Reintento individual sin bloquear este hilo (evita esperar al propio pool)
+                self._executor.submit(self._run_single, request, "fallback")
+            else:
+                GRAMMAR_BATCH_ITEMS.inc("batch")
+                _resolve(request.future, result=result)
+
+
+def _record_gpt_call(started: float, error: Optional[Exception] = None):
+    """Un resultado por llamada a GPT en el circuit breaker (no uno por texto del lote)"""
+    from src.grammar_checker import gpt_breaker, GPT_SLOW_CALL_SECONDS
+
+    # Una llamada que ya no llega a tiempo para nadie también cuenta como fallo
+    if error is not None or time.monotonic() - started > GPT_SLOW_CALL_SECONDS:
+        gpt_breaker.record_failure()
+    else:
+        gpt_breaker.record_success()
+
+
+def _resolve(future: Future, result: Optional[dict] = None, error: Optional[Exception] = None):
+    # Quien esperaba pudo cancelar el Future (p. ej. al agotar el presupuesto de check_grammar)
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+if GRAMMAR_BATCH_ENABLED:
+    grammar_batcher = GrammarBatcher()
+else:
+    grammar_batcher = GrammarBatcher(window_ms=0, max_size=1)
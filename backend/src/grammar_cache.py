@@ -0,0 +1,301 @@
+"""
+Caché de resultados de check_grammar
+
+Dos niveles con la misma clave sha256(idioma, texto normalizado):
+- LRU en memoria acotado (GRAMMAR_CACHE_MAX_ENTRIES): "hi", "how are you?" y
+  frases repetidas se resuelven en microsegundos sin llamar a GPT
+- tabla grammar_check_cache con TTL, compartida entre nodos y reinicios
+Solo se guardan resultados válidos (GPT o LanguageTool), nunca los fallbacks
+sin corrección ('method': 'none'). Aciertos/fallos por nivel en GET /metrics.
+
+La consulta a la tabla está acotada (GRAMMAR_CACHE_DB_TIMEOUT_MS y lo que quede
+del presupuesto de check_grammar) y store_nowait escribe en segundo plano: la
+caché nunca alarga una corrección.
+"""
+import asyncio
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from src import models
+from src.database import SessionLocal, AsyncSessionLocal
+from src.metrics import Counter, registry
+
+GRAMMAR_CACHE_MAX_ENTRIES = int(os.getenv("GRAMMAR_CACHE_MAX_ENTRIES", "20000"))
+GRAMMAR_CACHE_TTL_SECONDS = int(os.getenv("GRAMMAR_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Nivel persistente (tabla grammar_check_cache); en false solo se usa la LRU en memoria
+GRAMMAR_CACHE_PERSIST = os.getenv("GRAMMAR_CACHE_PERSIST", "true").lower() == "true"
+# Espera máxima a la tabla en una consulta; si no responde se trata como fallo de caché
+GRAMMAR_CACHE_DB_TIMEOUT_MS = float(os.getenv("GRAMMAR_CACHE_DB_TIMEOUT_MS", "250"))
+# Hilos para consultas con timeout y escrituras en segundo plano del camino sync
+GRAMMAR_CACHE_DB_WORKERS = int(os.getenv("GRAMMAR_CACHE_DB_WORKERS", "4"))
+
+GRAMMAR_CACHE_LOOKUPS = registry.register(Counter(
+    "grammar_cache_lookups_total",
+    "Consultas a la caché de correcciones gramaticales por nivel (memory, db) y resultado (hit, miss, timeout)",
+    ("tier", "result")
+))
+
+CACHEABLE_METHODS = ("gpt-4", "languagetool")
+
+
+def normalize_text(text: str) -> str:
+    # Espacios colapsados; mayúsculas y puntuación se conservan (son parte de la corrección)
+    return " ".join(text.split())
+
+
+def grammar_cache_key(text: str, language: str) -> str:
+    return hashlib.sha256(f"{language}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def is_cacheable(result: dict) -> bool:
+    return result.get("method") in CACHEABLE_METHODS and "error" not in result
+
+
+class GrammarResultCache:
+    """LRU en memoria (clave -> (caducidad, resultado)) delante de la tabla persistente"""
+
+    def __init__(self, max_entries: int = GRAMMAR_CACHE_MAX_ENTRIES, ttl_seconds: int = GRAMMAR_CACHE_TTL_SECONDS,
+                 persist: bool = GRAMMAR_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Referencias a las escrituras async en curso (que el GC no las cancele)
+        self._tasks: Set[asyncio.Task] = set()
+
+    # ---------- memoria ----------
+    def _get_memory(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+        GRAMMAR_CACHE_LOOKUPS.inc("memory", "hit")
+        return entry[1]
+
+    def _put_memory(self, key: str, result: dict, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _miss(self, tier: str, result: str = "miss"):
+        GRAMMAR_CACHE_LOOKUPS.inc(tier, result)
+        if tier == ("db" if self.persist else "memory"):
+            with self._lock:
+                self.misses += 1
+
+    def _db_hit(self, key: str, row) -> dict:
+        GRAMMAR_CACHE_LOOKUPS.inc("db", "hit")
+        with self._lock:
+            self.db_hits += 1
+        expires_at = time.time() + (row.expires_at - datetime.utcnow()).total_seconds()
+        self._put_memory(key, row.result, expires_at)
+        return row.result
+
+    @staticmethod
+    def _for_caller(result: dict, text: str) -> dict:
+        # Copia: el llamador puede modificar el dict sin tocar la caché
+        result = copy.deepcopy(result)
+        result["original"] = text
+        return result
+
+    def _db_timeout(self, timeout: Optional[float]) -> float:
+        limit = GRAMMAR_CACHE_DB_TIMEOUT_MS / 1000
+        return limit if timeout is None else max(min(timeout, limit), 0)
+
+    def _db_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=GRAMMAR_CACHE_DB_WORKERS,
+                                                        thread_name_prefix="grammar-cache")
+        return self._executor
+
+    def _row(self, key: str, language: str, result: dict) -> models.GrammarCheckCache:
+        now = datetime.utcnow()
+        return models.GrammarCheckCache(
+            key=key,
+            language=language,
+            result=result,
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.ttl_seconds)
+        )
+
+    # ---------- sync ----------
+    @staticmethod
+    def _get_row_sync(key: str):
+        db = SessionLocal()
+        try:
+            return db.get(models.GrammarCheckCache, key)
+        finally:
+            db.close()
+
+    def lookup_sync(self, text: str, language: str, timeout: Optional[float] = None) -> Optional[dict]:
+        """timeout: segundos que quedan al llamador (la tabla nunca espera más de eso)"""
+        key = grammar_cache_key(text, language)
+        result = self._get_memory(key)
+        if result is not None:
+            return self._for_caller(result, text)
+        self._miss("memory")
+        if not self.persist:
+            return None
+        try:
+            row = self._db_executor().submit(self._get_row_sync, key).result(timeout=self._db_timeout(timeout))
+        except FutureTimeoutError:
+            self._miss("db", "timeout")
+            return None
+        except Exception as e:
+            print(f"[grammar-cache] Lookup failed: {e}")
+            row = None
+        if row is None or row.expires_at < datetime.utcnow():
+            self._miss("db")
+            return None
+        return self._for_caller(self._db_hit(key, row), text)
+
+    def _persist_sync(self, key: str, language: str, result: dict):
+        try:
+            db = SessionLocal()
+            try:
+                db.merge(self._row(key, language, result))
+                db.commit()
+            except IntegrityError:
+                # Otro proceso guardó la misma clave a la vez
+                db.rollback()
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"[grammar-cache] Store failed: {e}")
+
+    def store_sync(self, text: str, language: str, result: dict):
+        if not is_cacheable(result):
+            return
+        key = grammar_cache_key(text, language)
+        self._put_memory(key, copy.deepcopy(result), time.time() + self.ttl_seconds)
+        if self.persist:
+            self._persist_sync(key, language, result)
+
+    # ---------- async ----------
+    @staticmethod
+    async def _get_row(key: str):
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(
+                select(models.GrammarCheckCache).where(models.GrammarCheckCache.key == key)
+            )).scalar_one_or_none()
+
+    async def lookup(self, text: str, language: str, timeout: Optional[float] = None) -> Optional[dict]:
+        key = grammar_cache_key(text, language)
+        result = self._get_memory(key)
+        if result is not None:
+            return self._for_caller(result, text)
+        self._miss("memory")
+        if not self.persist:
+            return None
+        try:
+            row = await asyncio.wait_for(self._get_row(key), self._db_timeout(timeout))
+        except asyncio.TimeoutError:
+            self._miss("db", "timeout")
+            return None
+        except Exception as e:
+            print(f"[grammar-cache] Lookup failed: {e}")
+            row = None
+        if row is None or row.expires_at < datetime.utcnow():
+            self._miss("db")
+            return None
+        return self._for_caller(self._db_hit(key, row), text)
+
+    async def _persist(self, key: str, language: str, result: dict):
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    await db.merge(self._row(key, language, result))
+                    await db.commit()
+                except IntegrityError:
+                    await db.rollback()
+        except Exception as e:
+            print(f"[grammar-cache] Store failed: {e}")
+
+    async def store(self, text: str, language: str, result: dict):
+        if not is_cacheable(result):
+            return
+        key = grammar_cache_key(text, language)
+        self._put_memory(key, copy.deepcopy(result), time.time() + self.ttl_seconds)
+        if self.persist:
+            await self._persist(key, language, result)
+
+    def store_nowait(self, text: str, language: str, result: dict):
+        """Como store/store_sync, pero la escritura en la tabla va en segundo plano (sirve en ambos caminos)"""
+        if not is_cacheable(result):
+            return
+        key = grammar_cache_key(text, language)
+        self._put_memory(key, copy.deepcopy(result), time.time() + self.ttl_seconds)
+        if not self.persist:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Camino sync (hilo sin event loop)
+            self._db_executor().submit(self._persist_sync, key, language, result)
+            return
+        task = loop.create_task(self._persist(key, language, result))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ---------- mantenimiento ----------
+    async def drain(self):
+        """Esperar a las escrituras en segundo plano pendientes (al parar)"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown, wait=True)
+            self._executor = None
+
+    async def purge_expired(self) -> int:
+        """Borrar de la tabla las entradas caducadas (al arrancar)"""
+        if not self.persist:
+            return 0
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(models.GrammarCheckCache).where(models.GrammarCheckCache.expires_at < datetime.utcnow())
+            )
+            await db.commit()
+            return result.rowcount or 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+grammar_cache = GrammarResultCache()
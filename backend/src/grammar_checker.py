@@ -1,35 +1,78 @@
 """
 Servicio de corrección gramatical usando OpenAI GPT-4 y LanguageTool
 GPT-4 es más preciso para errores contextuales como tiempo verbal
+
+Cada nivel externo tiene su circuit breaker (src/circuit_breaker.py): si GPT
+está caído se pasa directamente a LanguageTool. check_grammar nunca tarda más
+de GRAMMAR_CHECK_DEADLINE_MS; si no hay resultado a tiempo devuelve el texto
+sin corregir (method 'none').
+
+Los textos largos se dividen en frases que se revisan en paralelo (filtro
+local, caché y batcher por frase) y se vuelven a unir: reenviar un párrafo
+casi igual solo paga las frases que cambiaron.
 """
+import asyncio
+import json
+import re
+import time
 import requests
-from typing import Optional, Dict, List
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, List, Tuple
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from src.providers import get_provider
+from src.grammar_cache import grammar_cache
+from src.grammar_batcher import grammar_batcher
+from src.grammar_prefilter import grammar_prefilter, GRAMMAR_PREFILTER_ENABLED
+from src.circuit_breaker import CircuitBreaker
+from src.metrics import Counter, Gauge, registry
+
 load_dotenv()
 
-# Cliente OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+# API público de LanguageTool por defecto; para un servidor propio:
+# LANGUAGETOOL_API=http://localhost:8081/v2/check
+LANGUAGETOOL_API = os.getenv("LANGUAGETOOL_API", "https://api.languagetool.org/v2/check")
+LANGUAGETOOL_TIMEOUT_SECONDS = float(os.getenv("LANGUAGETOOL_TIMEOUT_SECONDS", "3"))
+LANGUAGETOOL_POOL_SIZE = int(os.getenv("LANGUAGETOOL_POOL_SIZE", "10"))
+# Tiempo máximo de check_grammar de principio a fin (GPT + fallback incluidos)
+GRAMMAR_CHECK_DEADLINE_MS = float(os.getenv("GRAMMAR_CHECK_DEADLINE_MS", "6000"))
+# Parte del presupuesto que se reserva para LanguageTool si GPT no responde a tiempo
+GRAMMAR_FALLBACK_RESERVE_MS = float(os.getenv("GRAMMAR_FALLBACK_RESERVE_MS", "1500"))
+# Llamada a GPT más lenta que su parte del presupuesto: fallo para el circuit breaker
+GPT_SLOW_CALL_SECONDS = (GRAMMAR_CHECK_DEADLINE_MS - GRAMMAR_FALLBACK_RESERVE_MS) / 1000
+# Textos a partir de esta longitud se revisan frase a frase (0 = siempre)
+GRAMMAR_SENTENCE_SPLIT_MIN_CHARS = int(os.getenv("GRAMMAR_SENTENCE_SPLIT_MIN_CHARS", "120"))
 
-# Usar el API público de LanguageTool (también puedes instalar el servidor localmente)
-LANGUAGETOOL_API = "https://api.languagetool.org/v2/check"
+# Conexiones keep-alive reutilizadas entre llamadas (y entre hilos)
+_languagetool_session = requests.Session()
+_languagetool_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=LANGUAGETOOL_POOL_SIZE, max_retries=0))
+_languagetool_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=LANGUAGETOOL_POOL_SIZE, max_retries=0))
 
+gpt_breaker = CircuitBreaker("grammar-gpt")
+languagetool_breaker = CircuitBreaker("languagetool")
 
-def check_grammar_with_gpt(text: str, language: str = "en-US") -> dict:
-    """
-    Verifica y corrige gramática usando GPT-4 (más preciso que LanguageTool)
-    
-    Args:
-        text: Texto a verificar
-        language: Código de idioma (en-US, es, etc.)
-    
-    Returns:
-        Dict con errores encontrados, texto corregido y explicaciones
-    """
-    try:
-        prompt = f"""You are an English grammar expert. Analyze the following text and correct any grammatical errors.
+GRAMMAR_FALLBACKS = registry.register(Counter(
+    "grammar_check_fallbacks_total",
+    "Veces que check_grammar pasó al siguiente nivel (gpt_error, gpt_timeout, gpt_circuit_open, "
+    "languagetool_error, languagetool_circuit_open, deadline_exceeded)",
+    ("reason",)
+))
+registry.register(Gauge(
+    "grammar_gpt_circuit_open",
+    "1 si el circuito de GPT para gramática está abierto (se salta a LanguageTool)",
+    lambda: 0 if gpt_breaker.state == "closed" else 1
+))
+registry.register(Gauge(
+    "grammar_languagetool_circuit_open",
+    "1 si el circuito de LanguageTool está abierto",
+    lambda: 0 if languagetool_breaker.state == "closed" else 1
+))
+
+
+def _gpt_grammar_messages(text: str) -> List[Dict[str, str]]:
+    prompt = f"""You are an English grammar expert. Analyze the following text and correct any grammatical errors.
 
 Text to analyze: "{text}"
 
@@ -51,37 +94,61 @@ Rules:
 - Keep the corrected text natural and preserve the original meaning
 - Focus on grammar, verb tenses, articles, prepositions, and word order
 - Provide clear, brief explanations"""
+    return [
+        {"role": "system", "content": "You are a precise English grammar checker. Always respond with valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a precise English grammar checker. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        # Parse JSON response
-        import json
-        result_text = response.choices[0].message.content.strip()
-        
-        # Remove markdown code blocks if present
-        if result_text.startswith("```"):
-            result_text = result_text.split("```")[1]
-            if result_text.startswith("json"):
-                result_text = result_text[4:]
-            result_text = result_text.strip()
-        
-        result = json.loads(result_text)
-        
-        return {
-            'original': text,
-            'corrected': result.get('corrected', text),
-            'has_errors': result.get('has_errors', False),
-            'errors': result.get('errors', []),
-            'method': 'gpt-4'
-        }
+
+def _strip_code_fence(content: str) -> str:
+    result_text = content.strip()
+    
+    # Remove markdown code blocks if present
+    if result_text.startswith("```"):
+        result_text = result_text.split("```")[1]
+        if result_text.startswith("json"):
+            result_text = result_text[4:]
+        result_text = result_text.strip()
+    return result_text
+
+
+def _grammar_result(text: str, result: dict) -> dict:
+    return {
+        'original': text,
+        'corrected': result.get('corrected', text),
+        'has_errors': result.get('has_errors', False),
+        'errors': result.get('errors', []),
+        'method': 'gpt-4'
+    }
+
+
+def _parse_gpt_grammar_response(text: str, content: str) -> dict:
+    return _grammar_result(text, json.loads(_strip_code_fence(content)))
+
+
+def gpt_grammar_check(text: str) -> dict:
+    """Una llamada a GPT para un texto; lanza excepción si falla (el fallback lo decide quien llama)"""
+    content = get_provider().chat_sync(
+        _gpt_grammar_messages(text), purpose="grammar", temperature=0.3,
+        # Un texto largo sin puntos no se divide: que la corrección no salga cortada
+        max_tokens=min(500 + len(text) // 2, 4096)
+    )
+    return _parse_gpt_grammar_response(text, content)
+
+
+def check_grammar_with_gpt(text: str, language: str = "en-US") -> dict:
+    """
+    Verifica y corrige gramática usando GPT-4 (más preciso que LanguageTool)
+    
+    Args:
+        text: Texto a verificar
+        language: Código de idioma (en-US, es, etc.)
+    
+    Returns:
+        Dict con errores encontrados, texto corregido y explicaciones
+    """
+    try:
+        return gpt_grammar_check(text)
         
     except Exception as e:
         print(f"Error with GPT grammar check: {str(e)}")
@@ -89,29 +156,46 @@ Rules:
         return check_grammar_with_languagetool(text, language)
 
 
-def check_grammar_with_languagetool(text: str, language: str = "en-US") -> dict:
+def _unchecked(text: str, error: str) -> dict:
+    """Resultado sin corrección cuando ningún nivel pudo revisar el texto"""
+    return {
+        'original': text,
+        'corrected': text,
+        'matches': [],
+        'has_errors': False,
+        'error': error,
+        'method': 'none'
+    }
+
+
+def check_grammar_with_languagetool(text: str, language: str = "en-US", timeout: float = LANGUAGETOOL_TIMEOUT_SECONDS) -> dict:
     """
     Verifica la gramática de un texto usando LanguageTool API (fallback)
     
     Args:
         text: Texto a verificar
         language: Código de idioma (en-US, es, etc.)
+        timeout: Segundos máximos (lo que quede del presupuesto de check_grammar)
     
     Returns:
         Dict con errores encontrados y texto corregido
     """
+    if not languagetool_breaker.allow():
+        GRAMMAR_FALLBACKS.inc("languagetool_circuit_open")
+        return _unchecked(text, 'LanguageTool circuit open')
     try:
-        response = requests.post(
+        response = _languagetool_session.post(
             LANGUAGETOOL_API,
             data={
                 'text': text,
                 'language': language,
             },
-            timeout=5
+            timeout=min(timeout, LANGUAGETOOL_TIMEOUT_SECONDS)
         )
         
         if response.status_code == 200:
             result = response.json()
+            languagetool_breaker.record_success()
             return {
                 'original': text,
                 'corrected': apply_corrections(text, result['matches']),
@@ -120,25 +204,200 @@ def check_grammar_with_languagetool(text: str, language: str = "en-US") -> dict:
                 'method': 'languagetool'
             }
         else:
-            return {
-                'original': text,
-                'corrected': text,
-                'matches': [],
-                'has_errors': False,
-                'error': 'API error',
-                'method': 'none'
-            }
+            languagetool_breaker.record_failure()
+            GRAMMAR_FALLBACKS.inc("languagetool_error")
+            return _unchecked(text, 'API error')
             
     except Exception as e:
         print(f"Error checking grammar with LanguageTool: {str(e)}")
-        return {
+        languagetool_breaker.record_failure()
+        GRAMMAR_FALLBACKS.inc("languagetool_error")
+        return _unchecked(text, str(e))
+
+
+# ==================== NIVELES CON PRESUPUESTO ====================
+def _gpt_budget(deadline: float) -> float:
+    """Segundos para GPT: lo que queda menos la reserva de LanguageTool (si se puede usar)"""
+    remaining = deadline - time.monotonic()
+    if languagetool_breaker.state == "open":
+        return remaining
+    return remaining - GRAMMAR_FALLBACK_RESERVE_MS / 1000
+
+
+def _submit_to_gpt(texts: List[str], language: str) -> List[Optional[Future]]:
+    """Encola los textos en el batcher (a la vez, para que vayan en el mismo lote)"""
+    # Una consulta al circuito por check_grammar: en half-open la prueba es el lote entero
+    if gpt_breaker.allow():
+        return [grammar_batcher.submit(text, language) for text in texts]
+    GRAMMAR_FALLBACKS.inc("gpt_circuit_open")
+    return [None] * len(texts)
+
+
+def _gpt_failed(reason: str, error: Exception = None) -> None:
+    # El circuit breaker lo actualiza el batcher, una vez por llamada a GPT
+    if error is not None:
+        print(f"Error with GPT grammar check: {str(error)}")
+    GRAMMAR_FALLBACKS.inc(reason)
+    return None
+
+
+def _wait_gpt(future: Optional[Future], deadline: float) -> Optional[dict]:
+    """Resultado de GPT o None si falló, no llegó a tiempo o no se pidió"""
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=max(_gpt_budget(deadline), 0))
+    except FutureTimeoutError:
+        return _gpt_failed("gpt_timeout")
+    except Exception as e:
+        return _gpt_failed("gpt_error", e)
+
+
+def _languagetool_fallback(texts: List[str], language: str, deadline: float) -> List[dict]:
+    """Una sola llamada a LanguageTool (y un resultado en su breaker) para todos los textos sin GPT"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        GRAMMAR_FALLBACKS.inc("deadline_exceeded")
+        return [_unchecked(text, 'Grammar check deadline exceeded') for text in texts]
+    if len(texts) == 1:
+        return [check_grammar_with_languagetool(texts[0], language, timeout=remaining)]
+
+    result = check_grammar_with_languagetool("\n".join(texts), language, timeout=remaining)
+    if result['method'] != 'languagetool':
+        return [_unchecked(text, result.get('error', 'API error')) for text in texts]
+    # Repartir los matches por frase (offsets relativos a cada una)
+    results = []
+    start = 0
+    for text in texts:
+        end = start + len(text)
+        matches = [
+            {**match, 'offset': match['offset'] - start}
+            for match in result['matches']
+            if start <= match['offset'] and match['offset'] + match['length'] <= end
+        ]
+        results.append({
             'original': text,
-            'corrected': text,
-            'matches': [],
-            'has_errors': False,
-            'error': str(e),
-            'method': 'none'
-        }
+            'corrected': apply_corrections(text, matches),
+            'matches': matches,
+            'has_errors': len(matches) > 0,
+            'method': 'languagetool'
+        })
+        start = end + 1
+    return results
+
+
+def _consume_result(future: asyncio.Future):
+    # Resultado que llegó tarde: se descarta sin avisos de excepción no recuperada
+    if not future.cancelled():
+        future.exception()
+
+
+async def _wait_gpt_async(futures: List[Optional[Future]], deadline: float) -> List[Optional[dict]]:
+    wrapped = [asyncio.wrap_future(future) if future is not None else None for future in futures]
+    waiting = {future for future in wrapped if future is not None}
+    if not waiting:
+        return [None] * len(futures)
+    done, _ = await asyncio.wait(waiting, timeout=max(_gpt_budget(deadline), 0))
+
+    results = []
+    for future in wrapped:
+        if future is None:
+            results.append(None)
+        elif future not in done:
+            future.add_done_callback(_consume_result)
+            results.append(_gpt_failed("gpt_timeout"))
+        elif future.exception() is not None:
+            results.append(_gpt_failed("gpt_error", future.exception()))
+        else:
+            results.append(future.result())
+    return results
+
+
+async def _languagetool_fallback_async(texts: List[str], language: str, deadline: float) -> List[dict]:
+    remaining = deadline - time.monotonic()
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(_languagetool_fallback, texts, language, deadline), max(remaining, 0)
+        )
+    except asyncio.TimeoutError:
+        GRAMMAR_FALLBACKS.inc("deadline_exceeded")
+        return [_unchecked(text, 'Grammar check deadline exceeded') for text in texts]
+
+
+# ==================== FRASES ====================
+# Fin de frase: puntuación (+ comillas / paréntesis de cierre) y espacio, o salto de línea
+_SENTENCE_BREAK = re.compile(r"[.!?…]+[\"'”’)\]]*(\s+)|\n\s*")
+# Puntos que no cierran frase: abreviaturas comunes e iniciales ("J. K. Rowling")
+_ABBREVIATION = re.compile(r"(\b(?i:mr|mrs|ms|dr|prof|st|vs|etc|jr|sr|e\.g|i\.e|a\.m|p\.m)|(^|[\s.])[A-Z])\.$")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Posiciones (inicio, fin) de cada frase en el texto, sin los espacios que las separan"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_BREAK.finditer(text):
+        end = match.start(1) if match.group(1) is not None else match.start()
+        if match.group(1) is not None and _ABBREVIATION.search(text[start:end]):
+            continue
+        spans.append((start, end))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for start, end in spans:
+        segment = text[start:end]
+        if segment.strip():
+            trimmed.append((start + len(segment) - len(segment.lstrip()), end - len(segment) + len(segment.rstrip())))
+    return trimmed
+
+
+def _sentences_to_check(text: str) -> List[Tuple[int, int]]:
+    # Textos cortos se revisan enteros (GPT ve todo el contexto)
+    if len(text) < GRAMMAR_SENTENCE_SPLIT_MIN_CHARS:
+        return [(0, len(text))]
+    return split_sentences(text) or [(0, len(text))]
+
+
+def merge_sentence_results(text: str, spans: List[Tuple[int, int]], results: List[dict]) -> dict:
+    """Une los resultados por frase en uno solo con la forma de check_grammar"""
+    corrected = []
+    errors = []
+    matches = []
+    position = 0
+    for (start, end), result in zip(spans, results):
+        corrected.append(text[position:start])
+        corrected.append(result['corrected'] if result.get('has_errors') else text[start:end])
+        position = end
+        errors.extend(result.get('errors', []))
+        # Offsets de LanguageTool relativos a la frase -> relativos al texto completo
+        matches.extend({**match, 'offset': match['offset'] + start} for match in result.get('matches', []))
+    corrected.append(text[position:])
+
+    methods = list(dict.fromkeys(result.get('method') for result in results))
+    merged = {
+        'original': text,
+        'corrected': "".join(corrected),
+        'has_errors': any(result.get('has_errors') for result in results),
+        'errors': errors,
+        'matches': matches,
+        'method': methods[0] if len(methods) == 1 else 'mixed',
+        'sentences': len(spans)
+    }
+    unchecked = sum(1 for result in results if result.get('method') == 'none')
+    if unchecked:
+        merged['error'] = f'{unchecked} of {len(results)} sentences unchecked'
+    return merged
+
+
+# ==================== CHECK_GRAMMAR ====================
+def _check_local(text: str, language: str, deadline: float) -> Optional[dict]:
+    # Saludos, emoji y frases hechas se resuelven en local (src/grammar_prefilter.py)
+    if GRAMMAR_PREFILTER_ENABLED:
+        local = grammar_prefilter.check(text)
+        if local is not None:
+            return local
+    # Textos repetidos ("hi", "how are you?") no vuelven a llamar a GPT
+    return grammar_cache.lookup_sync(text, language, timeout=deadline - time.monotonic())
 
 
 def check_grammar(text: str, language: str = "en-US") -> dict:
@@ -152,7 +411,65 @@ def check_grammar(text: str, language: str = "en-US") -> dict:
     Returns:
         Dict con errores encontrados y texto corregido
     """
-    return check_grammar_with_gpt(text, language)
+    # Nunca más de GRAMMAR_CHECK_DEADLINE_MS en total
+    deadline = time.monotonic() + GRAMMAR_CHECK_DEADLINE_MS / 1000
+    spans = _sentences_to_check(text)
+    sentences = [text[start:end] for start, end in spans]
+    results = [_check_local(sentence, language, deadline) for sentence in sentences]
+    
+    # Todas las frases pendientes se encolan a la vez: el batcher las junta en una
+    # sola llamada a GPT; las que fallan o no llegan a tiempo van juntas a LanguageTool
+    # con lo que quede del presupuesto
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        futures = _submit_to_gpt([sentences[i] for i in pending], language)
+        for i, future in zip(pending, futures):
+            results[i] = _wait_gpt(future, deadline)
+        failed = [i for i in pending if results[i] is None]
+        if failed:
+            fallback = _languagetool_fallback([sentences[i] for i in failed], language, deadline)
+            for i, result in zip(failed, fallback):
+                results[i] = result
+        # La escritura en la tabla no cuenta para el presupuesto
+        for i in pending:
+            grammar_cache.store_nowait(sentences[i], language, results[i])
+    
+    if len(spans) == 1 and spans[0] == (0, len(text)):
+        return results[0]
+    return merge_sentence_results(text, spans, results)
+
+
+async def _check_local_async(text: str, language: str, deadline: float) -> Optional[dict]:
+    if GRAMMAR_PREFILTER_ENABLED:
+        local = grammar_prefilter.check(text)
+        if local is not None:
+            return local
+    return await grammar_cache.lookup(text, language, timeout=deadline - time.monotonic())
+
+
+async def check_grammar_async(text: str, language: str = "en-US") -> dict:
+    """Versión async de check_grammar para endpoints async"""
+    deadline = time.monotonic() + GRAMMAR_CHECK_DEADLINE_MS / 1000
+    spans = _sentences_to_check(text)
+    sentences = [text[start:end] for start, end in spans]
+    results = list(await asyncio.gather(*(_check_local_async(sentence, language, deadline) for sentence in sentences)))
+    
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        futures = _submit_to_gpt([sentences[i] for i in pending], language)
+        for i, result in zip(pending, await _wait_gpt_async(futures, deadline)):
+            results[i] = result
+        failed = [i for i in pending if results[i] is None]
+        if failed:
+            fallback = await _languagetool_fallback_async([sentences[i] for i in failed], language, deadline)
+            for i, result in zip(failed, fallback):
+                results[i] = result
+        for i in pending:
+            grammar_cache.store_nowait(sentences[i], language, results[i])
+    
+    if len(spans) == 1 and spans[0] == (0, len(text)):
+        return results[0]
+    return merge_sentence_results(text, spans, results)
 
 
 def apply_corrections(text: str, matches: list) -> str:
@@ -0,0 +1,109 @@
+"""
+Filtro local antes de la corrección con GPT
+
+Muchos textos del chat y de speaking son saludos, emoji o respuestas hechas.
+Antes de la caché y de GPT se prueban dos niveles locales; cualquiera puede
+dar el texto por correcto, y todo lo demás se manda a GPT:
+- trivial: vacío, solo emoji / puntuación / números / enlaces
+- phrasebook: saludos y respuestas cortas conocidas ("hi", "Thank you!", "see you")
+Una frase con palabras conocidas no está necesariamente bien ("He play football.",
+"She is teacher."): sin GPT no se da por correcta ninguna frase libre.
+Decisiones en /metrics, incluido grammar_prefilter_gpt_avoided_ratio.
+"""
+import os
+import re
+from typing import Dict, Optional
+
+from src.metrics import Counter, Gauge, registry
+
+GRAMMAR_PREFILTER_ENABLED = os.getenv("GRAMMAR_PREFILTER_ENABLED", "true").lower() == "true"
+
+GRAMMAR_PREFILTER_DECISIONS = registry.register(Counter(
+    "grammar_prefilter_decisions_total",
+    "Textos resueltos por cada nivel del filtro local (gpt = escalado a GPT)",
+    ("tier",)
+))
+GRAMMAR_PREFILTER_ESCALATIONS = registry.register(Counter(
+    "grammar_prefilter_escalations_total",
+    "Motivo por el que el filtro local mandó el texto a GPT",
+    ("reason",)
+))
+
+# Emoji, símbolos y puntuación (lo que queda fuera de palabras y números)
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_URL = re.compile(r"^(https?://|www\.)\S+$", re.IGNORECASE)
+_NUMBER = re.compile(r"^[\d\s.,:/%+\-]+$")
+
+PHRASEBOOK = frozenset({
+    "hi", "hello", "hey", "hi there", "hello there", "hey there", "good morning", "good afternoon",
+    "good evening", "good night", "goodbye", "bye", "bye bye", "see you", "see you later",
+    "see you soon", "see you tomorrow", "see you next week", "have a nice day", "have a good day",
+    "have a great day", "have a nice weekend", "take care", "welcome", "you're welcome",
+    "thanks", "thank you", "thank you so much", "thank you very much", "thanks a lot", "many thanks",
+    "no problem", "no worries", "of course", "sure", "yes", "yeah", "yes please", "no", "no thanks",
+    "no thank you", "ok", "okay", "alright", "all right", "cool", "great", "nice", "perfect",
+    "awesome", "excellent", "good", "very good", "good job", "well done", "congratulations",
+    "sorry", "i'm sorry", "excuse me", "please", "maybe", "me too", "me neither", "exactly",
+    "i agree", "i see", "i know", "i don't know", "i think so", "i don't think so", "i hope so",
+    "how are you", "how are you doing", "how is it going", "what's up", "i'm fine", "i'm good",
+    "i'm fine, thanks", "i'm fine, thank you", "fine, thanks", "fine, thank you", "not bad",
+    "and you", "what about you", "nice to meet you", "nice to meet you too", "good luck",
+    "happy birthday", "merry christmas", "happy new year", "sounds good", "that's great",
+    "that's right", "that's true", "really", "wow", "of course not", "let's go", "got it",
+})
+
+def _clean_result(text: str, tier: str) -> dict:
+    return {
+        'original': text,
+        'corrected': text,
+        'has_errors': False,
+        'errors': [],
+        'method': f'local-{tier}'
+    }
+
+
+class GrammarPrefilter:
+    """Niveles locales; classify() devuelve el nivel que da el texto por correcto o None (GPT)"""
+
+    def _escalate(self, reason: str) -> None:
+        GRAMMAR_PREFILTER_ESCALATIONS.inc(reason)
+        return None
+
+    def classify(self, text: str) -> Optional[str]:
+        stripped = " ".join(text.replace("’", "'").split())
+        words_only = _NON_WORD.sub(" ", stripped).strip()
+
+        # 1. Trivial
+        if not words_only or _NUMBER.match(stripped) or _URL.match(stripped):
+            return "trivial"
+
+        # "i" en minúscula se corrige siempre (también en frases hechas)
+        if re.search(r"(^|[^\w'])i('m|'ve|'ll|'d)?\b", stripped):
+            return self._escalate("lowercase_i")
+
+        # 2. Frases hechas (sin puntuación ni emoji alrededor)
+        key = " ".join(re.sub(r"[^a-z' ,]+", " ", stripped.lower()).split()).strip(" ,")
+        if key in PHRASEBOOK or key.replace(",", "") in PHRASEBOOK:
+            return "phrasebook"
+        return self._escalate("free_text")
+
+    def check(self, text: str) -> Optional[dict]:
+        """Resultado sin errores si un nivel local lo da por correcto; None = hay que llamar a GPT"""
+        tier = self.classify(text)
+        GRAMMAR_PREFILTER_DECISIONS.inc(tier or "gpt")
+        return _clean_result(text, tier) if tier else None
+
+    def stats(self) -> Dict[str, float]:
+        decided = {tier: GRAMMAR_PREFILTER_DECISIONS.value(tier) for tier in ("trivial", "phrasebook", "gpt")}
+        total = sum(decided.values())
+        avoided = total - decided["gpt"]
+        return {**decided, "gpt_avoided_ratio": round(avoided / total, 4) if total else 0.0}
+
+
+grammar_prefilter = GrammarPrefilter()
+
+registry.register(Gauge(
+    "grammar_prefilter_gpt_avoided_ratio",
+    "Fracción de textos que el filtro local resolvió sin llamar a GPT",
+    lambda: grammar_prefilter.stats()["gpt_avoided_ratio"]
+))
@@ -0,0 +1,201 @@
+"""
+Corrección gramatical diferida de los mensajes del chat
+
+POST /messages guarda el mensaje al momento con correction_status='pending' y
+encola su id; enviar no espera a GPT. Un pool de workers asyncio corrige cada
+mensaje (check_grammar_async: caché + batcher) y rellena corrected_content con
+un UPDATE condicional (solo si sigue pending, así un mensaje se publica una vez).
+El resultado se publica como evento 'message_corrected' al emisor y al receptor
+(GET /messages/events, SSE). Los eventos son por proceso; el estado también se
+ve al recargar la conversación. Los pendientes de un proceso caído se recuperan
+al arrancar.
+
+Si la corrección lanza una excepción o alguna frase queda sin revisar (GPT y
+LanguageTool caídos), se reintenta con backoff; tras
+MESSAGE_CORRECTION_MAX_ATTEMPTS intentos el mensaje queda 'failed'. La sesión de
+base de datos no se mantiene abierta durante la llamada a GPT.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from src import models
+from src import schemas
+from src.database import AsyncSessionLocal
+
+# Correcciones en paralelo por proceso (el batcher agrupa las llamadas a GPT)
+MESSAGE_CORRECTION_WORKERS = int(os.getenv("MESSAGE_CORRECTION_WORKERS", "4"))
+# Intentos por mensaje antes de marcarlo 'failed' y espera antes del primer reintento (se duplica)
+MESSAGE_CORRECTION_MAX_ATTEMPTS = int(os.getenv("MESSAGE_CORRECTION_MAX_ATTEMPTS", "3"))
+MESSAGE_CORRECTION_RETRY_SECONDS = float(os.getenv("MESSAGE_CORRECTION_RETRY_SECONDS", "5"))
+# Pendientes que se recuperan como máximo al arrancar
+MESSAGE_CORRECTION_RECOVER_LIMIT = int(os.getenv("MESSAGE_CORRECTION_RECOVER_LIMIT", "1000"))
+# Eventos por suscriptor sin leer antes de descartar los más antiguos
+MESSAGE_EVENTS_MAX_QUEUED = int(os.getenv("MESSAGE_EVENTS_MAX_QUEUED", "100"))
+
+
+class MessageEventBus:
+    """Colas de eventos por usuario para los clientes conectados a /messages/events"""
+
+    def __init__(self, max_queued: int = MESSAGE_EVENTS_MAX_QUEUED):
+        self.max_queued = max_queued
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.max_queued)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def publish(self, user_ids: Iterable[int], event: str, data: Dict[str, Any]):
+        for user_id in set(user_ids):
+            for queue in self._subscribers.get(user_id, ()):
+                if queue.full():
+                    # Cliente lento: se pierde el evento más antiguo, no el nuevo
+                    queue.get_nowait()
+                queue.put_nowait((event, data))
+
+
+message_events = MessageEventBus()
+
+
+class MessageCorrectionQueue:
+    """Workers asyncio que corrigen los mensajes pendientes"""
+
+    def __init__(self, workers: int = MESSAGE_CORRECTION_WORKERS):
+        self.workers = workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (message_id, intento)
+        self._queue: Optional["asyncio.Queue[Tuple[int, int]]"] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._retries: Set[asyncio.TimerHandle] = set()
+
+    # ---------- ciclo de vida ----------
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        for _ in range(self.workers):
+            task = asyncio.create_task(self._worker())
+            self._tasks.add(task)
+        await self.recover()
+
+    async def stop(self):
+        # Los reintentos programados quedan pending y se recuperan al arrancar
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._loop = None
+
+    async def recover(self):
+        """Encolar los mensajes que quedaron pendientes (reinicio o proceso caído)"""
+        async with AsyncSessionLocal() as db:
+            message_ids = (await db.execute(
+                select(models.Message.id)
+                .where(models.Message.correction_status == "pending")
+                .order_by(models.Message.id)
+                .limit(MESSAGE_CORRECTION_RECOVER_LIMIT)
+            )).scalars().all()
+        for message_id in message_ids:
+            self._queue.put_nowait((message_id, 1))
+
+    # ---------- API ----------
+    def schedule(self, message_id: int):
+        """Encolar un mensaje (se puede llamar desde endpoints sync, en otro hilo)"""
+        if self._loop is None:
+            # Sin workers (scripts, tests): queda pending y se recupera al arrancar
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (message_id, 1))
+
+    # ---------- workers ----------
+    async def _worker(self):
+        while True:
+            message_id, attempt = await self._queue.get()
+            last_attempt = attempt >= MESSAGE_CORRECTION_MAX_ATTEMPTS
+            try:
+                finished = await self._process(message_id, last_attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[messages] Correction failed for message {message_id} (attempt {attempt}): {e}")
+                finished = False
+            if finished:
+                continue
+            try:
+                if last_attempt:
+                    await self._finish(message_id, {"correction_status": "failed", "corrected_content": None})
+                else:
+                    self._retry_later(message_id, attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Sigue pending: se recupera al arrancar
+                print(f"[messages] Could not reschedule message {message_id}: {e}")
+
+    def _retry_later(self, message_id: int, attempt: int):
+        def retry():
+            self._retries.discard(handle)
+            self._queue.put_nowait((message_id, attempt + 1))
+
+        handle = self._loop.call_later(MESSAGE_CORRECTION_RETRY_SECONDS * 2 ** (attempt - 1), retry)
+        self._retries.add(handle)
+
+    async def _process(self, message_id: int, last_attempt: bool) -> bool:
+        """True si el mensaje quedó resuelto; False para reintentar"""
+        from src.grammar_checker import check_grammar_async
+
+        async with AsyncSessionLocal() as db:
+            message = await db.get(models.Message, message_id)
+            if message is None or message.correction_status != "pending":
+                return True
+            content = message.content
+
+        result = await check_grammar_async(content)
+        if "error" in result:
+            # GPT y LanguageTool fallaron (en todo el texto o en alguna frase)
+            if not last_attempt:
+                return False
+            values = {"correction_status": "failed", "corrected_content": None}
+        else:
+            values = {
+                "correction_status": "done",
+                "corrected_content": result["corrected"] if result["has_errors"] else None
+            }
+        await self._finish(message_id, values)
+        return True
+
+    async def _finish(self, message_id: int, values: Dict[str, Any]):
+        """UPDATE condicional (solo si sigue pending) y evento para emisor y receptor"""
+        async with AsyncSessionLocal() as db:
+            updated = await db.execute(
+                update(models.Message)
+                .where(models.Message.id == message_id, models.Message.correction_status == "pending")
+                .values(**values)
+            )
+            await db.commit()
+            if updated.rowcount != 1:
+                return
+            message = await db.get(models.Message, message_id)
+
+        message_events.publish(
+            (message.sender_id, message.receiver_id),
+            "message_corrected",
+            schemas.MessageResponse.model_validate(message).model_dump(mode="json")
+        )
+
+
+message_correction_queue = MessageCorrectionQueue()
@@ -0,0 +1,191 @@
+"""
+Métricas en proceso (formato de texto de Prometheus en GET /metrics)
+
+Cada turno de speaking mide sus etapas (upload, queue, stt, grammar, reply, tts,
+db_commit y el turno completo) en el histograma speaking_stage_seconds y cuenta
+los fallos en speaking_stage_errors_total, etiquetados por etapa, modelo y
+resultado (ok / error / rate_limited / cancelled). TurnTimings guarda además los
+tiempos del turno en milisegundos para SpeakingMessage.stage_timings.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Buckets en segundos: de subidas/commits (ms) a llamadas lentas de GPT/TTS
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> (conteos por bucket, suma, total)
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, labels, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {n}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Gauge:
+    """Valor calculado al leer /metrics (p. ej. un ratio a partir de otros contadores)"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {self.read():g}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+SPEAKING_STAGE_SECONDS = registry.register(Histogram(
+    "speaking_stage_seconds",
+    "Duración de cada etapa de un turno de speaking",
+    ("stage", "model", "outcome")
+))
+SPEAKING_STAGE_ERRORS = registry.register(Counter(
+    "speaking_stage_errors_total",
+    "Etapas de un turno de speaking que terminaron con error",
+    ("stage", "model", "outcome")
+))
+
+
+def error_outcome(exc: BaseException) -> str:
+    """Resultado de una etapa fallida (los 429 se cuentan aparte para ver la presión de cuota)"""
+    if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    from src.openai_service import STTQuotaExceededError, _is_quota_error
+    if isinstance(exc, STTQuotaExceededError) or _is_quota_error(str(exc)):
+        return "rate_limited"
+    return "error"
+
+
+class TurnTimings:
+    """Tiempos (ms) de las etapas de un turno; cada etapa se publica también en las métricas"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, model: str, seconds: float, outcome: str = "ok"):
+        SPEAKING_STAGE_SECONDS.observe(seconds, stage, model, outcome)
+        if outcome != "ok":
+            SPEAKING_STAGE_ERRORS.inc(stage, model, outcome)
+        self.stages[stage] = round(seconds * 1000, 1)
+
+    @contextmanager
+    def stage(self, stage: str, model: str = "none") -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.record(stage, model, time.perf_counter() - start, error_outcome(e))
+            raise
+        self.record(stage, model, time.perf_counter() - start)
+
+    async def measure(self, stage: str, model: str, awaitable):
+        """Igual que stage() para una corrutina (p. ej. dentro de asyncio.gather)"""
+        with self.stage(stage, model):
+            return await awaitable
+
+    def finish(self, outcome: str = "ok") -> Dict[str, float]:
+        """Cerrar el turno: etapa 'turn' con el tiempo total desde la creación"""
+        self.record("turn", "none", time.perf_counter() - self.started, outcome)
+        return self.as_dict()
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.stages)
+
+
+def render_metrics() -> str:
+    return registry.render()
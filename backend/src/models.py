@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Enum, JSON, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -26,6 +26,7 @@ class User(Base):
     name = Column(String(255), nullable=False)
     role = Column(Enum(UserRole, name='user_role'), nullable=False)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")  # Se incrementa para invalidar tokens
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relaciones
@@ -48,6 +49,17 @@ class Course(Base):
     teacher = relationship("User", back_populates="courses_created", foreign_keys=[teacher_id])
     units = relationship("Unit", back_populates="course", cascade="all, delete-orphan")
     enrollments = relationship("Enrollment", back_populates="course")
+    
+    # Índices para la paginación por keyset del catálogo (created_at, id)
+    __table_args__ = (
+        Index(
+            "idx_courses_published",
+            created_at.desc(), id.desc(),
+            postgresql_where=text("is_published = TRUE")
+        ),
+        Index("idx_courses_created", created_at.desc(), id.desc()),
+        Index("idx_courses_teacher_created", teacher_id, created_at.desc(), id.desc()),
+    )
 
 
 class Unit(Base):
@@ -106,6 +118,11 @@ class Enrollment(Base):
     # Relaciones
     student = relationship("User", back_populates="enrollments")
     course = relationship("Course", back_populates="enrollments")
+    
+    # Roster del curso paginado por (enrolled_at, id)
+    __table_args__ = (
+        Index("idx_enrollments_course_enrolled", course_id, enrolled_at.desc(), id.desc()),
+    )
 
 
 # ==================== SOCIAL FEATURES ====================
@@ -139,12 +156,26 @@ class Message(Base):
     receiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
     corrected_content = Column(Text)  # Versión corregida
+    # pending: corrección en segundo plano (src/message_corrections.py); done / failed al terminar
+    correction_status = Column(String(20), nullable=False, default="done", server_default="done")
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relaciones
     sender = relationship("User", foreign_keys=[sender_id], backref="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], backref="received_messages")
+    
+    # Índices para el inbox y las conversaciones (ambas direcciones)
+    __table_args__ = (
+        Index("idx_messages_sender_receiver_created", sender_id, receiver_id, created_at),
+        Index("idx_messages_receiver_sender_created", receiver_id, sender_id, created_at),
+        # Correcciones pendientes que se recuperan al arrancar
+        Index(
+            "idx_messages_correction_pending", id,
+            postgresql_where=text("correction_status = 'pending'"),
+            sqlite_where=text("correction_status = 'pending'")
+        ),
+    )
 
 
 # ==================== SPEAKING PRACTICE ====================
@@ -171,6 +202,8 @@ class SpeakingSession(Base):
     conversation_type = Column(Enum(ConversationType, name='conversation_type'), nullable=False)
     difficulty_level = Column(Enum(DifficultyLevel, name='difficulty_level'), nullable=False)
     system_prompt = Column(Text)  # Prompt del sistema para la IA
+    context_summary = Column(Text)  # Resumen de los turnos antiguos (contexto acotado)
+    context_summary_until = Column(Integer)  # Último SpeakingMessage.id incluido en el resumen
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     ended_at = Column(DateTime)
@@ -189,7 +222,61 @@ class SpeakingMessage(Base):
     content = Column(Text, nullable=False)  # Texto transcrito
     corrected_content = Column(Text)  # ⬅️ NUEVO: Versión corregida (solo para role='user')
     audio_path = Column(String(500))  # Ruta del audio (si existe)
+    stage_timings = Column(JSON)  # Solo role='user': ms por etapa del turno (stt, grammar, reply, tts...)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relaciones
-    session = relationship("SpeakingSession", back_populates="messages")
\ No newline at end of file
+    session = relationship("SpeakingSession", back_populates="messages")
+    
+    # Contexto reciente de la sesión (id > context_summary_until)
+    # y búsqueda por audio al regenerar clips expulsados de la caché TTS
+    __table_args__ = (
+        Index("idx_speaking_messages_session_id", session_id, id),
+        Index("idx_speaking_messages_audio_path", audio_path),
+    )
+
+
+class SpeakingJobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class SpeakingTurnJob(Base):
+    """Turno de speaking encolado (POST .../message?mode=job), procesado por src/speaking_jobs.py"""
+    __tablename__ = "speaking_turn_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("speaking_sessions.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(Enum(SpeakingJobStatus, name='speaking_job_status'), nullable=False, default=SpeakingJobStatus.queued)
+    audio = Column(LargeBinary)  # Se borra al terminar el job
+    audio_filename = Column(String(255))
+    user_message_id = Column(Integer, ForeignKey("speaking_messages.id"))
+    assistant_message_id = Column(Integer, ForeignKey("speaking_messages.id"))
+    error = Column(Text)
+    error_status = Column(Integer)  # Código HTTP equivalente (429 cuota, 500 resto)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index("idx_speaking_turn_jobs_status", status, id),
+        Index("idx_speaking_turn_jobs_session", session_id, id),
+    )
+
+
+class GrammarCheckCache(Base):
+    """Resultados de check_grammar por (texto normalizado, idioma), ver src/grammar_cache.py"""
+    __tablename__ = "grammar_check_cache"
+    
+    key = Column(String(64), primary_key=True)  # sha256(idioma + texto normalizado)
+    language = Column(String(20), nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index("idx_grammar_check_cache_expires", expires_at),
+    )
@@ -1,19 +1,14 @@
 """
 Servicio de OpenAI para funcionalidades de Speaking
-Usa GPT-4, Whisper (STT) y TTS
+Usa GPT-4, Whisper (STT) y TTS a través de src.providers (OpenAI o fake local)
 """
+import asyncio
 import os
 from pathlib import Path
-from typing import List, Dict
-import openai
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import AsyncIterator, List, Dict
 
-load_dotenv()
-
-# Configurar OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+from src.providers import get_provider, TTS_MODEL, TTS_VOICE
+from src.tts_cache import speech_cache, speech_key
 
 
 # Directorio para guardar audios
@@ -60,19 +55,19 @@ Start the conversation by greeting the student and introducing the topic briefly
 class STTQuotaExceededError(Exception):
     pass
 
+
+def _is_quota_error(msg: str) -> bool:
+    # El SDK devuelve dict con code/type en el mensaje -> detectamos cuota
+    return "insufficient_quota" in msg or "code: 429" in msg or "You exceeded your current quota" in msg
+
+
 def transcribe_audio(audio_file_path: str) -> str:
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            transcript = openai.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en"
-            )
-        return transcript.text
+        audio_path = Path(audio_file_path)
+        return get_provider().transcribe_sync(audio_path.name, audio_path.read_bytes())
     except Exception as e:
-        # El SDK devuelve dict con code/type en el mensaje -> detectamos cuota
         msg = str(e)
-        if "insufficient_quota" in msg or "code: 429" in msg or "You exceeded your current quota" in msg:
+        if _is_quota_error(msg):
             # Lanzamos excepción específica para mapearla a 429
             raise STTQuotaExceededError("OpenAI STT quota exceeded") from e
         print(f"Error transcribing audio: {msg}")
@@ -80,38 +75,118 @@ def transcribe_audio(audio_file_path: str) -> str:
 
 def generate_response(messages: List[Dict[str, str]]) -> str:
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",   # ajusta al que tengas disponible
-            messages=messages,
-            max_tokens=200,
-            temperature=0.7
-        )
-        return resp.choices[0].message.content
+        return get_provider().chat_sync(messages, purpose="reply", max_tokens=200, temperature=0.7)
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        raise
+
+def text_to_speech(text: str) -> str:
+    """URL del audio de un texto; cada (texto, modelo, voz) se sintetiza una sola vez"""
+    try:
+        key = speech_key(text, TTS_MODEL, TTS_VOICE)
+        cached_url = speech_cache.get(key)
+        if cached_url:
+            return cached_url
+
+        audio = get_provider().speech_sync(text)
+        return speech_cache.put(key, audio)
+    except Exception as e:
+        print(f"Error generating speech: {e}")
+        raise
+
+# ==================== VERSIONES ASYNC ====================
+async def transcribe_audio_bytes_async(filename: str, audio_bytes: bytes) -> str:
+    try:
+        return await get_provider().transcribe(filename, audio_bytes)
+    except Exception as e:
+        msg = str(e)
+        if _is_quota_error(msg):
+            raise STTQuotaExceededError("OpenAI STT quota exceeded") from e
+        print(f"Error transcribing audio: {msg}")
+        raise
+
+
+async def generate_response_async(messages: List[Dict[str, str]]) -> str:
+    try:
+        return await get_provider().chat(messages, purpose="reply", max_tokens=200, temperature=0.7)
     except Exception as e:
         print(f"Error generating response: {e}")
         raise
 
-def text_to_speech(text: str, session_id: int, message_id: int) -> str:
+
+async def text_to_speech_async(text: str) -> str:
     try:
-        session_dir = AUDIO_DIR / f"session_{session_id}"
-        session_dir.mkdir(exist_ok=True)
-        audio_filename = f"message_{message_id}.mp3"
-        audio_path = session_dir / audio_filename
-
-        # Streaming a archivo (SDK nuevo)
-        with client.audio.speech.with_streaming_response.create(
-            model="gpt-4o-mini-tts",  # o "tts-1"
-            voice="alloy",
-            input=text
-        ) as resp:
-            resp.stream_to_file(str(audio_path))
-
-        # Si montas estáticos en /speaking:
-        return f"/static/speaking/session_{session_id}/{audio_filename}"
+        key = speech_key(text, TTS_MODEL, TTS_VOICE)
+        cached_url = await asyncio.to_thread(speech_cache.get, key)
+        if cached_url:
+            return cached_url
+
+        audio = await get_provider().speech(text)
+        return await asyncio.to_thread(speech_cache.put, key, audio)
     except Exception as e:
         print(f"Error generating speech: {e}")
         raise
 
+
+async def summarize_conversation_async(previous_summary: str, turns: List[Dict[str, str]]) -> str:
+    """Condensa turnos antiguos en el resumen acumulado de la sesión"""
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    summary = await get_provider().chat(
+        [
+            {"role": "system", "content": (
+                "You maintain a running summary of an English practice conversation between a tutor "
+                "and a student. Merge the new turns into the existing summary. Keep names, facts the "
+                "student shared, topics covered and recurring mistakes. Answer with the summary only, "
+                "in at most 120 words."
+            )},
+            {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        purpose="summary",
+        max_tokens=200,
+        temperature=0.2
+    )
+    return summary.strip()
+
+
+# ==================== STREAMING ====================
+# Tamaño de los trozos de audio que se reenvían al cliente mientras TTS genera
+TTS_STREAM_CHUNK_SIZE = int(os.getenv("TTS_STREAM_CHUNK_SIZE", "16384"))
+
+
+async def stream_response_async(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """Respuesta del asistente token a token"""
+    async for delta in get_provider().stream_chat(messages, max_tokens=200, temperature=0.7):
+        yield delta
+
+
+async def stream_speech_async(text: str) -> AsyncIterator[bytes]:
+    """Audio mp3 de un texto, en trozos a medida que TTS lo produce (o desde la caché)"""
+    key = speech_key(text, TTS_MODEL, TTS_VOICE)
+    cached = await asyncio.to_thread(speech_cache.read, key)
+    if cached is not None:
+        for start in range(0, len(cached), TTS_STREAM_CHUNK_SIZE):
+            yield cached[start:start + TTS_STREAM_CHUNK_SIZE]
+        return
+
+    audio = bytearray()
+    async for chunk in get_provider().stream_speech(text, TTS_STREAM_CHUNK_SIZE):
+        audio.extend(chunk)
+        yield chunk
+    await asyncio.to_thread(speech_cache.put, key, bytes(audio))
+
+
+async def regenerate_speech_async(key: str, text: str) -> str:
+    """Volver a sintetizar un clip expulsado de la caché, con la misma clave (la URL guardada en el mensaje)"""
+    audio = await get_provider().speech(text)
+    return await asyncio.to_thread(speech_cache.put, key, audio)
+
+
+def cache_speech_audio(text: str, audio_bytes: bytes) -> str:
+    """Guardar en la caché el audio ya generado de un mensaje completo (mp3 por frase concatenados)"""
+    key = speech_key(text, TTS_MODEL, TTS_VOICE)
+    return speech_cache.put(key, audio_bytes)
+
+
 def get_conversation_history(messages: List[Dict]) -> List[Dict[str, str]]:
     """
     Formatea el historial de conversación para OpenAI
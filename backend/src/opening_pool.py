@@ -0,0 +1,196 @@
+"""
+Pool de saludos iniciales pre-generados para las sesiones de speaking
+
+El primer mensaje del asistente solo depende de (topic, conversation_type,
+difficulty_level) a través de generate_system_prompt. Para las combinaciones
+populares se guardan en memoria varios saludos ya generados (texto + audio de
+la caché de TTS), así crear una sesión no espera a GPT ni a TTS. Un worker en
+segundo plano los repone. Las combinaciones poco comunes se generan después de
+responder (generate_opening_message) y el cliente las recibe al recargar la sesión.
+"""
+import asyncio
+import os
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+OpeningKey = Tuple[str, str, str]
+
+# Saludos guardados por combinación (se sirven en orden, así no se repite siempre el mismo)
+OPENING_POOL_SIZE = int(os.getenv("OPENING_POOL_SIZE", "3"))
+# Peticiones a partir de las cuales una combinación se considera popular y se mantiene llena
+OPENING_POOL_MIN_REQUESTS = int(os.getenv("OPENING_POOL_MIN_REQUESTS", "2"))
+# Combinaciones máximas con pool (las menos pedidas dejan de reponerse)
+OPENING_POOL_MAX_KEYS = int(os.getenv("OPENING_POOL_MAX_KEYS", "200"))
+# Generaciones en paralelo del worker de reposición
+OPENING_POOL_CONCURRENCY = int(os.getenv("OPENING_POOL_CONCURRENCY", "2"))
+# Combinaciones a precalentar al arrancar: "topic|conversation_type|difficulty_level;..."
+OPENING_POOL_WARM = os.getenv(
+    "OPENING_POOL_WARM",
+    "Travel|casual|intermediate;Food|casual|intermediate;Technology|casual|intermediate"
+)
+
+
+def opening_key(topic: str, conversation_type: str, difficulty_level: str) -> OpeningKey:
+    return (" ".join(topic.split()).lower(), conversation_type, difficulty_level)
+
+
+def _parse_warm(spec: str) -> List[OpeningKey]:
+    keys = []
+    for item in spec.split(";"):
+        parts = [part.strip() for part in item.split("|")]
+        if len(parts) == 3 and all(parts):
+            keys.append(opening_key(*parts))
+    return keys
+
+
+@dataclass(frozen=True)
+class Opening:
+    content: str
+    audio_path: Optional[str]
+
+
+async def generate_opening(topic: str, conversation_type: str, difficulty_level: str) -> Opening:
+    """Saludo + audio para una combinación (GPT y TTS async)"""
+    from src.openai_service import generate_system_prompt, generate_response_async, text_to_speech_async
+
+    system_prompt = generate_system_prompt(topic, conversation_type, difficulty_level)
+    content = await generate_response_async([{"role": "system", "content": system_prompt}])
+    audio_path = None
+    try:
+        audio_path = await text_to_speech_async(content)
+    except Exception as e:
+        print(f"[speaking] TTS failed: {e}")
+    return Opening(content=content, audio_path=audio_path)
+
+
+class OpeningPool:
+    """Saludos listos por combinación + worker de reposición"""
+
+    def __init__(self, size: int = OPENING_POOL_SIZE, min_requests: int = OPENING_POOL_MIN_REQUESTS):
+        self.size = size
+        self.min_requests = min_requests
+        self._lock = threading.Lock()
+        self._openings: Dict[OpeningKey, Deque[Opening]] = {}
+        self._requests: Counter = Counter()
+        self._pending: Set[OpeningKey] = set()
+        self._refill_queue: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- ciclo de vida ----------
+    def start(self, warm: Optional[List[OpeningKey]] = None):
+        if self._tasks:
+            return
+        self._refill_queue = asyncio.Queue()
+        for _ in range(OPENING_POOL_CONCURRENCY):
+            task = asyncio.create_task(self._worker())
+            self._tasks.add(task)
+        for key in (warm if warm is not None else _parse_warm(OPENING_POOL_WARM)):
+            with self._lock:
+                self._requests[key] = max(self._requests[key], self.min_requests)
+            self._schedule(key)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # ---------- API ----------
+    def take(self, topic: str, conversation_type: str, difficulty_level: str) -> Optional[Opening]:
+        """Saludo pre-generado (o None) y programar la reposición si la combinación es popular"""
+        key = opening_key(topic, conversation_type, difficulty_level)
+        with self._lock:
+            self._requests[key] += 1
+            if len(self._requests) > OPENING_POOL_MAX_KEYS * 50:
+                # Temas libres: no acumular contadores sin límite
+                self._requests = Counter(dict(self._requests.most_common(OPENING_POOL_MAX_KEYS * 10)))
+            openings = self._openings.get(key)
+            opening = openings.popleft() if openings else None
+            if opening:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._schedule(key, topic)
+        return opening
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "pooled_keys": len(self._openings),
+                "pooled_openings": sum(len(openings) for openings in self._openings.values()),
+            }
+
+    # ---------- reposición ----------
+    def _is_popular(self, key: OpeningKey) -> bool:
+        if self._requests[key] < self.min_requests:
+            return False
+        return key in self._openings or len(self._openings) < OPENING_POOL_MAX_KEYS
+
+    def _schedule(self, key: OpeningKey, topic: Optional[str] = None):
+        if self._refill_queue is None:
+            return
+        with self._lock:
+            if key in self._pending or not self._is_popular(key):
+                return
+            if len(self._openings.get(key, ())) >= self.size:
+                return
+            self._pending.add(key)
+        self._refill_queue.put_nowait((key, topic or key[0]))
+
+    async def _worker(self):
+        while True:
+            key, topic = await self._refill_queue.get()
+            try:
+                opening = await generate_opening(topic, key[1], key[2])
+                with self._lock:
+                    self._openings.setdefault(key, deque()).append(opening)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[speaking] Opening refill failed for {key}: {e}")
+                await asyncio.sleep(5)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+            self._schedule(key, topic)
+
+
+opening_pool = OpeningPool()
+# Referencias a las generaciones de saludos en segundo plano (fallback)
+_opening_tasks: Set[asyncio.Task] = set()
+
+
+async def generate_opening_message(session_id: int, topic: str, conversation_type: str, difficulty_level: str):
+    """Fallback: generar y guardar el primer mensaje después de crear la sesión"""
+    from src import models
+    from src.database import AsyncSessionLocal
+
+    try:
+        opening = await generate_opening(topic, conversation_type, difficulty_level)
+        async with AsyncSessionLocal() as db:
+            db.add(models.SpeakingMessage(
+                session_id=session_id,
+                role="assistant",
+                content=opening.content,
+                audio_path=opening.audio_path
+            ))
+            await db.commit()
+    except Exception as e:
+        # registramos y seguimos; la sesión ya existe
+        print(f"[speaking] Initial assistant message failed: {e}")
+
+
+def schedule_opening_message(session_id: int, topic: str, conversation_type: str, difficulty_level: str):
+    task = asyncio.get_running_loop().create_task(
+        generate_opening_message(session_id, topic, conversation_type, difficulty_level)
+    )
+    _opening_tasks.add(task)
+    task.add_done_callback(_opening_tasks.discard)
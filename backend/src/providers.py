@@ -0,0 +1,327 @@
+"""
+Proveedores de STT / LLM / TTS para speaking y corrección gramatical
+
+openai_service y grammar_checker no llaman a OpenAI directamente sino a
+get_provider(). Con SPEAKING_PROVIDER=fake se usa FakeProvider: respuestas
+deterministas, sin red ni coste, con latencia, tasa de errores e inyección de
+429 configurables (pruebas de carga y bench_speaking_pipeline.py).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+STT_MODEL = os.getenv("OPENAI_STT_MODEL", "whisper-1")
+# Modelo y voz de TTS (forman parte de la clave de la caché de audios)
+TTS_MODEL = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts")
+TTS_VOICE = os.getenv("OPENAI_TTS_VOICE", "alloy")
+
+
+class ProviderError(Exception):
+    pass
+
+
+class ProviderRateLimitError(ProviderError):
+    pass
+
+
+class SpeakingProvider:
+    """Interfaz común; purpose identifica la llamada de chat (reply, grammar, summary)"""
+    name = "base"
+
+    async def transcribe(self, filename: str, audio_bytes: bytes) -> str:
+        raise NotImplementedError
+
+    async def chat(self, messages: List[Dict[str, str]], *, purpose: str = "reply",
+                   max_tokens: int = 200, temperature: float = 0.7) -> str:
+        raise NotImplementedError
+
+    def stream_chat(self, messages: List[Dict[str, str]], *, max_tokens: int = 200,
+                    temperature: float = 0.7) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def speech(self, text: str) -> bytes:
+        raise NotImplementedError
+
+    def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    # Versiones síncronas (crud y endpoints sync)
+    def transcribe_sync(self, filename: str, audio_bytes: bytes) -> str:
+        raise NotImplementedError
+
+    def chat_sync(self, messages: List[Dict[str, str]], *, purpose: str = "reply",
+                  max_tokens: int = 200, temperature: float = 0.7) -> str:
+        raise NotImplementedError
+
+    def speech_sync(self, text: str) -> bytes:
+        raise NotImplementedError
+
+
+# ==================== OPENAI ====================
+class OpenAIProvider(SpeakingProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        from openai import OpenAI, AsyncOpenAI
+        api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY", "")
+        self.client = OpenAI(api_key=api_key)
+        self.async_client = AsyncOpenAI(api_key=api_key)
+
+    async def transcribe(self, filename: str, audio_bytes: bytes) -> str:
+        transcript = await self.async_client.audio.transcriptions.create(
+            model=STT_MODEL,
+            file=(filename, audio_bytes),
+            language="en"
+        )
+        return transcript.text
+
+    async def chat(self, messages, *, purpose="reply", max_tokens=200, temperature=0.7) -> str:
+        resp = await self.async_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return resp.choices[0].message.content
+
+    async def stream_chat(self, messages, *, max_tokens=200, temperature=0.7) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def speech(self, text: str) -> bytes:
+        async with self.async_client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text
+        ) as resp:
+            return await resp.read()
+
+    async def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        async with self.async_client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            response_format="mp3"
+        ) as resp:
+            async for chunk in resp.iter_bytes(chunk_size):
+                yield chunk
+
+    def transcribe_sync(self, filename: str, audio_bytes: bytes) -> str:
+        transcript = self.client.audio.transcriptions.create(
+            model=STT_MODEL,
+            file=(filename, audio_bytes),
+            language="en"
+        )
+        return transcript.text
+
+    def chat_sync(self, messages, *, purpose="reply", max_tokens=200, temperature=0.7) -> str:
+        resp = self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return resp.choices[0].message.content
+
+    def speech_sync(self, text: str) -> bytes:
+        with self.client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text
+        ) as resp:
+            return resp.read()
+
+
+# ==================== FAKE ====================
+FAKE_STUDENT_LINES = [
+    "I goes to the park every weekend with my friends.",
+    "Yesterday I have visited my grandmother in the countryside.",
+    "I think learning English is very useful for my job.",
+    "My favourite food is pizza because it is delicious.",
+    "She don't like travelling by plane.",
+    "We was watching a movie when the lights went out.",
+    "I would like to improve my speaking skills this year.",
+    "In my free time I read books and play the guitar.",
+]
+
+FAKE_REPLIES = [
+    "That sounds great! What do you enjoy most about it?",
+    "Interesting. Could you tell me a bit more about that? Why is it important to you?",
+    "I see. How often do you do that? Do you usually go alone?",
+    "Nice! What was the best part of that experience?",
+]
+
+
+class FakeProvider(SpeakingProvider):
+    """
+    Backend local determinista (misma semilla -> mismas respuestas y mismos fallos).
+    Latencias en ms con jitter relativo; error_rate y rate_limit_rate por llamada.
+    """
+    name = "fake"
+
+    def __init__(
+        self,
+        seed: int = 42,
+        stt_ms: float = 400,
+        llm_ms: float = 800,
+        tts_ms: float = 600,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        first_token_ratio: float = 0.3
+    ):
+        self.stt_ms = stt_ms
+        self.llm_ms = llm_ms
+        self.tts_ms = tts_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.first_token_ratio = first_token_ratio
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeProvider":
+        return cls(
+            seed=int(os.getenv("FAKE_PROVIDER_SEED", "42")),
+            stt_ms=float(os.getenv("FAKE_STT_LATENCY_MS", "400")),
+            llm_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "800")),
+            tts_ms=float(os.getenv("FAKE_TTS_LATENCY_MS", "600")),
+            jitter=float(os.getenv("FAKE_LATENCY_JITTER", "0.2")),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_RATE_LIMIT_RATE", "0")),
+        )
+
+    # ---------- comportamiento ----------
+    def _draw(self, base_ms: float, stage: str) -> float:
+        """Latencia (s) de la llamada; lanza el error inyectado si toca"""
+        with self._lock:
+            roll = self._rng.random()
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        if roll < self.rate_limit_rate:
+            # Mismo texto que el SDK de OpenAI (openai_service lo detecta como 429)
+            raise ProviderRateLimitError(
+                f"Error code: 429 - {{'error': {{'message': 'Rate limit reached (fake {stage})', "
+                f"'type': 'requests', 'code': 'rate_limit_exceeded'}}}}"
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ProviderError(f"Fake {stage} error")
+        return max(base_ms * factor, 0) / 1000
+
+    @staticmethod
+    def _pick(options: List[str], seed_text: str) -> str:
+        digest = hashlib.sha256(seed_text.encode("utf-8")).digest()
+        return options[digest[0] % len(options)]
+
+    def _answer(self, messages: List[Dict[str, str]], purpose: str) -> str:
+        last = messages[-1]["content"] if messages else ""
+        if purpose == "grammar":
+            match = re.search(r'Text to analyze: "(.*?)"\n', last, re.DOTALL)
+            text = match.group(1) if match else last
+            return json.dumps({"has_errors": False, "corrected": text, "errors": []})
+        if purpose == "grammar_batch":
+            match = re.search(r"Texts: (\[.*?\])\n", last, re.DOTALL)
+            items = json.loads(match.group(1)) if match else []
+            return json.dumps([
+                {"id": item["id"], "has_errors": False, "corrected": item["text"], "errors": []}
+                for item in items
+            ])
+        if purpose == "summary":
+            return "The student and the tutor talked about " + last[:80].replace("\n", " ")
+        return self._pick(FAKE_REPLIES, last)
+
+    def _audio(self, text: str) -> bytes:
+        # ~24 kbps: unos 60 ms de audio por carácter
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        size = max(len(text), 1) * 180
+        return b"ID3" + (digest * (size // len(digest) + 1))[:size]
+
+    # ---------- async ----------
+    async def transcribe(self, filename, audio_bytes) -> str:
+        await asyncio.sleep(self._draw(self.stt_ms, "stt"))
+        return self._pick(FAKE_STUDENT_LINES, hashlib.sha256(audio_bytes).hexdigest())
+
+    async def chat(self, messages, *, purpose="reply", max_tokens=200, temperature=0.7) -> str:
+        await asyncio.sleep(self._draw(self.llm_ms, purpose))
+        return self._answer(messages, purpose)
+
+    async def stream_chat(self, messages, *, max_tokens=200, temperature=0.7) -> AsyncIterator[str]:
+        total = self._draw(self.llm_ms, "reply")
+        words = self._answer(messages, "reply").split(" ")
+        await asyncio.sleep(total * self.first_token_ratio)
+        step = total * (1 - self.first_token_ratio) / max(len(words), 1)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(step)
+            yield word if i == len(words) - 1 else word + " "
+
+    async def speech(self, text: str) -> bytes:
+        await asyncio.sleep(self._draw(self.tts_ms, "tts"))
+        return self._audio(text)
+
+    async def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        total = self._draw(self.tts_ms, "tts")
+        audio = self._audio(text)
+        chunks = [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+        # El primer trozo llega pronto; el resto se reparte en la latencia total
+        await asyncio.sleep(total * self.first_token_ratio)
+        step = total * (1 - self.first_token_ratio) / max(len(chunks), 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(step)
+            yield chunk
+
+    # ---------- sync ----------
+    def transcribe_sync(self, filename, audio_bytes) -> str:
+        time.sleep(self._draw(self.stt_ms, "stt"))
+        return self._pick(FAKE_STUDENT_LINES, hashlib.sha256(audio_bytes).hexdigest())
+
+    def chat_sync(self, messages, *, purpose="reply", max_tokens=200, temperature=0.7) -> str:
+        time.sleep(self._draw(self.llm_ms, purpose))
+        return self._answer(messages, purpose)
+
+    def speech_sync(self, text: str) -> bytes:
+        time.sleep(self._draw(self.tts_ms, "tts"))
+        return self._audio(text)
+
+
+# ==================== SELECCIÓN ====================
+SPEAKING_PROVIDER = os.getenv("SPEAKING_PROVIDER", "openai")
+
+_provider: Optional[SpeakingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> SpeakingProvider:
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = FakeProvider.from_env() if SPEAKING_PROVIDER == "fake" else OpenAIProvider()
+    return _provider
+
+
+def set_provider(provider: SpeakingProvider):
+    """Sustituir el proveedor (benchmarks / pruebas)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
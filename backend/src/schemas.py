@@ -66,6 +66,13 @@ class Course(CourseBase):
         from_attributes = True
 
 
+class CoursePage(BaseModel):
+    """Página del catálogo de cursos (paginación por cursor)"""
+    items: List[Course]
+    next_cursor: Optional[str] = None  # None si es la última página
+    total_estimate: int  # Aproximado, no un COUNT exacto
+
+
 # Unit Schemas
 class UnitBase(BaseModel):
     title: str
@@ -165,6 +172,26 @@ class Enrollment(BaseModel):
         from_attributes = True
 
 
+# Roster de un curso (vista del profesor)
+class ProgressSummary(BaseModel):
+    completed_units: int
+    total_units: int
+    percent: int
+
+
+class RosterStudent(BaseModel):
+    student: User
+    enrolled_at: datetime
+    progress: ProgressSummary
+
+
+class CourseRosterPage(BaseModel):
+    """Página del roster de un curso (paginación por cursor)"""
+    items: List[RosterStudent]
+    next_cursor: Optional[str] = None
+    total: int
+
+
 # Schemas completos con relaciones
 class UnitWithDetails(Unit):
     quizzes: List[Quiz] = []
@@ -260,6 +287,7 @@ class MessageResponse(BaseModel):
     receiver_id: int
     content: str
     corrected_content: Optional[str] = None
+    correction_status: str = "done"  # pending mientras se corrige en segundo plano
     is_read: bool
     created_at: datetime
     
@@ -281,6 +309,12 @@ class ConversationPreview(BaseModel):
     unread_count: int
 
 
+class ConversationPage(BaseModel):
+    """Página del inbox, ordenada por última actividad (paginación por cursor)"""
+    items: List[ConversationPreview]
+    next_cursor: Optional[str] = None
+
+
 
 # ==================== SPEAKING PRACTICE ====================
 
@@ -329,6 +363,31 @@ class SpeakingMessageResponse(BaseModel):
         from_attributes = True  
 
 
+class SpeakingTurnResult(BaseModel):
+    user_message: SpeakingMessageResponse
+    assistant_message: SpeakingMessageResponse
+
+
+class SpeakingJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class SpeakingTurnJobResponse(BaseModel):
+    """Estado de un turno encolado; result solo cuando status == done"""
+    id: int
+    session_id: int
+    status: SpeakingJobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = None
+    result: Optional[SpeakingTurnResult] = None
+
+
 class SpeakingSessionWithMessages(SpeakingSessionResponse):
     messages: List[SpeakingMessageResponse] = []
     
@@ -0,0 +1,250 @@
+"""
+Cola de turnos de speaking (modo job)
+
+POST /speaking/sessions/{id}/message?mode=job guarda el audio en speaking_turn_jobs
+y responde 202 al momento. Un pool acotado de workers por proceso toma los jobs:
+- en orden dentro de cada sesión (nunca dos turnos de la misma sesión a la vez)
+- con un UPDATE condicional para que dos workers/nodos no tomen el mismo job
+El cliente consulta GET /speaking/jobs/{id} (con ?wait= para esperar el resultado).
+Cada turno tiene un tiempo máximo (SPEAKING_JOB_TIMEOUT_SECONDS); los jobs que
+siguen 'running' mucho después (proceso caído, UPDATE final fallido) se
+reencolan al arrancar y cada SPEAKING_JOB_SWEEP_SECONDS.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.orm import aliased
+
+from src import models
+from src import async_crud
+from src.database import AsyncSessionLocal
+from src.metrics import TurnTimings
+
+Status = models.SpeakingJobStatus
+
+# Workers por proceso = turnos (STT+GPT+TTS) simultáneos contra OpenAI por nodo
+SPEAKING_JOB_WORKERS = int(os.getenv("SPEAKING_JOB_WORKERS", "4"))
+# Jobs en cola por encima de los cuales se rechazan nuevos (503)
+SPEAKING_JOB_MAX_QUEUED = int(os.getenv("SPEAKING_JOB_MAX_QUEUED", "500"))
+# Sondeo de la tabla cuando no hay avisos locales (jobs encolados por otros nodos)
+SPEAKING_JOB_POLL_SECONDS = float(os.getenv("SPEAKING_JOB_POLL_SECONDS", "1.0"))
+# Tiempo máximo de un turno en un worker; pasado este tiempo el job falla (504)
+SPEAKING_JOB_TIMEOUT_SECONDS = float(os.getenv("SPEAKING_JOB_TIMEOUT_SECONDS", "120"))
+# Jobs 'running' más antiguos que esto se consideran huérfanos (proceso caído) y se reencolan;
+# mayor que SPEAKING_JOB_TIMEOUT_SECONDS para no tocar nunca un turno en curso
+SPEAKING_JOB_STALE_SECONDS = int(os.getenv("SPEAKING_JOB_STALE_SECONDS", "300"))
+# Cada cuánto se buscan jobs huérfanos mientras el proceso está en marcha
+SPEAKING_JOB_SWEEP_SECONDS = float(os.getenv("SPEAKING_JOB_SWEEP_SECONDS", "60"))
+
+
+class SpeakingQueueFullError(Exception):
+    pass
+
+
+def _next_job_statement():
+    """Job más antiguo de una sesión sin otro job en curso ni anterior en cola"""
+    job = models.SpeakingTurnJob
+    other = aliased(models.SpeakingTurnJob)
+    blocked = select(other.id).where(
+        other.session_id == job.session_id,
+        or_(
+            other.status == Status.running,
+            and_(other.status == Status.queued, other.id < job.id)
+        )
+    ).exists()
+    return select(job.id).where(job.status == Status.queued, ~blocked).order_by(job.id).limit(1)
+
+
+class SpeakingTurnQueue:
+    """Pool de workers asyncio sobre la tabla speaking_turn_jobs"""
+
+    def __init__(self, workers: int = SPEAKING_JOB_WORKERS, max_queued: int = SPEAKING_JOB_MAX_QUEUED):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[int, asyncio.Event] = {}
+
+    # ---------- ciclo de vida ----------
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        await self.requeue_stale()
+        for _ in range(self.workers):
+            task = asyncio.create_task(self._worker())
+            self._tasks.add(task)
+        self._tasks.add(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def requeue_stale(self) -> int:
+        """Devolver a la cola los jobs que quedaron 'running' en un proceso caído"""
+        cutoff = datetime.utcnow() - timedelta(seconds=SPEAKING_JOB_STALE_SECONDS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(models.SpeakingTurnJob)
+                .where(
+                    models.SpeakingTurnJob.status == Status.running,
+                    models.SpeakingTurnJob.started_at < cutoff
+                )
+                .values(status=Status.queued, started_at=None)
+            )
+            await db.commit()
+            return result.rowcount or 0
+
+    # ---------- API ----------
+    async def enqueue(self, db, session: models.SpeakingSession, audio_filename: str, audio_bytes: bytes) -> models.SpeakingTurnJob:
+        queued = (await db.execute(
+            select(func.count(models.SpeakingTurnJob.id)).where(models.SpeakingTurnJob.status == Status.queued)
+        )).scalar()
+        if queued >= self.max_queued:
+            raise SpeakingQueueFullError("Too many speaking turns queued")
+
+        job = models.SpeakingTurnJob(
+            session_id=session.id,
+            student_id=session.student_id,
+            status=Status.queued,
+            audio=audio_bytes,
+            audio_filename=audio_filename,
+            created_at=datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def wait(self, job_id: int, timeout: float):
+        """Esperar (como máximo timeout) a que el job termine; aviso local o sondeo de la tabla"""
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        deadline = asyncio.get_running_loop().time() + timeout
+        try:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    status = (await db.execute(
+                        select(models.SpeakingTurnJob.status).where(models.SpeakingTurnJob.id == job_id)
+                    )).scalar()
+                if status in (None, Status.done, Status.failed):
+                    return
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, SPEAKING_JOB_POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not event.is_set():
+                self._finished.pop(job_id, None)
+
+    # ---------- workers ----------
+    async def _claim(self) -> Optional[int]:
+        async with AsyncSessionLocal() as db:
+            for _ in range(3):
+                job_id = (await db.execute(_next_job_statement())).scalar()
+                if job_id is None:
+                    return None
+                # UPDATE condicional: si otro worker lo tomó antes, rowcount == 0 y se reintenta
+                result = await db.execute(
+                    update(models.SpeakingTurnJob)
+                    .where(models.SpeakingTurnJob.id == job_id, models.SpeakingTurnJob.status == Status.queued)
+                    .values(status=Status.running, started_at=datetime.utcnow())
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return job_id
+        return None
+
+    async def _worker(self):
+        while True:
+            try:
+                job_id = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[speaking-jobs] Claim failed: {e}")
+                job_id = None
+
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), SPEAKING_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # p. ej. falló el UPDATE final: el job sigue 'running' hasta el próximo barrido
+                print(f"[speaking-jobs] Job {job_id} could not be finished: {e}")
+            # Al terminar un turno puede quedar libre el siguiente de la misma sesión
+            self._wakeup.set()
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(SPEAKING_JOB_SWEEP_SECONDS)
+            try:
+                requeued = await self.requeue_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[speaking-jobs] Stale job sweep failed: {e}")
+                continue
+            if requeued:
+                print(f"[speaking-jobs] Requeued {requeued} stale jobs")
+                self._wakeup.set()
+
+    async def _process(self, job_id: int):
+        from src.openai_service import STTQuotaExceededError
+
+        values = {"audio": None, "finished_at": None}
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(models.SpeakingTurnJob, job_id)
+                session = await async_crud.get_speaking_session(db, job.session_id)
+                if session is None or not session.is_active:
+                    values.update(status=Status.failed, error="Session is not active", error_status=400)
+                else:
+                    timings = TurnTimings()
+                    if job.started_at and job.created_at:
+                        timings.record("queue", "none", max((job.started_at - job.created_at).total_seconds(), 0))
+                    result = await asyncio.wait_for(
+                        async_crud.add_speaking_message(db, session, job.audio_filename, job.audio, timings=timings),
+                        SPEAKING_JOB_TIMEOUT_SECONDS
+                    )
+                    values.update(
+                        status=Status.done,
+                        user_message_id=result["user_message"].id,
+                        assistant_message_id=result["assistant_message"].id
+                    )
+        except STTQuotaExceededError:
+            values.update(status=Status.failed, error="STT quota exceeded. Please check your OpenAI billing.", error_status=429)
+        except asyncio.TimeoutError:
+            values.update(status=Status.failed, error="Speaking turn timed out", error_status=504)
+        except Exception as e:
+            values.update(status=Status.failed, error=f"Error processing audio: {str(e)}", error_status=500)
+
+        values["finished_at"] = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.SpeakingTurnJob).where(models.SpeakingTurnJob.id == job_id).values(**values)
+            )
+            await db.commit()
+
+        event = self._finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+
+speaking_turn_queue = SpeakingTurnQueue()
@@ -0,0 +1,213 @@
+"""
+Turno de speaking en streaming (Server-Sent Events)
+
+Orden de eventos para el cliente:
+- transcript: texto del estudiante en cuanto Whisper responde
+- token: trozos de la respuesta del asistente a medida que GPT los genera
+- audio / audio_end: mp3 por frase; TTS arranca con la primera frase completa,
+  sin esperar al resto de la respuesta
+- grammar: corrección del estudiante (en paralelo, suele llegar tarde)
+- done: ambos mensajes ya guardados (mismo formato que POST .../message)
+- error: si algo falla después de empezar el stream
+"""
+import asyncio
+import base64
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from src import models
+from src import schemas
+from src.database import AsyncSessionLocal
+from src.conversation_context import load_context, record_turn, schedule_fold
+from src.metrics import TurnTimings, error_outcome
+
+# Fin de frase: . ! ? seguido de espacio
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_DONE = object()
+
+
+def split_sentences(buffer: str) -> Tuple[List[str], str]:
+    """Separar las frases completas del texto pendiente"""
+    parts = SENTENCE_END.split(buffer)
+    complete = [part.strip() for part in parts[:-1] if part.strip()]
+    return complete, parts[-1]
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_speaking_turn(
+    session: models.SpeakingSession,
+    audio_filename: str,
+    audio_bytes: bytes,
+    timings: Optional[TurnTimings] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Genera (evento, datos) para un turno; guarda ambos mensajes al terminar.
+    Además de las etapas de siempre mide reply_first_token y first_audio (desde el inicio del turno).
+    """
+    timings = timings or TurnTimings()
+    try:
+        async for item in _stream_turn(session, audio_filename, audio_bytes, timings):
+            yield item
+    except BaseException as e:
+        timings.finish(error_outcome(e))
+        raise
+    timings.finish()
+
+
+async def _stream_turn(
+    session: models.SpeakingSession,
+    audio_filename: str,
+    audio_bytes: bytes,
+    timings: TurnTimings
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    from src.openai_service import (
+        transcribe_audio_bytes_async,
+        stream_response_async,
+        stream_speech_async,
+        cache_speech_audio,
+    )
+    from src.grammar_checker import check_grammar_async
+    from src.providers import CHAT_MODEL, STT_MODEL, TTS_MODEL
+
+    session_id = session.id
+
+    # 1. Transcripción
+    with timings.stage("stt", STT_MODEL):
+        user_text = await transcribe_audio_bytes_async(audio_filename, audio_bytes)
+    yield "transcript", {"text": user_text}
+
+    with timings.stage("context", "db"):
+        async with AsyncSessionLocal() as db:
+            context = await load_context(db, session)
+    conversation_history = context.build_messages(user_text)
+
+    events: asyncio.Queue = asyncio.Queue()
+    sentences: asyncio.Queue = asyncio.Queue()
+
+    async def produce_tokens() -> str:
+        parts = []
+        pending = ""
+        start = time.perf_counter()
+        try:
+            with timings.stage("reply", CHAT_MODEL):
+                async for delta in stream_response_async(conversation_history):
+                    if not parts:
+                        timings.record("reply_first_token", CHAT_MODEL, time.perf_counter() - start)
+                    parts.append(delta)
+                    await events.put(("token", {"delta": delta}))
+                    complete, pending = split_sentences(pending + delta)
+                    for sentence in complete:
+                        await sentences.put(sentence)
+            if pending.strip():
+                await sentences.put(pending.strip())
+            return "".join(parts)
+        finally:
+            await sentences.put(None)
+            await events.put(_DONE)
+
+    async def produce_audio() -> bytes:
+        audio = bytearray()
+        segment = 0
+        tts_failed = False
+        tts_seconds = 0.0
+        try:
+            while (sentence := await sentences.get()) is not None:
+                if tts_failed:
+                    continue
+                start = time.perf_counter()
+                try:
+                    async for chunk in stream_speech_async(sentence):
+                        if not audio:
+                            timings.record("first_audio", TTS_MODEL, time.perf_counter() - timings.started)
+                        audio.extend(chunk)
+                        await events.put(("audio", {
+                            "segment": segment,
+                            "data": base64.b64encode(chunk).decode("ascii")
+                        }))
+                    await events.put(("audio_end", {"segment": segment}))
+                    segment += 1
+                except Exception as e:
+                    # Sin audio el turno sigue siendo válido (igual que en create_speaking_session)
+                    print(f"[speaking] TTS failed: {e}")
+                    timings.record("tts", TTS_MODEL, tts_seconds + time.perf_counter() - start, error_outcome(e))
+                    tts_failed = True
+                tts_seconds += time.perf_counter() - start
+            if not tts_failed:
+                # Suma de la síntesis de todas las frases
+                timings.record("tts", TTS_MODEL, tts_seconds)
+            return bytes(audio)
+        finally:
+            await events.put(_DONE)
+
+    async def produce_grammar() -> dict:
+        try:
+            result = await timings.measure("grammar", CHAT_MODEL, check_grammar_async(user_text))
+            await events.put(("grammar", {
+                "corrected": result.get("corrected", user_text),
+                "has_errors": result.get("has_errors", False),
+                "errors": result.get("errors", [])
+            }))
+            return result
+        finally:
+            await events.put(_DONE)
+
+    tasks = [
+        asyncio.create_task(produce_tokens()),
+        asyncio.create_task(produce_audio()),
+        asyncio.create_task(produce_grammar()),
+    ]
+    try:
+        # 2. Reenviar tokens / audio / gramática según llegan
+        remaining = len(tasks)
+        while remaining:
+            item = await events.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+
+        assistant_text, assistant_audio, grammar_result = await asyncio.gather(*tasks)
+    finally:
+        # Cliente desconectado o error: no dejar llamadas colgando
+        for task in tasks:
+            task.cancel()
+
+    # 3. Guardar ambos mensajes
+    with timings.stage("db_commit", "db"):
+        async with AsyncSessionLocal() as db:
+            user_message = models.SpeakingMessage(
+                session_id=session_id,
+                role="user",
+                content=user_text,
+                corrected_content=grammar_result["corrected"] if grammar_result["has_errors"] else None,
+                audio_path=None,
+                stage_timings=timings.as_dict()
+            )
+            db.add(user_message)
+            await db.flush()
+            assistant_message = models.SpeakingMessage(
+                session_id=session_id,
+                role="assistant",
+                content=assistant_text,
+                corrected_content=None
+            )
+            db.add(assistant_message)
+            await db.flush()
+            if assistant_audio:
+                assistant_message.audio_path = await asyncio.to_thread(
+                    cache_speech_audio, assistant_text, assistant_audio
+                )
+            await db.commit()
+    record_turn(session_id, user_message, assistant_message)
+    schedule_fold(session_id)
+
+    yield "done", {
+        "user_message": schemas.SpeakingMessageResponse.model_validate(user_message).model_dump(mode="json"),
+        "assistant_message": schemas.SpeakingMessageResponse.model_validate(assistant_message).model_dump(mode="json")
+    }
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Verifica la invalidación por versión de la caché de contenido y la comparación
+de ETags de If-None-Match.
+
+No necesita base de datos. Ejecutar desde backend/:  python -m src.test_content_cache  (o con pytest)
+"""
+from src.content_cache import ContentCache, etag_matches, make_etag
+
+
+def test_bump_during_read_is_not_cached():
+    cache = ContentCache()
+    snapshot = cache.snapshot()
+    # El curso cambia mientras se leía de la BD: la lectura pudo ver datos viejos
+    cache.bump(1)
+    entry = cache.put(("course", 1), 1, b"old", snapshot)
+    assert entry.body == b"old"
+    assert cache.get(("course", 1)) is None
+
+    # Una lectura que empieza después del cambio sí se cachea
+    cache.put(("course", 1), 1, b"new", cache.snapshot())
+    assert cache.get(("course", 1)).body == b"new"
+
+
+def test_get_after_bump_returns_none():
+    cache = ContentCache()
+    cache.put(("course", 1), 1, b"body", cache.snapshot())
+    cache.put(("course", 2), 2, b"other", cache.snapshot())
+    cache.bump(1)
+    assert cache.get(("course", 1)) is None
+    assert cache.get(("course", 2)).body == b"other"
+
+
+def test_etag_matches_weak_and_wildcard():
+    etag = make_etag(b"body")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+if __name__ == "__main__":
+    test_bump_during_read_is_not_cached()
+    test_get_after_bump_returns_none()
+    test_etag_matches_weak_and_wildcard()
+    print("✅ Caché de contenido invalidada por versión y ETags comparados correctamente")
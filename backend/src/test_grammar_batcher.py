@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Verifica que cada texto enviado al batcher recibe su propio resultado aunque la
+respuesta del lote no se pueda leer o venga incompleta, y que un error del
+proveedor llega a todos sin reintentos texto a texto.
+
+Usa un FakeProvider con la respuesta del lote alterada; no llama a OpenAI.
+Ejecutar desde backend/:  python -m src.test_grammar_batcher  (o con pytest)
+"""
+import json
+from collections import Counter
+
+from src import providers
+from src.grammar_batcher import GrammarBatcher
+from src.providers import FakeProvider, ProviderError
+
+TEXTS = ["I has a cat.", "She go home.", "We was happy.", "They is late."]
+
+
+class BrokenBatchProvider(FakeProvider):
+    """FakeProvider cuya respuesta de lote es `batch_answer` (o lanza ProviderError si es None)"""
+
+    def __init__(self, batch_answer):
+        super().__init__(llm_ms=0, jitter=0)
+        self.batch_answer = batch_answer
+        self.calls = Counter()
+
+    def chat_sync(self, messages, *, purpose="reply", max_tokens=200, temperature=0.7) -> str:
+        self.calls[purpose] += 1
+        if purpose != "grammar_batch":
+            return super().chat_sync(messages, purpose=purpose, max_tokens=max_tokens, temperature=temperature)
+        if self.batch_answer is None:
+            raise ProviderError("Fake grammar_batch error")
+        return self.batch_answer
+
+
+def _check_all(provider):
+    """Enviar TEXTS en un solo lote; devuelve (resultado o excepción por texto)"""
+    previous = providers._provider
+    providers.set_provider(provider)
+    try:
+        batcher = GrammarBatcher(window_ms=200, max_size=len(TEXTS), workers=2)
+        futures = [batcher.submit(text) for text in TEXTS]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result(timeout=5))
+            except ProviderError as e:
+                outcomes.append(e)
+        return outcomes
+    finally:
+        providers.set_provider(previous)
+
+
+def test_unreadable_batch_falls_back_per_item():
+    provider = BrokenBatchProvider("Sorry, I can't answer with JSON [")
+    results = _check_all(provider)
+    assert [result['corrected'] for result in results] == TEXTS
+    assert provider.calls == {"grammar_batch": 1, "grammar": len(TEXTS)}
+
+
+def test_incomplete_batch_retries_only_missing_items():
+    answer = json.dumps([
+        {"id": 0, "has_errors": True, "corrected": "I have a cat.",
+         "errors": [{"original": "has", "correction": "have", "explanation": "Subject-verb agreement"}]},
+        {"id": 2, "has_errors": False},  # sin 'corrected': se corrige aparte
+    ])
+    provider = BrokenBatchProvider(answer)
+    results = _check_all(provider)
+    assert results[0]['corrected'] == "I have a cat." and results[0]['has_errors'] is True
+    assert [result['corrected'] for result in results[1:]] == TEXTS[1:]
+    assert provider.calls == {"grammar_batch": 1, "grammar": len(TEXTS) - 1}
+
+
+def test_provider_error_reaches_every_caller_without_retries():
+    provider = BrokenBatchProvider(None)
+    results = _check_all(provider)
+    assert all(isinstance(result, ProviderError) for result in results)
+    assert provider.calls == {"grammar_batch": 1}
+
+
+if __name__ == "__main__":
+    test_unreadable_batch_falls_back_per_item()
+    test_incomplete_batch_retries_only_missing_items()
+    test_provider_error_reaches_every_caller_without_retries()
+    print("✅ Cada texto del lote recibe su resultado (o el error) sin llamadas de más")
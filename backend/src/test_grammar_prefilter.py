@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Verifica el filtro local de gramática: los textos triviales y las frases hechas
+no llegan a GPT y cualquier otra frase (aunque use palabras conocidas) sí.
+
+No llama a OpenAI. Ejecutar desde backend/:  python -m src.test_grammar_prefilter  (o con pytest)
+"""
+from src.grammar_prefilter import GrammarPrefilter
+
+CLEARED = {
+    "": "trivial",
+    "😀👍": "trivial",
+    "12:30": "trivial",
+    "https://example.com/lesson": "trivial",
+    "Hi!! 😊": "phrasebook",
+    "thank you so much": "phrasebook",
+    "I'm fine, thanks!": "phrasebook",
+    "See you tomorrow 👋": "phrasebook",
+}
+
+ESCALATED = [
+    "i'm fine",
+    "i like pizza",
+    "He go to school.",
+    "She don't like it.",
+    "We was happy.",
+    "I am agree.",
+    "I have a apple.",
+    "I didn't went.",
+    "She can sings.",
+    "I go there yesterday.",
+    "This is more better.",
+    "Where is teh bus?",
+    "im tired",
+    "I think that learning English is really useful for my job.",
+    # Solo palabras conocidas, pero con errores
+    "He play football.",
+    "She speak English.",
+    "They plays soccer.",
+    "She is teacher.",
+    "I am boy.",
+    "Where you live?",
+    "Me like it.",
+    "I love she.",
+    "He is more tall.",
+]
+
+
+def test_trivial_and_correct_texts_skip_gpt():
+    prefilter = GrammarPrefilter()
+    decisions = {text: prefilter.classify(text) for text in CLEARED}
+    assert decisions == CLEARED
+
+
+def test_common_mistakes_go_to_gpt():
+    prefilter = GrammarPrefilter()
+    cleared = [text for text in ESCALATED if prefilter.classify(text) is not None]
+    assert cleared == [], f"Textos con errores dados por correctos: {cleared}"
+
+
+if __name__ == "__main__":
+    test_trivial_and_correct_texts_skip_gpt()
+    test_common_mistakes_go_to_gpt()
+    print("✅ El filtro local solo deja pasar textos triviales y frases hechas")
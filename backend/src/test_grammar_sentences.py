@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Verifica la división en frases de check_grammar y la unión de los resultados
+por frase en la forma {corrected, has_errors, errors}.
+
+No llama a OpenAI. Ejecutar desde backend/:  python -m src.test_grammar_sentences  (o con pytest)
+"""
+from src.grammar_checker import merge_sentence_results, split_sentences
+
+
+def _sentences(text):
+    return [text[start:end] for start, end in split_sentences(text)]
+
+
+def test_split_keeps_abbreviations_together():
+    text = "Hello! I met Mr. Smith at 9 a.m. yesterday.\n\nHe lives in the U.S. now. Do you know him?"
+    assert _sentences(text) == [
+        "Hello!",
+        "I met Mr. Smith at 9 a.m. yesterday.",
+        "He lives in the U.S. now.",
+        "Do you know him?",
+    ]
+    assert _sentences("  no punctuation at all  ") == ["no punctuation at all"]
+
+
+def test_merge_rebuilds_text_and_errors():
+    text = "I go there yesterday.  It was fun.\nWe was happy."
+    spans = split_sentences(text)
+    results = [
+        {'corrected': "I went there yesterday.", 'has_errors': True, 'method': 'gpt-4',
+         'errors': [{'original': "go", 'correction': "went", 'explanation': "Past tense"}]},
+        {'corrected': "It was fun!", 'has_errors': False, 'errors': [], 'method': 'local-phrasebook'},
+        {'corrected': "We were happy.", 'has_errors': True, 'method': 'languagetool',
+         'matches': [{'offset': 3, 'length': 3, 'replacements': [{'value': "were"}]}]},
+    ]
+    merged = merge_sentence_results(text, spans, results)
+
+    # Separadores originales intactos; frases sin errores sin tocar
+    assert merged['corrected'] == "I went there yesterday.  It was fun.\nWe were happy."
+    assert merged['has_errors'] is True
+    assert [error['correction'] for error in merged['errors']] == ["went"]
+    assert text[merged['matches'][0]['offset']:][:3] == "was"
+    assert merged['method'] == 'mixed' and 'error' not in merged
+
+
+def test_merge_reports_unchecked_sentences():
+    text = "First one. Second one."
+    spans = split_sentences(text)
+    unchecked = {'corrected': "", 'has_errors': False, 'matches': [], 'method': 'none'}
+    merged = merge_sentence_results(text, spans, [unchecked, dict(unchecked)])
+    assert merged['corrected'] == text
+    assert merged['method'] == 'none'
+    assert merged['error'] == "2 of 2 sentences unchecked"
+
+
+if __name__ == "__main__":
+    test_split_keeps_abbreviations_together()
+    test_merge_rebuilds_text_and_errors()
+    test_merge_reports_unchecked_sentences()
+    print("✅ Frases divididas y resultados unidos correctamente")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Verifica que el detalle de un curso se carga con un número fijo de queries,
+sin importar cuántas unidades tenga.
+
+Usa SQLite en memoria, no necesita PostgreSQL.
+Ejecutar desde backend/:  python -m src.test_query_count  (o con pytest)
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src import models
+from src import schemas
+from src import crud
+
+
+def _make_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    models.Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def _seed_course(db, n_units: int) -> int:
+    teacher = models.User(
+        email=f"teacher{n_units}@tbodemy.com",
+        password="x",
+        name="Teacher",
+        role=models.UserRole.teacher
+    )
+    db.add(teacher)
+    db.flush()
+
+    course = models.Course(title=f"Curso {n_units}", teacher_id=teacher.id, is_published=True)
+    db.add(course)
+    db.flush()
+
+    for order in range(n_units):
+        unit = models.Unit(course_id=course.id, title=f"Unidad {order}", order=order, content="")
+        db.add(unit)
+        db.flush()
+        for i in range(3):
+            db.add(models.Quiz(
+                unit_id=unit.id,
+                quiz_type=models.QuizType.fill_blank,
+                question=f"Question [{i}]",
+                correct_answer=str(i),
+                order=i
+            ))
+            db.add(models.AudioSentence(
+                unit_id=unit.id,
+                sentence=f"Sentence {i}",
+                audio_path=f"/static/audio/{i}.mp3",
+                order=i
+            ))
+    db.commit()
+    return course.id
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas contra un engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def _count_course_detail_queries(n_units: int) -> int:
+    engine, db = _make_session()
+    try:
+        course_id = _seed_course(db, n_units)
+        db.expunge_all()
+
+        with QueryCounter(engine) as counter:
+            course = crud.get_course(db, course_id, with_details=True)
+            data = schemas.CourseWithDetails.model_validate(course)
+
+        assert len(data.units) == n_units
+        assert all(len(unit.quizzes) == 3 for unit in data.units)
+        return counter.count
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _count_course_units_queries(n_units: int) -> int:
+    engine, db = _make_session()
+    try:
+        course_id = _seed_course(db, n_units)
+        db.expunge_all()
+
+        with QueryCounter(engine) as counter:
+            units = crud.get_course_units(db, course_id, with_details=True)
+            data = [schemas.UnitWithDetails.model_validate(unit) for unit in units]
+
+        assert len(data) == n_units
+        assert all(len(unit.audio_sentences) == 3 for unit in data)
+        return counter.count
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def test_course_detail_query_count_is_constant():
+    counts = [_count_course_detail_queries(n) for n in (1, 5, 30)]
+    assert len(set(counts)) == 1, f"Queries por número de unidades (1, 5, 30): {counts}"
+
+
+def test_course_units_query_count_is_constant():
+    counts = [_count_course_units_queries(n) for n in (1, 5, 30)]
+    assert len(set(counts)) == 1, f"Queries por número de unidades (1, 5, 30): {counts}"
+
+
+if __name__ == "__main__":
+    for n in (1, 5, 30):
+        print(f"📚 {n:>2} unidades → detalle: {_count_course_detail_queries(n)} queries, "
+              f"unidades: {_count_course_units_queries(n)} queries")
+    test_course_detail_query_count_is_constant()
+    test_course_units_query_count_is_constant()
+    print("✅ El número de queries no depende del número de unidades")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Verifica cómo los workers toman los jobs de speaking_turn_jobs:
+- dentro de una sesión, en orden y de uno en uno
+- ningún job se toma dos veces, aunque varios _claim corran a la vez
+- los jobs huérfanos ('running' demasiado tiempo) vuelven a la cola
+
+Usa SQLite en un archivo temporal (aiosqlite), no necesita PostgreSQL ni OpenAI.
+Ejecutar desde backend/:  python -m src.test_speaking_jobs  (o con pytest)
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src import models
+from src import speaking_jobs
+from src.speaking_jobs import SpeakingTurnQueue, SPEAKING_JOB_STALE_SECONDS
+
+Status = models.SpeakingJobStatus
+
+
+async def _make_sessionmaker(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _seed(sessionmaker, jobs_per_session: int):
+    """Dos sesiones con sus jobs encolados intercalados; devuelve {session_id: [job_id, ...]}"""
+    async with sessionmaker() as db:
+        student = models.User(email="student@tbodemy.com", password="x", name="Student", role=models.UserRole.student)
+        db.add(student)
+        await db.flush()
+        sessions = [
+            models.SpeakingSession(
+                student_id=student.id,
+                topic=f"Topic {i}",
+                conversation_type=models.ConversationType.casual,
+                difficulty_level=models.DifficultyLevel.beginner
+            )
+            for i in range(2)
+        ]
+        db.add_all(sessions)
+        await db.flush()
+        jobs = {session.id: [] for session in sessions}
+        for _ in range(jobs_per_session):
+            for session in sessions:
+                job = models.SpeakingTurnJob(session_id=session.id, student_id=student.id, status=Status.queued)
+                db.add(job)
+                await db.flush()
+                jobs[session.id].append(job.id)
+        await db.commit()
+        return jobs
+
+
+async def _set_status(sessionmaker, job_id: int, **values):
+    async with sessionmaker() as db:
+        await db.execute(update(models.SpeakingTurnJob).where(models.SpeakingTurnJob.id == job_id).values(**values))
+        await db.commit()
+
+
+async def _session_of(sessionmaker, job_id: int) -> int:
+    async with sessionmaker() as db:
+        return (await db.execute(
+            select(models.SpeakingTurnJob.session_id).where(models.SpeakingTurnJob.id == job_id)
+        )).scalar()
+
+
+def _run(test):
+    """Ejecutar test(sessionmaker, queue) con speaking_jobs apuntando a una BD temporal"""
+    async def main(path):
+        engine, sessionmaker = await _make_sessionmaker(path)
+        original = speaking_jobs.AsyncSessionLocal
+        speaking_jobs.AsyncSessionLocal = sessionmaker
+        try:
+            await test(sessionmaker, SpeakingTurnQueue(workers=2))
+        finally:
+            speaking_jobs.AsyncSessionLocal = original
+            await engine.dispose()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(main(os.path.join(directory, "jobs.db")))
+
+
+def test_concurrent_claims_keep_sessions_in_order():
+    async def test(sessionmaker, queue):
+        jobs = await _seed(sessionmaker, jobs_per_session=3)
+        first_a, first_b = (ids[0] for ids in jobs.values())
+
+        # Dos workers a la vez: cada uno toma el primer job de una sesión distinta
+        claimed = await asyncio.gather(queue._claim(), queue._claim())
+        assert sorted(claimed) == sorted([first_a, first_b])
+
+        # Con un turno en curso por sesión no queda nada que tomar
+        assert await asyncio.gather(queue._claim(), queue._claim()) == [None, None]
+
+        # Al terminar el de la primera sesión se libera su siguiente, y solo ese
+        await _set_status(sessionmaker, first_a, status=Status.done)
+        claimed = await asyncio.gather(queue._claim(), queue._claim())
+        assert set(claimed) == {list(jobs.values())[0][1], None}
+
+    _run(test)
+
+
+def test_workers_never_claim_a_job_twice():
+    async def test(sessionmaker, queue):
+        jobs = await _seed(sessionmaker, jobs_per_session=5)
+        processed = []
+        running = set()
+
+        async def worker():
+            while True:
+                job_id = await queue._claim()
+                if job_id is None:
+                    return
+                session_id = await _session_of(sessionmaker, job_id)
+                assert session_id not in running, "dos turnos de la misma sesión a la vez"
+                running.add(session_id)
+                processed.append(job_id)
+                await asyncio.sleep(0.01)
+                await _set_status(sessionmaker, job_id, status=Status.done)
+                running.discard(session_id)
+
+        # Un worker que no encuentra nada sale; se relanzan hasta vaciar la cola
+        total = sum(len(ids) for ids in jobs.values())
+        while len(processed) < total:
+            await asyncio.gather(*(worker() for _ in range(4)))
+
+        assert sorted(processed) == sorted(job_id for ids in jobs.values() for job_id in ids)
+        for ids in jobs.values():
+            assert [job_id for job_id in processed if job_id in ids] == ids
+
+    _run(test)
+
+
+def test_stale_running_jobs_are_requeued():
+    async def test(sessionmaker, queue):
+        jobs = await _seed(sessionmaker, jobs_per_session=2)
+        first_a, first_b = (ids[0] for ids in jobs.values())
+        assert sorted(await asyncio.gather(queue._claim(), queue._claim())) == sorted([first_a, first_b])
+
+        # first_a quedó 'running' en un proceso caído; first_b sigue en curso
+        old = datetime.utcnow() - timedelta(seconds=SPEAKING_JOB_STALE_SECONDS + 60)
+        await _set_status(sessionmaker, first_a, started_at=old)
+        assert await queue.requeue_stale() == 1
+
+        # Vuelve a tomarse first_a, antes que el siguiente de su sesión
+        assert await queue._claim() == first_a
+        assert await queue._claim() is None
+
+    _run(test)
+
+
+if __name__ == "__main__":
+    test_concurrent_claims_keep_sessions_in_order()
+    test_workers_never_claim_a_job_twice()
+    test_stale_running_jobs_are_requeued()
+    print("✅ Jobs de speaking tomados en orden, una sola vez, y huérfanos reencolados")
@@ -0,0 +1,179 @@
+"""
+Caché en disco de audios de TTS, direccionada por contenido
+
+Cada clip se guarda una sola vez como static/speaking/cache/<sha256>.mp3, con
+clave sha256(modelo, voz, texto). Saludos y frases repetidas ("Great job!")
+reutilizan la misma URL en vez de volver a llamar a la API.
+El tamaño total se acota con expulsión LRU (orden por último uso, que se
+conserva entre reinicios a través del mtime de los archivos). Los mensajes
+guardados apuntan a estas URLs: SpeechCacheFiles sirve el directorio y, si un
+clip expulsado se vuelve a pedir, lo regenera a partir del texto del mensaje.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import StaticFiles
+
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "static/speaking/cache"))
+TTS_CACHE_URL = os.getenv("TTS_CACHE_URL", "/static/speaking/cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+
+_CLIP_NAME = re.compile(r"^[0-9a-f]{64}\.mp3$")
+
+
+def speech_key(text: str, model: str, voice: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model}\x00{voice}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class SpeechCache:
+    """Índice LRU (clave -> bytes) sobre los archivos del directorio de caché"""
+
+    def __init__(self, directory: Path = TTS_CACHE_DIR, url_prefix: str = TTS_CACHE_URL, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.regenerations = 0
+        self.bytes_saved = 0
+        self._load()
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.directory.glob("*.mp3"), key=lambda path: path.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.mp3"
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}.mp3"
+
+    def get(self, key: str) -> Optional[str]:
+        """URL del clip si está en caché (cuenta hit/miss)"""
+        with self._lock:
+            size = self._entries.get(key)
+            if size is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += size
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            # Borrado por fuera: se trata como miss
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._total_bytes -= size
+                self.hits -= 1
+                self.bytes_saved -= size
+                self.misses += 1
+            return None
+        return self.url(key)
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Bytes del clip si está en caché (para reenviarlo en streaming)"""
+        if self.get(key) is None:
+            return None
+        try:
+            return self.path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, audio: bytes) -> str:
+        """Guardar un clip (escritura atómica) y expulsar los menos usados si se supera el límite"""
+        path = self.path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(audio)
+        os.replace(tmp_path, path)
+
+        expired = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._entries[key] = len(audio)
+            self._total_bytes += len(audio)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self.evictions += 1
+                expired.append(old_key)
+        for old_key in expired:
+            try:
+                self.path(old_key).unlink()
+            except FileNotFoundError:
+                pass
+        return self.url(key)
+
+    def record_regeneration(self):
+        """Un clip expulsado que se volvió a generar"""
+        with self._lock:
+            self.regenerations += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "regenerations": self.regenerations,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+class SpeechCacheFiles(StaticFiles):
+    """Archivos de la caché; un clip expulsado se regenera al pedirlo (regenerate(key) -> False si nadie lo usa)"""
+
+    def __init__(self, cache: SpeechCache, regenerate: Callable[[str], Awaitable[bool]]):
+        super().__init__(directory=cache.directory, check_dir=False)
+        self.cache = cache
+        self.regenerate = regenerate
+        # Peticiones simultáneas del mismo clip esperan a una sola regeneración
+        self._inflight: Dict[str, "asyncio.Task[bool]"] = {}
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404 or not _CLIP_NAME.match(path):
+                raise
+        key = path[:-len(".mp3")]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._regenerate(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        if not await asyncio.shield(task):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    async def _regenerate(self, key: str) -> bool:
+        regenerated = await self.regenerate(key)
+        if regenerated:
+            self.cache.record_regeneration()
+        return regenerated
+
+
+speech_cache = SpeechCache()
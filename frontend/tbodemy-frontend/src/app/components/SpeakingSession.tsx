@@ -31,10 +31,15 @@ export default function SpeakingSession({ sessionId, onEnd }: Props) {
   const [isRecording, setIsRecording] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [greetingMissing, setGreetingMissing] = useState(false);
   
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
   const audioChunksRef = useRef<Blob[]>([]);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Audio en streaming: trozos del segmento actual + cola de segmentos listos para reproducir
+  const audioSegmentRef = useRef<Uint8Array[]>([]);
+  const audioQueueRef = useRef<string[]>([]);
+  const audioPlayingRef = useRef(false);
 
   // Load initial session
   useEffect(() => {
@@ -46,11 +51,18 @@ export default function SpeakingSession({ sessionId, onEnd }: Props) {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
-  const loadSession = async () => {
+  const loadSession = async (attempt = 0) => {
     try {
       const data = await speaking.getSessionById(sessionId);
       setSession(data);
-      setMessages(data.messages || []);
+      setMessages(prev => (prev.length > (data.messages || []).length ? prev : data.messages || []));
+
+      // The AI greeting may still be generating for uncommon topics
+      if (!data.messages?.length && attempt < 10) {
+        setTimeout(() => loadSession(attempt + 1), 1500);
+      } else {
+        setGreetingMissing(!data.messages?.length);
+      }
     } catch (error) {
       console.error('Error loading session:', error);
       setError('Error loading session');
@@ -99,23 +111,44 @@ export default function SpeakingSession({ sessionId, onEnd }: Props) {
     setIsProcessing(true);
     setError(null);
 
-    try {
-      // Send audio and receive BOTH messages
-      const response = await speaking.sendAudioMessage(sessionId, audioBlob);
-      
-      // Add BOTH messages correctly
-      setMessages(prev => [
-        ...prev,
-        response.user_message,      // Student message
-        response.assistant_message  // AI message
-      ]);
+    // Drafts (negative ids) replaced by the saved messages on "done"
+    const userDraftId = -Date.now();
+    const assistantDraftId = userDraftId - 1;
+    const updateDraft = (id: number, update: (message: SpeakingMessage) => SpeakingMessage) =>
+      setMessages(prev => prev.map(message => (message.id === id ? update(message) : message)));
 
-      // Auto-play assistant response audio
-      if (response.assistant_message.audio_path) {
-        playAudio(response.assistant_message.audio_path);
-      }
-      
+    try {
+      await speaking.streamAudioMessage(sessionId, audioBlob, ({ event, data }: any) => {
+        if (event === 'transcript') {
+          const now = new Date().toISOString();
+          setMessages(prev => [
+            ...prev,
+            { id: userDraftId, role: 'user', content: data.text, created_at: now },
+            { id: assistantDraftId, role: 'assistant', content: '', created_at: now },
+          ]);
+        } else if (event === 'token') {
+          updateDraft(assistantDraftId, message => ({ ...message, content: message.content + data.delta }));
+        } else if (event === 'audio') {
+          audioSegmentRef.current.push(Uint8Array.from(atob(data.data), c => c.charCodeAt(0)));
+        } else if (event === 'audio_end') {
+          const segment = new Blob(audioSegmentRef.current, { type: 'audio/mpeg' });
+          audioSegmentRef.current = [];
+          enqueueAudio(URL.createObjectURL(segment));
+        } else if (event === 'grammar') {
+          updateDraft(userDraftId, message => ({
+            ...message,
+            corrected_content: data.has_errors ? data.corrected : null,
+          }));
+        } else if (event === 'done') {
+          setMessages(prev => prev.map(message =>
+            message.id === userDraftId ? data.user_message
+              : message.id === assistantDraftId ? data.assistant_message
+              : message
+          ));
+        }
+      });
     } catch (error: any) {
+      setMessages(prev => prev.filter(message => message.id !== userDraftId && message.id !== assistantDraftId));
       console.error('Error sending audio:', error);
       
       if (error.message?.includes('cuota') || error.message?.includes('quota')) {
@@ -131,6 +164,30 @@ export default function SpeakingSession({ sessionId, onEnd }: Props) {
     }
   };
 
+  // Play streamed segments one after another
+  const enqueueAudio = (url: string) => {
+    audioQueueRef.current.push(url);
+    if (!audioPlayingRef.current) playNextSegment();
+  };
+
+  const playNextSegment = () => {
+    const url = audioQueueRef.current.shift();
+    if (!url) {
+      audioPlayingRef.current = false;
+      return;
+    }
+    audioPlayingRef.current = true;
+    const audio = new Audio(url);
+    audio.onended = () => {
+      URL.revokeObjectURL(url);
+      playNextSegment();
+    };
+    audio.play().catch(err => {
+      console.error('Error playing audio:', err);
+      playNextSegment();
+    });
+  };
+
   const playAudio = (audioPath: string) => {
     try {
       // Make sure the path is correct
@@ -196,6 +253,21 @@ export default function SpeakingSession({ sessionId, onEnd }: Props) {
       {/* Messages Container */}
       <div className="flex-1 bg-white rounded-lg shadow-sm p-4 overflow-y-auto mb-4">
         <div className="space-y-4">
+          {greetingMissing && messages.length === 0 && (
+            <div className="text-center text-gray-600 py-8">
+              <p className="mb-3">The AI teacher&apos;s greeting is taking too long to arrive.</p>
+              <p className="mb-4 text-sm">You can start speaking anyway, or check again.</p>
+              <button
+                onClick={() => {
+                  setGreetingMissing(false);
+                  loadSession();
+                }}
+                className="px-4 py-2 bg-blue-500 text-white rounded-lg hover:bg-blue-600 transition-colors"
+              >
+                Check again
+              </button>
+            </div>
+          )}
           {messages.map((message, index) => (
             <div
               key={message.id || index}
@@ -250,7 +322,9 @@ export default function SpeakingSession({ sessionId, onEnd }: Props) {
             <div className="flex justify-center">
               <div className="bg-gray-100 rounded-lg p-4 flex items-center gap-3">
                 <div className="animate-spin rounded-full h-5 w-5 border-b-2 border-blue-500"></div>
-                <span className="text-gray-600">Processing your message...</span>
+                <span className="text-gray-600">
+                  {messages.some(message => message.id < 0) ? 'AI Teacher is answering...' : 'Processing your message...'}
+                </span>
               </div>
             </div>
           )}
@@ -32,7 +32,18 @@ export default function ChatPage() {
 
     // Polling for new messages
     const interval = setInterval(loadMessages, 3000);
-    return () => clearInterval(interval);
+
+    // Grammar corrections arrive after sending (message_corrected events)
+    const unsubscribe = social.subscribeMessageEvents(({ event, data }) => {
+      if (event === 'message_corrected') {
+        setMessages((prev) => prev.map((m) => (m.id === data.id ? { ...m, ...data } : m)));
+      }
+    });
+
+    return () => {
+      clearInterval(interval);
+      unsubscribe();
+    };
   }, [friendId, router]);
 
   useEffect(() => {
@@ -95,10 +106,11 @@ export default function ChatPage() {
 
     setSending(true);
     try {
-      await social.sendMessage(friendId, newMessage);
+      // Saved immediately; the correction is filled in later
+      const sent = await social.sendMessage(friendId, newMessage);
+      setMessages((prev) => [...prev, sent]);
       setNewMessage('');
       setGrammarCheck(null);
-      await loadMessages();
     } catch (err) {
       alert('Error sending message');
     } finally {
@@ -183,6 +195,10 @@ export default function ChatPage() {
                             </p>
                           </div>
                         )}
+
+                        {isOwn && message.correction_status === 'pending' && (
+                          <p className="text-xs text-indigo-200 mt-1">⏳ Checking grammar...</p>
+                        )}
                         
                         <p className={`text-xs mt-1 ${isOwn ? 'text-indigo-200' : 'text-gray-500'}`}>
                           {new Date(message.created_at).toLocaleTimeString('en-US', {
@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react';
 import { useRouter, useParams } from 'next/navigation';
-import { auth, courses, type User, type Course } from '@/lib/api';
+import { auth, courses, type Course, type RosterStudent } from '@/lib/api';
 
 export default function CourseStudentsPage() {
   const router = useRouter();
@@ -10,8 +10,11 @@ export default function CourseStudentsPage() {
   const courseId = Number(params.id);
 
   const [course, setCourse] = useState<Course | null>(null);
-  const [students, setStudents] = useState<User[]>([]);
+  const [students, setStudents] = useState<RosterStudent[]>([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!auth.isAuthenticated()) {
@@ -35,7 +38,9 @@ export default function CourseStudentsPage() {
         courses.getStudents(courseId)
       ]);
       setCourse(courseData);
-      setStudents(studentsData);
+      setStudents(studentsData.items);
+      setTotal(studentsData.total);
+      setNextCursor(studentsData.next_cursor);
     } catch (error) {
       console.error('Error loading data:', error);
       alert('Error al cargar los datos');
@@ -44,6 +49,24 @@ export default function CourseStudentsPage() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await courses.getStudents(courseId, nextCursor);
+      setStudents((prev) => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error loading students:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const averageProgress = students.length
+    ? Math.round(students.reduce((sum, entry) => sum + entry.progress.percent, 0) / students.length)
+    : 0;
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
@@ -81,11 +104,11 @@ export default function CourseStudentsPage() {
         <div className="grid md:grid-cols-3 gap-6 mb-8">
           <div className="bg-white p-6 rounded-lg shadow">
             <div className="text-sm text-gray-600">Total Students</div>
-            <div className="text-3xl font-bold text-indigo-600">{students.length}</div>
+            <div className="text-3xl font-bold text-indigo-600">{total}</div>
           </div>
           <div className="bg-white p-6 rounded-lg shadow">
             <div className="text-sm text-gray-600">Average progress</div>
-            <div className="text-3xl font-bold text-green-600">0%</div>
+            <div className="text-3xl font-bold text-green-600">{averageProgress}%</div>
           </div>
           <div className="bg-white p-6 rounded-lg shadow">
             <div className="text-sm text-gray-600">Active this week</div>
@@ -97,7 +120,7 @@ export default function CourseStudentsPage() {
         <div className="bg-white rounded-lg shadow">
           <div className="px-6 py-4 border-b border-gray-200">
             <h2 className="text-xl font-bold text-gray-900">
-              List of students ({students.length})
+              List of students ({total})
             </h2>
           </div>
 
@@ -113,7 +136,7 @@ export default function CourseStudentsPage() {
             </div>
           ) : (
             <div className="divide-y divide-gray-200">
-              {students.map((student) => (
+              {students.map(({ student, enrolled_at, progress }) => (
                 <div key={student.id} className="px-6 py-4 hover:bg-gray-50 transition">
                   <div className="flex items-center justify-between">
                     <div className="flex items-center gap-4">
@@ -128,19 +151,31 @@ export default function CourseStudentsPage() {
                     <div className="flex items-center gap-4">
                       <div className="text-right">
                         <div className="text-sm font-medium text-gray-900">Progreso</div>
-                        <div className="text-sm text-gray-500">0%</div>
+                        <div className="text-sm text-gray-500">
+                          {progress.percent}% ({progress.completed_units}/{progress.total_units})
+                        </div>
                       </div>
                       <div className="text-right">
                         <div className="text-sm font-medium text-gray-900">Inscrito</div>
                         <div className="text-sm text-gray-500">
-                            {/* {new Date(student.created_at).toLocaleDateString()} */}
-                            Recently
+                            {new Date(enrolled_at).toLocaleDateString()}
                         </div>
                       </div>
                     </div>
                   </div>
                 </div>
               ))}
+              {nextCursor && (
+                <div className="px-6 py-4 text-center">
+                  <button
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="text-indigo-600 hover:text-indigo-700 font-medium disabled:opacity-50"
+                  >
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
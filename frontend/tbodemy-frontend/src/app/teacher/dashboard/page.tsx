@@ -158,8 +158,8 @@ function CourseCard({ course, onUpdate }: { course: Course; onUpdate: () => void
 
   const loadStudentCount = async () => {
     try {
-      const students = await courses.getStudents(course.id);
-      setStudentCount(students.length);
+      const roster = await courses.getStudents(course.id, undefined, 1);
+      setStudentCount(roster.total);
     } catch (error) {
       console.error('Error loading students:', error);
       setStudentCount(0);
@@ -36,6 +36,30 @@ export interface Course {
   updated_at: string;
 }
 
+export interface CoursePage {
+  items: Course[];
+  next_cursor: string | null;
+  total_estimate: number;
+}
+
+export interface ProgressSummary {
+  completed_units: number;
+  total_units: number;
+  percent: number;
+}
+
+export interface RosterStudent {
+  student: User;
+  enrolled_at: string;
+  progress: ProgressSummary;
+}
+
+export interface CourseRosterPage {
+  items: RosterStudent[];
+  next_cursor: string | null;
+  total: number;
+}
+
 export interface Unit {
   id: number;
   course_id: number;
@@ -69,10 +93,13 @@ export interface Message {
   receiver_id: number;
   content: string;
   corrected_content: string | null;
+  correction_status: 'pending' | 'done' | 'failed'; // pending: corrección en segundo plano
   is_read: boolean;
   created_at: string;
 }
 
+export type ChatMessageEvent = { event: 'message_corrected'; data: Message };
+
 export interface Friendship {
   id: number;
   requester_id: number;
@@ -117,7 +144,19 @@ export const auth = {
 // ==================== COURSES ====================
 export const courses = {
   getAll: async () => {
-    const { data } = await api.get<Course[]>('/courses');
+    // Recorre todas las páginas del catálogo siguiendo next_cursor
+    const items: Course[] = [];
+    let cursor: string | undefined;
+    do {
+      const { data } = await api.get<CoursePage>('/courses', { params: { cursor, limit: 100 } });
+      items.push(...data.items);
+      cursor = data.next_cursor ?? undefined;
+    } while (cursor);
+    return items;
+  },
+
+  getPage: async (cursor?: string, limit = 20) => {
+    const { data } = await api.get<CoursePage>('/courses', { params: { cursor, limit } });
     return data;
   },
 
@@ -145,8 +184,10 @@ export const courses = {
     await api.delete(`/courses/${id}`);
   },
 
-  getStudents: async (courseId: number) => {
-    const { data } = await api.get<User[]>(`/courses/${courseId}/students`);
+  getStudents: async (courseId: number, cursor?: string, limit = 50, search?: string) => {
+    const { data } = await api.get<CourseRosterPage>(`/courses/${courseId}/students`, {
+      params: { cursor, limit, search },
+    });
     return data;
   },
 
@@ -277,8 +318,8 @@ export const social = {
     return data;
   },
 
-  getConversations: async () => {
-    const { data } = await api.get('/conversations');
+  getConversations: async (cursor?: string) => {
+    const { data } = await api.get('/conversations', { params: { cursor } });
     return data;
   },
 
@@ -287,6 +328,53 @@ export const social = {
     return data;
   },
 
+  // Eventos del chat (SSE): la corrección gramatical de los mensajes llega después de enviarlos.
+  // Devuelve una función para cerrar la conexión; reconecta si se corta.
+  subscribeMessageEvents: (onEvent: (event: ChatMessageEvent) => void): (() => void) => {
+    const controller = new AbortController();
+
+    const connect = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const response = await fetch(`${API_URL}/messages/events`, {
+            headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+            signal: controller.signal,
+          });
+          if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+              const raw = buffer.slice(0, boundary);
+              buffer = buffer.slice(boundary + 2);
+              let event = '';
+              let data = '';
+              for (const line of raw.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+              }
+              if (event) onEvent({ event, data: JSON.parse(data) } as ChatMessageEvent);
+            }
+          }
+        } catch (err) {
+          if (controller.signal.aborted) return;
+        }
+        // Reintento tras un corte (el polling de la conversación cubre el hueco)
+        await new Promise((resolve) => setTimeout(resolve, 5000));
+      }
+    };
+
+    connect();
+    return () => controller.abort();
+  },
+
   checkGrammar: async (text: string) => {
     const { data } = await api.post('/grammar-check', null, {
       params: { text }
@@ -322,6 +410,16 @@ export interface SpeakingMessageResponse {
   assistant_message: SpeakingMessage; // ⬅️ YA ESTÁ CORRECTO
 }
 
+// Eventos del turno en streaming (POST /speaking/sessions/{id}/message/stream)
+export type SpeakingStreamEvent =
+  | { event: 'transcript'; data: { text: string } }
+  | { event: 'token'; data: { delta: string } }
+  | { event: 'audio'; data: { segment: number; data: string } }
+  | { event: 'audio_end'; data: { segment: number } }
+  | { event: 'grammar'; data: { corrected: string; has_errors: boolean; errors: any[] } }
+  | { event: 'done'; data: SpeakingMessageResponse }
+  | { event: 'error'; data: { status: number; detail: string } };
+
 export interface SpeakingSessionWithMessages extends SpeakingSession {
   messages: SpeakingMessage[];
 }
@@ -385,6 +483,58 @@ export const speaking = {
     }
   },
 
+  // Enviar mensaje de audio en streaming (Server-Sent Events)
+  streamAudioMessage: async (
+    sessionId: number,
+    audioBlob: Blob,
+    onEvent: (event: SpeakingStreamEvent) => void
+  ): Promise<void> => {
+    const formData = new FormData();
+    formData.append('audio', audioBlob, 'audio.webm');
+
+    const response = await fetch(`${API_URL}/speaking/sessions/${sessionId}/message/stream`, {
+      method: 'POST',
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+      body: formData,
+    });
+    if (!response.ok || !response.body) {
+      const body = await response.json().catch(() => null);
+      throw new Error(body?.detail || 'Error al enviar el mensaje de audio. Por favor, intenta nuevamente.');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Cada evento SSE termina con una línea en blanco
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = '';
+        let data = '';
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (!event) continue;
+        const parsed = { event, data: JSON.parse(data) } as SpeakingStreamEvent;
+        if (parsed.event === 'error') {
+          throw new Error(
+            parsed.data.status === 429
+              ? 'Has excedido tu cuota de transcripción de OpenAI. Por favor, verifica tu cuenta en platform.openai.com o intenta más tarde.'
+              : parsed.data.detail
+          );
+        }
+        onEvent(parsed);
+      }
+    }
+  },
+
   // Finalizar sesión
   endSession: async (sessionId: number) => {
     const { data } = await api.post(`/speaking/sessions/${sessionId}/end`);
@@ -0,0 +1,25 @@
+-- Migración: índices para la paginación por keyset del catálogo de cursos
+-- GET /courses ordena por (created_at DESC, id DESC) y filtra por is_published / teacher_id
+-- Ejecutar este script en tu base de datos (PostgreSQL)
+
+-- idx_courses_published pasa de ser un índice sobre un booleano a un índice
+-- parcial con la clave del keyset: cada página es un index scan acotado
+DROP INDEX IF EXISTS idx_courses_published;
+CREATE INDEX idx_courses_published
+    ON courses(created_at DESC, id DESC)
+    WHERE is_published = TRUE;
+
+-- Catálogo completo (published_only=false)
+CREATE INDEX IF NOT EXISTS idx_courses_created
+    ON courses(created_at DESC, id DESC);
+
+-- Catálogo filtrado por profesor
+CREATE INDEX IF NOT EXISTS idx_courses_teacher_created
+    ON courses(teacher_id, created_at DESC, id DESC);
+
+-- Mantener las estadísticas al día para la estimación de total_estimate (EXPLAIN)
+ANALYZE courses;
+
+-- Verificar:
+-- EXPLAIN SELECT * FROM courses WHERE is_published = TRUE
+--   ORDER BY created_at DESC, id DESC LIMIT 21;
@@ -0,0 +1,8 @@
+-- Migración: índice para el roster de cursos
+-- GET /courses/{id}/students pagina los inscritos por (enrolled_at, id) con keyset
+-- Ejecutar este script en tu base de datos (PostgreSQL)
+
+CREATE INDEX IF NOT EXISTS idx_enrollments_course_enrolled
+    ON enrollments(course_id, enrolled_at DESC, id DESC);
+
+ANALYZE enrollments;
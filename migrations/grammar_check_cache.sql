@@ -0,0 +1,14 @@
+-- Migración: caché persistente de correcciones gramaticales
+-- Clave = sha256(idioma + texto normalizado); las entradas caducan en expires_at
+-- (GRAMMAR_CACHE_TTL_SECONDS). Ver src/grammar_cache.py
+-- Ejecutar este script en tu base de datos
+
+CREATE TABLE IF NOT EXISTS grammar_check_cache (
+    key VARCHAR(64) PRIMARY KEY,
+    language VARCHAR(20) NOT NULL,
+    result JSON NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_grammar_check_cache_expires ON grammar_check_cache(expires_at);
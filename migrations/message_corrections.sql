@@ -0,0 +1,10 @@
+-- Migración: corrección gramatical diferida de los mensajes del chat
+-- POST /messages guarda el mensaje con correction_status = 'pending' y un worker
+-- rellena corrected_content en segundo plano (ver src/message_corrections.py)
+-- Ejecutar este script en tu base de datos
+
+ALTER TABLE messages ADD COLUMN correction_status VARCHAR(20) NOT NULL DEFAULT 'done';
+
+-- Pendientes a recuperar al arrancar (índice parcial: casi todos los mensajes están 'done')
+CREATE INDEX IF NOT EXISTS idx_messages_correction_pending
+    ON messages(id) WHERE correction_status = 'pending';
@@ -0,0 +1,12 @@
+-- Migración: índices para el inbox de conversaciones
+-- GET /conversations resuelve último mensaje y no leídos por interlocutor en una
+-- sola query (window functions) sobre los mensajes enviados y recibidos del usuario
+-- Ejecutar este script en tu base de datos (PostgreSQL)
+
+CREATE INDEX IF NOT EXISTS idx_messages_sender_receiver_created
+    ON messages(sender_id, receiver_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_messages_receiver_sender_created
+    ON messages(receiver_id, sender_id, created_at);
+
+ANALYZE messages;
@@ -0,0 +1,6 @@
+-- Migración: índice por audio_path en speaking_messages
+-- Los clips de la caché TTS se expulsan por LRU; si un mensaje guardado pide uno
+-- expulsado, se busca su texto por audio_path y se regenera (ver src/tts_cache.py)
+-- Ejecutar este script en tu base de datos
+
+CREATE INDEX IF NOT EXISTS idx_speaking_messages_audio_path ON speaking_messages(audio_path);
@@ -0,0 +1,10 @@
+-- Migración: resumen acumulado del contexto de las sesiones de speaking
+-- Los turnos antiguos se condensan en context_summary para que cada turno
+-- envíe a GPT un contexto de tamaño acotado (ver src/conversation_context.py)
+-- Ejecutar este script en tu base de datos
+
+ALTER TABLE speaking_sessions ADD COLUMN context_summary TEXT;
+ALTER TABLE speaking_sessions ADD COLUMN context_summary_until INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_speaking_messages_session_id
+    ON speaking_messages(session_id, id);
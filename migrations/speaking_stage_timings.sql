@@ -0,0 +1,7 @@
+-- Migración: tiempos por etapa de cada turno de speaking
+-- Se guardan en el mensaje del estudiante (role='user') en milisegundos,
+-- p. ej. {"upload": 12.3, "stt": 840.1, "grammar": 1210.5, "reply": 950.2, "tts": 610.7}
+-- para analizar offline qué etapa hace lentos los turnos (ver src/metrics.py)
+-- Ejecutar este script en tu base de datos
+
+ALTER TABLE speaking_messages ADD COLUMN stage_timings JSON;
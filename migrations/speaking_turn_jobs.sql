@@ -0,0 +1,29 @@
+-- Migración: cola de turnos de speaking (POST /speaking/sessions/{id}/message?mode=job)
+-- Los workers de cada nodo toman el job más antiguo de cada sesión sin otro en curso
+-- Ejecutar este script en tu base de datos (PostgreSQL)
+
+DO $$ BEGIN
+    CREATE TYPE speaking_job_status AS ENUM ('queued', 'running', 'done', 'failed');
+EXCEPTION
+    WHEN duplicate_object THEN
+        RAISE NOTICE 'El tipo speaking_job_status ya existe, omitiendo...';
+END $$;
+
+CREATE TABLE IF NOT EXISTS speaking_turn_jobs (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES speaking_sessions(id) ON DELETE CASCADE,
+    student_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status speaking_job_status NOT NULL DEFAULT 'queued',
+    audio BYTEA,
+    audio_filename VARCHAR(255),
+    user_message_id INTEGER REFERENCES speaking_messages(id) ON DELETE SET NULL,
+    assistant_message_id INTEGER REFERENCES speaking_messages(id) ON DELETE SET NULL,
+    error TEXT,
+    error_status INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_speaking_turn_jobs_status ON speaking_turn_jobs(status, id);
+CREATE INDEX IF NOT EXISTS idx_speaking_turn_jobs_session ON speaking_turn_jobs(session_id, id);
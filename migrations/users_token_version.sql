@@ -0,0 +1,11 @@
+-- Migración para agregar token_version a users
+-- Los JWT llevan rol y versión en los claims; incrementar token_version
+-- (crud.deactivate_user) invalida los tokens emitidos antes
+-- Ejecutar este script en tu base de datos
+
+-- PostgreSQL
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+
+-- Verificar que se agregó correctamente
+-- SELECT id, email, is_active, token_version FROM users LIMIT 5;